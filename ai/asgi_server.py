@@ -0,0 +1,426 @@
+import asyncio
+import functools
+import itertools
+import json
+import os
+import socket
+import time
+import urllib.parse
+import requests
+
+try:
+    import aiohttp  # Optional: native async HTTP client
+except ImportError:
+    aiohttp = None
+
+try:
+    from .strategy_selector import StrategySelector
+    from .sentiment import get_service, NEWS_SOURCES, BYTEPLUS_MODELARK_API
+    from .risk_engine import RiskEngine
+    from .decision_snapshot import SnapshotRefresher, snapshot_age
+    from .shared_state import SharedState
+    from .optimizer import apply_params, load_best_params, ScoringReloader
+    from .equity_monitor import EquityMonitor, KillSwitch
+    from .durable_state import DurableState, STATE_DIR
+    from . import logger
+except ImportError:  # Run as a script from the ai/ folder
+    from strategy_selector import StrategySelector
+    from sentiment import get_service, NEWS_SOURCES, BYTEPLUS_MODELARK_API
+    from risk_engine import RiskEngine
+    from decision_snapshot import SnapshotRefresher, snapshot_age
+    from shared_state import SharedState
+    from optimizer import apply_params, load_best_params, ScoringReloader
+    from equity_monitor import EquityMonitor, KillSwitch
+    from durable_state import DurableState, STATE_DIR
+    import logger
+
+# asyncio/ASGI serving mode with the same routes and JSON shapes as server_api.py.
+# Run with any ASGI server, e.g. `uvicorn ai.asgi_server:app --workers 4`, or with the
+# built-in multi-process server: `python asgi_server.py --workers 4`.
+# Strategy/risk state lives in SharedState so every worker process sees the same values,
+# and so does the equity monitor's kill switch (also shared with the Flask server).
+# Each worker journals its changes under ai/state/asgi-<n> (see durable_state.py), n being the
+# lowest slot no live worker holds, so restarts reuse the same journals.
+
+FETCH_TIMEOUT = 3.0  # Seconds per outbound call
+POOL_SIZE = 20
+
+
+def run_blocking(func, *args):
+    # Blocking call on the default thread pool (asyncio.to_thread needs Python 3.9, we support 3.8)
+    return asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+class AsyncFetcher:
+    # Pooled outbound HTTP with timeouts: aiohttp when installed, otherwise a pooled
+    # requests.Session driven from a thread so the event loop never blocks
+    def __init__(self, timeout=FETCH_TIMEOUT, pool_size=POOL_SIZE):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = None
+
+    async def start(self):
+        if aiohttp is not None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                                 connector=aiohttp.TCPConnector(limit=self.pool_size))
+        else:
+            self.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    async def close(self):
+        if aiohttp is not None and self.session is not None:
+            await self.session.close()
+
+    async def request_json(self, method, url, **kwargs):
+        if aiohttp is not None:
+            async with self.session.request(method, url, **kwargs) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        def call():
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        return await run_blocking(call)
+
+
+class AsyncSnapshotRefresher(SnapshotRefresher):
+    def __init__(self, selector, risk, fetcher, **kwargs):
+        super().__init__(selector, risk, **kwargs)
+        self.fetcher = fetcher
+
+    async def news_sentiment(self):
+        service = get_service()
+        sources = [url for url in NEWS_SOURCES if service.breakers[url].allow()]
+        results = await asyncio.gather(*(self.fetcher.request_json('GET', url) for url in sources),
+                                       return_exceptions=True)
+        latest_news = ''
+        for url, data in zip(sources, results):
+            if isinstance(data, dict):
+                service.breakers[url].record_success()
+                news_item = data.get('data', [{}])[0]
+                latest_news += news_item.get('title', '') + ' ' + news_item.get('snippet', '') + ' '
+            else:
+                service.breakers[url].record_failure()
+        api_key = os.environ.get('BYTEPLUS_API_KEY')
+        if not latest_news.strip() or not api_key:
+            return 'neutral'
+        # Shared with the Flask server and the scheduler, so identical news is only analyzed once
+        cached = await run_blocking(service.lookup, latest_news)
+        if cached is not None:
+            return cached['sentiment']
+        if not service.llm_breaker.allow():
+            return 'neutral'
+        prompt = f"Analyze the sentiment of this forex news text in detail and classify as positive, negative, or neutral with reasoning: {latest_news[:1000]}"
+        try:
+            result = await self.fetcher.request_json(
+                'POST', BYTEPLUS_MODELARK_API, json={'prompt': prompt, 'model': 'skylark'},
+                headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'})
+        except Exception:
+            service.llm_breaker.record_failure()
+            raise
+        service.llm_breaker.record_success()
+        sentiment = result.get('sentiment', 'neutral')
+        await run_blocking(service.remember, latest_news, sentiment, result.get('reasoning', ''))
+        return sentiment
+
+    async def fetch_async(self, name):
+        if name == 'regime':
+            return self.selector.get_market_regime()
+        if name == 'sentiment':
+            return await self.news_sentiment()
+        # MCP calls have no async client; keep them off the event loop
+        return await run_blocking(self._fetch, name)
+
+    async def refresh_async(self, force=False):
+        now = self.clock()
+        names = self.due(now, force)
+        if 'regime' in names:  # graph_hint depends on it
+            self.record('regime', await self.fetch_async('regime'), now)
+            names.remove('regime')
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self.fetch_async(name), self.fetcher.timeout * 2) for name in names),
+            return_exceptions=True)
+        for name, value in zip(names, results):
+            if isinstance(value, BaseException):
+                print(f"Snapshot refresh of {name} failed: {value!r}")
+            else:
+                self.record(name, value, now)
+        return self.build(now)
+
+
+class App:
+    def __init__(self, shared_path=None, state_dir=STATE_DIR):
+        self.selector = StrategySelector()
+        self.risk = RiskEngine()
+        best_params = load_best_params()
+        if best_params:
+            apply_params(best_params, self.selector, self.risk)
+        # Same hot swap of the scoring table as server_api, checked from _sync
+        self.scoring = ScoringReloader(self.selector)
+        self.scoring.reload(force=True)
+        self.shared_path = shared_path
+        self.shared = None
+        self.equity = EquityMonitor(self.risk)
+        self.kill_switch = None  # Needs the shared state, created in startup
+        self.state_dir = state_dir
+        self.durable = None  # Journal of this worker, opened in startup
+        self.fetcher = AsyncFetcher()
+        self.refresher = AsyncSnapshotRefresher(self.selector, self.risk, self.fetcher)
+        self.leader = False
+        self.version = -1
+        self._task = None
+        self.routes = {
+            ('GET', '/strategy'): self.get_strategy,
+            ('POST', '/risk/lot'): self.get_lot,
+            ('POST', '/update'): self.update,
+            ('GET', '/equity'): self.equity_state,
+            ('POST', '/equity'): self.push_equity,
+            ('POST', '/equity/reset'): self.reset_equity,
+            ('POST', '/log'): self.log,
+            ('GET', '/sentiment/metrics'): self.sentiment_metrics,
+        }
+
+    async def startup(self):
+        self.shared = SharedState(self.selector.strategies, self.shared_path)
+        seeded = self.shared.publish_if_empty(self.selector, self.risk)
+        self.kill_switch = KillSwitch(self.equity, self.shared)
+        slot = next(i for i in itertools.count() if self.shared.try_lead(f'journal-asgi-{i}'))
+        self.durable = DurableState(self.selector, self.risk, f'asgi-{slot}', directory=self.state_dir)
+        # Warm restart as in server_api: without live shared state the journals are loaded
+        if self.durable.open(restore=seeded) and seeded:
+            self.shared.publish(self.selector, self.risk)
+        self.durable.start()
+        await self.fetcher.start()
+        # One worker refreshes remote inputs and publishes the snapshot for all of them
+        self.leader = self.shared.try_lead()
+        if self.leader:
+            self.shared.publish_snapshot(await self.refresher.refresh_async(force=True))
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.fetcher.close()
+        if self.durable is not None:
+            self.durable.close()
+
+    async def _refresh_loop(self):
+        tick = min(self.refresher.intervals.values())
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                self.shared.publish_snapshot(await self.refresher.refresh_async())
+            except Exception as e:
+                print(f"Snapshot refresh failed: {e}")
+
+    def _sync(self):
+        # Cheap version check; state is copied in only when another worker changed it
+        self.scoring.reload()
+        version = self.shared.version
+        if version != self.version:
+            self.shared.load(self.selector, self.risk)
+            self.kill_switch.sync()
+            if self.equity.accounts:
+                self.risk.current_drawdown = self.equity.drawdown  # The live value wins over what was published
+            self.version = version
+            self.durable.record('sync')  # Changes published by the scheduler or other workers
+
+    def _snapshot(self):
+        return self.shared.read_snapshot(self.selector) or self.refresher.snapshot or self.refresher.build(time.time())
+
+    async def get_strategy(self, data):
+        self._sync()
+        snapshot = self._snapshot()
+        if self.kill_switch.halted:
+            return {'strategy': 'none', 'confidence': 0.0, 'snapshot_age': snapshot_age(snapshot)}
+        strategy, confidence = self.selector.select_strategy(snapshot.regime, snapshot.sentiment, snapshot.graph_hint)
+        return {'strategy': strategy, 'confidence': confidence, 'snapshot_age': snapshot_age(snapshot)}
+
+    async def get_lot(self, data):
+        self._sync()
+        snapshot = self._snapshot()
+        if self.kill_switch.halted:
+            return {'lot': 0, 'snapshot_age': snapshot_age(snapshot)}
+        balance = float(data.get('balance', 10000))
+        lot = self.risk.calculate_lot(balance, volatility=snapshot.volatility)
+        return {'lot': lot, 'snapshot_age': snapshot_age(snapshot)}
+
+    async def update(self, data):
+        # Same body as server_api's /update, "profit", "account" and "balance" feed the equity monitor
+        strategy = data['strategy']
+        win = data['win'] in (True, 1, '1', 'true', 'True')
+        if data.get('profit') is not None:
+            balance = data.get('balance')
+            self.kill_switch.record_trade(str(data.get('account', 'default')), float(data['profit']),
+                                          float(balance) if balance is not None else None)
+        with self.shared.transaction(self.selector, self.risk):
+            self.selector.update_win_rate(strategy, win)
+            self.risk.update_win_rate(self.selector.win_rates[strategy])
+            if self.equity.accounts:
+                self.risk.current_drawdown = self.equity.drawdown
+        self.version = self.shared.version
+        self.durable.record('update_win_rate', strategy=strategy, win=win)
+        return {'status': 'updated', 'halted': self.kill_switch.halted}
+
+    async def equity_state(self, data):
+        return self.kill_switch.as_dict()
+
+    async def push_equity(self, data):
+        balance = data.get('balance')
+        state = self.kill_switch.update_equity(str(data.get('account', 'default')), float(data['equity']),
+                                               float(balance) if balance is not None else None)
+        if self.kill_switch.publish_drawdown(self.selector, self.risk):
+            self.version = self.shared.version
+        return {'halted': self.kill_switch.halted, 'reason': self.shared.read_halt()['reason'],
+                'account': state.as_dict()}
+
+    async def reset_equity(self, data):
+        self.kill_switch.reset(data.get('account'))
+        return self.kill_switch.as_dict()
+
+    async def log(self, data):
+        logger.log_to_db(data.get('level', 'INFO'), data.get('message'), data.get('data'))
+        return {'status': 'logged'}
+
+    async def sentiment_metrics(self, data):
+        return await run_blocking(get_service().metrics)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await self.startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await self.shutdown()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            status, payload = 404, {'error': 'not found'}
+        else:
+            try:
+                status, payload = 200, await handler(parse_body(scope, body))
+            except (KeyError, ValueError) as e:
+                status, payload = 400, {'error': str(e)}
+        response = json.dumps(payload).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(response)).encode())]})
+        await send({'type': 'http.response.body', 'body': response})
+
+
+def parse_body(scope, body):
+    # JSON like the Flask routes, plus the form encoding the EA's WebRequest calls send
+    if not body:
+        return {}
+    headers = dict(scope.get('headers') or [])
+    if b'json' in headers.get(b'content-type', b'') or body[:1] in (b'{', b'['):
+        return json.loads(body)
+    return {k: v[-1] for k, v in urllib.parse.parse_qs(body.decode()).items()}
+
+
+# Minimal HTTP/1.1 front end (keep-alive, Content-Length bodies) for running without uvicorn
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+async def _handle_connection(app, reader, writer):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = lines[0].split(' ', 2)
+            headers = [tuple(line.split(':', 1)) for line in lines[1:] if ':' in line]
+            headers = [(k.strip().lower().encode(), v.strip().encode()) for k, v in headers]
+            header_map = dict(headers)
+            body = await reader.readexactly(int(header_map.get(b'content-length', b'0')))
+            path, _, query = target.partition('?')
+            scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(), 'headers': headers}
+            received = False
+            async def receive():
+                nonlocal received
+                if received:
+                    return {'type': 'http.disconnect'}
+                received = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            response = {}
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+                    response['headers'] = message['headers']
+                else:
+                    response['body'] = response.get('body', b'') + message.get('body', b'')
+            try:
+                await app(scope, receive, send)
+            except Exception as e:
+                print(f"Request failed: {e!r}")
+                response = {'status': 500, 'headers': [(b'content-length', b'0')], 'body': b''}
+            keep_alive = header_map.get(b'connection', b'keep-alive').lower() != b'close'
+            out = [f"HTTP/1.1 {response['status']} {STATUS_TEXT.get(response['status'], '')}"]
+            out += [f'{k.decode()}: {v.decode()}' for k, v in response['headers']]
+            out.append('connection: keep-alive' if keep_alive else 'connection: close')
+            writer.write(('\r\n'.join(out) + '\r\n\r\n').encode() + response.get('body', b''))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def _serve_socket(app, sock):
+    await app.startup()
+    server = await asyncio.start_server(lambda r, w: _handle_connection(app, r, w), sock=sock)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await app.shutdown()
+
+
+def serve(host='0.0.0.0', port=5000, workers=1, shared_path=None):
+    # Bind once, then fork workers that all accept on the same socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = []
+            break
+        children.append(pid)
+    try:
+        asyncio.run(_serve_socket(App(shared_path), sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, 15)
+            except ProcessLookupError:
+                pass
+
+
+app = App()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Smart EA decision API, asyncio serving mode')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
@@ -0,0 +1,328 @@
+import contextlib
+import csv
+import heapq
+import io
+import os
+import numpy as np
+
+try:
+    from .strategy_selector import StrategySelector
+    from .risk_engine import RiskEngine
+    from .scoring import MIN_CONFIDENCE
+    from . import metrics
+except ImportError:  # Run as a script from the ai/ folder
+    from strategy_selector import StrategySelector
+    from risk_engine import RiskEngine
+    from scoring import MIN_CONFIDENCE
+    import metrics
+
+# Replays M1 bars through StrategySelector + RiskEngine using the entry rules of
+# ea/smart_ea.mq5. Indicators are computed once, vectorized, before the bar loop.
+#
+# Win rates only move on closed trades, so a strategy that is deactivated (below 0.4) or whose
+# win rate can't lift it over MIN_CONFIDENCE under any inputs is never traded again: live, only
+# a restart or a retrain brings it back. Over a long replay that locks out every strategy after a
+# few dozen trades. With paper_trades on (the default) a locked-out strategy instead gets one
+# paper position at a time on its own signal, at MIN_CONFIDENCE sizing of SL/TP and with no
+# effect on the balance, whose outcome feeds its win rate; paper_trades=False replays the lock-in.
+
+BAR_FIELDS = ['time', 'open', 'high', 'low', 'close']
+MINUTE_NS = 60 * 1_000_000_000
+HOUR_NS = 60 * MINUTE_NS
+GRAPH_MAP = {'high_volatility': 'scalping', 'trending': 'breakout', 'ranging': 'reversal'}  # Same fallback as get_graph_data
+# CountOpenPositions() limits in the EA's *Trade functions: all open positions on the symbol count
+POSITION_CAPS = {'scalping': 10, 'breakout': 5, 'reversal': 5, 'news': 3, 'trend_following': 5}
+
+
+def load_bars_csv(path):
+    # Header row with time,open,high,low,close (extra columns are ignored); time is ISO-8601 or epoch seconds
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    bars = {'time': np.array([metrics.to_ns(r['time'] if not r['time'].isdigit() else int(r['time'])) for r in rows], dtype=np.int64)}
+    for field in BAR_FIELDS[1:]:
+        bars[field] = np.array([float(r[field]) for r in rows])
+    return bars
+
+
+def save_bars(bars, path):
+    # One .npy per field so workers can share the data through np.load(mmap_mode='r')
+    os.makedirs(path, exist_ok=True)
+    for field in BAR_FIELDS:
+        np.save(os.path.join(path, f'{field}.npy'), np.ascontiguousarray(bars[field]))
+
+
+def load_bars(path):
+    return {field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r') for field in BAR_FIELDS}
+
+
+def ema(values, alpha, block=256):
+    # Exact recursive EMA (y[i] = alpha*x[i] + (1-alpha)*y[i-1], seeded with x[0]) evaluated
+    # block by block in closed form; the block size keeps (1-alpha)^-k far from overflow
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    if len(values) == 0:
+        return out
+    decay = 1.0 - alpha
+    prev = values[0]
+    for start in range(0, len(values), block):
+        x = values[start:start + block]
+        k = np.arange(1, len(x) + 1)
+        powers = decay ** k
+        out[start:start + len(x)] = powers * (prev + np.cumsum(alpha * x / powers))
+        prev = out[start + len(x) - 1]
+    return out
+
+
+def sma(values, period):
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        c = np.concatenate(([0.0], np.cumsum(values)))
+        out[period - 1:] = (c[period:] - c[:-period]) / period
+    return out
+
+
+def rsi(close, period=14):
+    change = np.diff(close, prepend=close[0])
+    gain = ema(np.maximum(change, 0.0), 1.0 / period)
+    loss = ema(np.maximum(-change, 0.0), 1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100.0 - 100.0 / (1.0 + gain / loss)
+    value = np.where(loss == 0, 100.0, value)
+    value[:period] = np.nan
+    return value
+
+
+def atr(high, low, close, period=14):
+    prev_close = np.concatenate(([close[0]], close[:-1]))
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    value = ema(true_range, 1.0 / period)
+    value[:period] = np.nan
+    return value
+
+
+def resample(bars, minutes):
+    # Aggregate M1 bars into M{minutes} bars; returns the bucket bars and each M1 bar's bucket index
+    bucket = bars['time'] // (minutes * MINUTE_NS)
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    ends = np.concatenate((starts[1:], [len(bucket)])) - 1
+    higher = {
+        'time': bars['time'][starts],
+        'open': bars['open'][starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close': bars['close'][ends],
+    }
+    index = np.cumsum(np.concatenate(([False], bucket[1:] != bucket[:-1])))
+    return higher, index
+
+
+def _previous(values, index):
+    # Value of the last completed higher-timeframe bar for every M1 bar
+    out = np.full(len(index), np.nan)
+    has_prev = index > 0
+    out[has_prev] = values[index[has_prev] - 1]
+    return out
+
+
+def compute_signals(bars, point=0.01, seed=0):
+    # Direction per bar for each strategy: +1 buy, -1 sell, 0 no entry
+    close, high, low = bars['close'], bars['high'], bars['low']
+    m5, m5_index = resample(bars, 5)
+    ma5 = sma(close, 5)
+    prev_high = _previous(m5['high'], m5_index)
+    prev_low = _previous(m5['low'], m5_index)
+    rsi_m5 = _previous(rsi(m5['close']), m5_index)
+    ma50 = _previous(sma(m5['close'], 50), m5_index)
+    ma200 = _previous(sma(m5['close'], 200), m5_index)
+    atr_m1 = atr(high, low, close)
+    rng = np.random.default_rng(seed)
+    with np.errstate(invalid='ignore'):
+        signals = {
+            'scalping': np.where(close > ma5 + 5 * point, 1, np.where(close < ma5 - 5 * point, -1, 0)),
+            'breakout': np.where(close > prev_high, 1, np.where(close < prev_low, -1, 0)),
+            'reversal': np.where(rsi_m5 < 30, 1, np.where(rsi_m5 > 70, -1, 0)),
+            'news': np.where(atr_m1 > 0.001, rng.choice([-1, 1], size=len(close)), 0),
+            'trend_following': np.where(ma50 > ma200, 1, np.where(ma50 < ma200, -1, 0)),
+        }
+    return {s: v.astype(np.int8) for s, v in signals.items()}, atr_m1
+
+
+def market_inputs(atr_values, window=1440):
+    # Stand-ins for the remote regime/volatility inputs, derived from ATR relative to its recent mean
+    baseline = sma(np.nan_to_num(atr_values), window)
+    baseline = np.where(np.isnan(baseline), np.nanmean(atr_values), baseline)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.nan_to_num(atr_values / baseline)
+    volatility = np.clip(ratio / 2.0, 0.0, 1.0)
+    regimes = np.where(volatility > 0.7, 'high_volatility', np.where(volatility > 0.4, 'trending', 'ranging'))
+    return regimes, volatility
+
+
+class Backtester:
+    def __init__(self, bars, selector=None, risk=None, sentiment='neutral', graph_map=None, initial_balance=10000,
+                 contract_size=100, point=0.01, spread=0.0, horizon=1440, session=(13, 17), seed=0, quiet=True,
+                 position_caps=None, paper_trades=True):
+        self.bars = bars
+        self.selector = selector or StrategySelector()
+        self.risk = risk or RiskEngine()
+        self.sentiment = sentiment
+        self.graph_map = graph_map or GRAPH_MAP
+        self.initial_balance = initial_balance
+        self.contract_size = contract_size  # XAUUSD: 100 oz per lot
+        self.point = point
+        self.spread = spread
+        self.horizon = horizon
+        self.session = session  # Same overlap hours as IsTradeTime in the EA
+        self.seed = seed
+        self.quiet = quiet
+        self.position_caps = position_caps or POSITION_CAPS
+        self.paper_trades = paper_trades
+
+    def _exit(self, i, direction, entry, stop, target):
+        # First bar after i touching SL or TP (SL wins ties), else close at the horizon
+        end = min(len(self.bars['close']), i + 1 + self.horizon)
+        if end <= i + 1:
+            return i, entry
+        high = self.bars['high'][i + 1:end]
+        low = self.bars['low'][i + 1:end]
+        if direction > 0:
+            hit_sl, hit_tp = low <= stop, high >= target
+        else:
+            hit_sl, hit_tp = high >= stop, low <= target
+        hit = hit_sl | hit_tp
+        if hit.any():
+            j = int(np.argmax(hit))
+            return i + 1 + j, stop if hit_sl[j] else target
+        return end - 1, self.bars['close'][end - 1]
+
+    def _open_paper(self, i, signals, atr_values, reach, paper):
+        # Paper position for every locked-out strategy with a signal and none open yet
+        selector = self.selector
+        for k, strategy in enumerate(selector.strategies):
+            direction = int(signals[strategy][i])
+            if direction == 0 or strategy in paper:
+                continue
+            if selector.active[strategy] and min(1.0, reach[k] * selector.win_rates[strategy]) > MIN_CONFIDENCE:
+                continue
+            entry = self.bars['close'][i] + direction * self.spread / 2
+            stop = entry - direction * atr_values[i] * (2.0 - MIN_CONFIDENCE)
+            target = entry + direction * atr_values[i] * (4.0 * MIN_CONFIDENCE)
+            exit_index, exit_price = self._exit(i, direction, entry, stop, target)
+            paper[strategy] = (exit_index, direction * (exit_price - entry) > 0)
+            self.paper_count += 1
+
+    def run(self):
+        out = io.StringIO() if self.quiet else None
+        with contextlib.redirect_stdout(out) if self.quiet else contextlib.nullcontext():
+            return self._run()
+
+    def _run(self):
+        bars = self.bars
+        close = np.asarray(bars['close'])
+        signals, atr_values = compute_signals(bars, self.point, self.seed)
+        regimes, volatility = market_inputs(atr_values)
+        hours = (np.asarray(bars['time']) // HOUR_NS) % 24
+        tradable = (hours >= self.session[0]) & (hours < self.session[1]) & ~np.isnan(atr_values)
+        strategies = self.selector.strategies
+        codes = {s: i for i, s in enumerate(strategies)}
+        # Best base score of each strategy over all inputs: below MIN_CONFIDENCE / this it can't be selected
+        weights = self.selector.scoring.weights
+        reach = weights.reshape(-1, weights.shape[-1]).max(axis=0)
+        balance = float(self.initial_balance)
+        self.peak = balance
+        self.paper_count = 0
+        pending = []  # Heap of (exit_index, sequence, trade) for open positions
+        paper = {}  # Strategy -> (exit_index, win) of its open paper position
+        fills = []
+        for i in np.flatnonzero(tradable):
+            while pending and pending[0][0] <= i:
+                _, _, trade = heapq.heappop(pending)
+                balance = self._close(trade, balance, fills)
+            for strategy, (exit_index, win) in list(paper.items()):
+                if exit_index <= i:
+                    del paper[strategy]
+                    self.selector.update_win_rate(strategy, win)
+            if self.paper_trades:
+                self._open_paper(i, signals, atr_values, reach, paper)
+            regime = regimes[i]
+            strategy, confidence = self.selector.select_strategy(regime, self.sentiment, self.graph_map.get(regime, 'scalping'))
+            if strategy == 'none' or len(pending) >= self.position_caps.get(strategy, 0):
+                continue
+            direction = int(signals[strategy][i])
+            if direction == 0:
+                continue
+            lot = self.risk.calculate_lot(balance, confidence=confidence, volatility=volatility[i])
+            if lot <= 0:
+                continue
+            if strategy == 'news':
+                lot *= 2  # Aggressive lot, as in NewsTrade
+            entry = close[i] + direction * self.spread / 2
+            sl_offset = atr_values[i] * (2.0 - confidence)
+            tp_offset = atr_values[i] * (4.0 * confidence)
+            exit_index, exit_price = self._exit(i, direction, entry, entry - direction * sl_offset, entry + direction * tp_offset)
+            trade = {
+                'entry_index': int(i), 'exit_index': exit_index, 'strategy': strategy, 'code': codes[strategy],
+                'direction': direction, 'lot': lot, 'entry': entry, 'exit': exit_price, 'confidence': confidence,
+            }
+            heapq.heappush(pending, (exit_index, len(fills) + len(pending), trade))
+        while pending:
+            _, _, trade = heapq.heappop(pending)
+            balance = self._close(trade, balance, fills)
+        return self._result(fills, balance)
+
+    def _close(self, trade, balance, fills):
+        trade['profit'] = trade['direction'] * (trade['exit'] - trade['entry']) * trade['lot'] * self.contract_size
+        win = trade['profit'] > 0
+        # Same feedback as the /update route
+        self.selector.update_win_rate(trade['strategy'], win)
+        self.risk.update_win_rate(self.selector.win_rates[trade['strategy']])
+        fills.append(trade)
+        balance += trade['profit']
+        self.peak = max(self.peak, balance)
+        self.risk.update_drawdown((self.peak - balance) / self.peak)
+        return balance
+
+    def _result(self, fills, balance):
+        n = len(fills)
+        times = np.asarray(self.bars['time'])
+        columns = {
+            'entry_time': np.fromiter((times[t['entry_index']] for t in fills), dtype=np.int64, count=n),
+            'exit_time': np.fromiter((times[t['exit_index']] for t in fills), dtype=np.int64, count=n),
+            'strategy': np.fromiter((t['code'] for t in fills), dtype=np.uint8, count=n),
+            'direction': np.fromiter((t['direction'] for t in fills), dtype=np.int8, count=n),
+            'lot': np.fromiter((t['lot'] for t in fills), dtype=np.float64, count=n),
+            'profit': np.fromiter((t['profit'] for t in fills), dtype=np.float64, count=n),
+            'confidence': np.fromiter((t['confidence'] for t in fills), dtype=np.float64, count=n),
+        }
+        report = metrics.strategy_report(columns['strategy'], columns['profit'], self.selector.strategies,
+                                         columns['exit_time'], self.initial_balance)
+        win_rates = {s: (report[s]['win_rate'] if report[s]['win_rate'] is not None else 0.5) for s in self.selector.strategies}
+        return {
+            'fills': columns,
+            'equity': metrics.equity_curve(columns['profit'], self.initial_balance),
+            'balance': balance,
+            'report': report,
+            # Same shape evaluate_performance works with
+            'win_rates': win_rates,
+            'drawdown': report['total']['max_drawdown'],
+            'sharpe': report['total']['sharpe'],
+            'paper_trades': self.paper_count,
+        }
+
+
+if __name__ == '__main__':
+    # python backtest.py <bars dir or csv> [--save <dir>]: --save converts a CSV for the optimizer
+    import sys
+    import time
+    path = sys.argv[1]
+    bars = load_bars(path) if os.path.isdir(path) else load_bars_csv(path)
+    if '--save' in sys.argv:
+        save_bars(bars, sys.argv[sys.argv.index('--save') + 1])
+        print(f"Saved {len(bars['time'])} bars to {sys.argv[sys.argv.index('--save') + 1]}")
+        sys.exit(0)
+    start = time.perf_counter()
+    result = Backtester(bars).run()
+    print(f"{len(result['fills']['profit'])} trades in {time.perf_counter() - start:.2f}s")
+    print(f"Balance: {result['balance']:.2f}, Drawdown: {result['drawdown']:.2%}, Sharpe: {result['sharpe']:.4f}")
+    print(f"Win rates: {result['win_rates']}")
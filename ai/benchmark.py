@@ -0,0 +1,494 @@
+import argparse
+import asyncio
+import atexit
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+try:
+    from .strategy_selector import StrategySelector
+    from .risk_engine import RiskEngine
+    from .model_loop import ModelLoop
+    from .trade_analytics import TradeAnalytics
+    from .trade_store import TradeStore
+    from .market_state import MarketState
+    from .sentiment import SentimentService, SentimentCache
+    from .durable_state import DurableState, recover
+    from .graph_server import serve as serve_graph
+    from . import binary_server, knowledge_graph, logger, loadtest, metrics, synthetic
+    from . import scoring as scoring_module
+except ImportError:  # Run as a script from the ai/ folder
+    from strategy_selector import StrategySelector
+    from risk_engine import RiskEngine
+    from model_loop import ModelLoop
+    from trade_analytics import TradeAnalytics
+    from trade_store import TradeStore
+    from market_state import MarketState
+    from sentiment import SentimentService, SentimentCache
+    from durable_state import DurableState, recover
+    from graph_server import serve as serve_graph
+    import binary_server, knowledge_graph, logger, loadtest, metrics, synthetic
+    import scoring as scoring_module
+
+# Benchmark suite: every external service (PostgREST, BytePlus, news APIs, MCP) is replaced by
+# a local stub, results are written as JSON and compared against a stored baseline.
+#   python benchmark.py run --save-baseline      # record a baseline on this machine
+#   python benchmark.py run                      # writes benchmarks/latest.json
+#   python benchmark.py compare --threshold 0.2  # exit code 1 on a >20% throughput drop, 2 without a baseline
+# Baselines are machine specific and not committed: record one before the first compare.
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+LATEST_FILE = os.path.join(BENCH_DIR, 'latest.json')
+HISTORY_SIZES = [1000, 100000, 1000000]
+FULL_HISTORY_SIZES = HISTORY_SIZES + [10000000]
+REPORT_BUDGET_TRADES = 10000000
+REPORT_BUDGET_SECONDS = 1.5  # strategy_report over 10M trades, measured at 0.7-1.1 s on one core
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes, full_sizes=None):
+    # full_sizes: what `run --full` measures instead of `sizes`
+    def register(func):
+        BENCHMARKS[name] = (func, sizes, full_sizes or sizes)
+        return func
+    return register
+
+
+def measure(func, ops, repeat=3):
+    # Best of `repeat` timings; returns the result dict shared by all benchmarks
+    best = min(_timed(func) for _ in range(repeat))
+    return {'ops': ops, 'seconds': best, 'ops_per_sec': ops / best if best > 0 else float('inf')}
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def working_dir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextlib.contextmanager
+def http_stub(handler_factory):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_factory)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class PostgRESTStub(BaseHTTPRequestHandler):
+    # Accepts bulk inserts like PostgREST and counts the rows
+    rows = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'[]')
+        type(self).rows += len(body) if isinstance(body, list) else 1
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_shipper(journal_dir):
+    # log_to_db ships to a local PostgREST stub for the duration of the block
+    with http_stub(PostgRESTStub) as server:
+        PostgRESTStub.rows = 0
+        previous = logger._shipper
+        logger._shipper = logger.LogShipper(url=f'http://127.0.0.1:{server.server_address[1]}/logs', policy='block',
+                                            journal_path=os.path.join(journal_dir, 'journal.txt')).start()
+        try:
+            yield logger._shipper
+        finally:
+            logger._shipper.close(timeout=60)
+            logger._shipper = previous
+
+
+class StubResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class StubTradesTable:
+    # In-process PostgREST trades table over synthetic columns (id=gt.N, order=id.asc, limit)
+    def __init__(self, columns, strategies=synthetic.STRATEGIES):
+        self.columns = columns
+        self.strategies = strategies
+
+    def get(self, url, params=None, timeout=None):
+        after = int(params['id'][3:])
+        start = int(np.searchsorted(self.columns['id'], after, side='right'))
+        return StubResponse(synthetic.trade_rows(self.columns, self.strategies, start, start + int(params['limit'])))
+
+
+class StubNewsSession:
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.calls = 0
+
+    def get(self, url, timeout=None):
+        self.calls += 1
+        return StubResponse(self.payloads[self.calls % len(self.payloads)])
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        return StubResponse({'sentiment': 'positive', 'reasoning': 'stub'})
+
+
+def seeded_analytics(columns, size, strategies, state_path, session):
+    # Analytics state as if the first `size` trades had already been synced
+    analytics = TradeAnalytics(strategies, state_path=state_path, session=session)
+    codes, profit = columns['strategy'][:size], columns['profit'][:size]
+    counts = np.bincount(codes, minlength=len(strategies))
+    wins = np.bincount(codes, weights=profit > 0, minlength=len(strategies))
+    totals = np.bincount(codes, weights=profit, minlength=len(strategies))
+    equity = metrics.equity_curve(profit, analytics.initial_balance)
+    state = analytics.state
+    for i, s in enumerate(strategies):
+        state['strategies'][s] = {'trades': int(counts[i]), 'wins': int(wins[i]), 'profit': float(totals[i])}
+    state.update(trades=size, last_id=int(columns['id'][size - 1]), balance=float(equity[-1]),
+                 peak=float(max(analytics.initial_balance, equity.max())),
+                 max_drawdown=float(metrics.max_drawdown(profit, analytics.initial_balance)))
+    state['current_drawdown'] = (state['peak'] - state['balance']) / state['peak']
+    return analytics
+
+
+@benchmark('select_strategy', [100000])
+def bench_select_strategy(size):
+    selector = StrategySelector()
+    inputs = [('trending', 'positive', 'breakout'), ('ranging', 'neutral', 'reversal'),
+              ('high_volatility', 'negative', 'scalping')]
+    def run():
+        for i in range(size):
+            selector.select_strategy(*inputs[i % 3])
+    return measure(run, size)
+
+
+@benchmark('score_batch', [100000])
+def bench_score_batch(size):
+    # Confidences and decisions for `size` symbol/account rows with their own inputs in one pass,
+    # plus the cost of rebuilding the decision table after a win-rate change
+    selector = StrategySelector()
+    scoring = selector.scoring
+    rng = np.random.default_rng(0)
+    regimes = rng.integers(0, len(scoring.regimes), size)
+    sentiments = rng.integers(0, len(scoring.sentiments), size)
+    hints = rng.integers(0, len(scoring.hints), size)
+    win_rates = rng.uniform(0.3, 0.8, (size, len(selector.strategies)))
+    active = win_rates > 0.4
+    def run():
+        scoring_module.decide(scoring.confidences(win_rates, regimes, sentiments, hints), active)
+    result = measure(run, size)
+    rebuilds = 1000
+    rates = rng.uniform(0.3, 0.8, (rebuilds, len(selector.strategies))).tolist()
+    start = time.perf_counter()
+    for i in range(rebuilds):
+        scoring.decisions(rates[i], [True] * len(selector.strategies))
+    result['rebuild_us'] = (time.perf_counter() - start) / rebuilds * 1e6
+    return result
+
+
+@benchmark('calculate_lot', [100000])
+def bench_calculate_lot(size):
+    # Volatility from the streaming estimators over pushed bars, as in the API
+    risk = RiskEngine()
+    risk.market = MarketState()
+    risk.market.push('XAUUSD', synthetic.bar_rows(synthetic.bar_series(500)))
+    balances = np.linspace(1000, 100000, 97).tolist()
+    def run():
+        for i in range(size):
+            risk.calculate_lot(balances[i % 97])
+    return measure(run, size)
+
+
+@benchmark('evaluate_performance', HISTORY_SIZES, FULL_HISTORY_SIZES)
+def bench_evaluate_performance(size, new_trades=1000):
+    # `size` trades of history already stored, `new_trades` arriving through the PostgREST stub
+    strategies = synthetic.STRATEGIES
+    columns = synthetic.trade_history(size + new_trades, strategies, seed=1)
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp, working_dir(tmp), contextlib.redirect_stdout(io.StringIO()):
+        for run in range(5 if size <= 100000 else 1):
+            store = TradeStore(os.path.join(tmp, f'store-{run}'), strategies)
+            store.append({name: values[:size] for name, values in columns.items()})
+            analytics = seeded_analytics(columns, size, strategies, os.path.join(tmp, f'state-{run}.json'),
+                                         StubTradesTable(columns, strategies))
+            loop = ModelLoop(analytics, store)  # Never the default store and analytics under ai/state
+            timings.append(_timed(loop.evaluate_performance))
+            assert len(loop.store) == size + new_trades
+    best = min(timings)
+    return {'ops': 1, 'seconds': best, 'ops_per_sec': 1 / best, 'trades': size + new_trades}
+
+
+@benchmark('strategy_report', [1000000], [1000000, REPORT_BUDGET_TRADES])
+def bench_strategy_report(size):
+    # Per-strategy risk report straight from the columns; 10M trades over the budget is a failed
+    # result (flagged by compare), not an error that stops the suite
+    columns = synthetic.trade_history(size, seed=2)
+    def run():
+        metrics.strategy_report(columns['strategy'], columns['profit'], synthetic.STRATEGIES, columns['timestamp'])
+    result = measure(run, size)
+    result['budget_seconds'] = REPORT_BUDGET_SECONDS * size / REPORT_BUDGET_TRADES
+    if size >= REPORT_BUDGET_TRADES and result['seconds'] > result['budget_seconds']:
+        result['failed'] = f"over the {result['budget_seconds']:.3f} s budget"
+    return result
+
+
+@contextlib.contextmanager
+def decision_api():
+    # server_api (imported lazily, it builds the Flask app) against a local graph server and fixed inputs,
+    # with its shared state in a temp dir rather than the production file
+    if 'SMART_EA_SHARED_STATE' not in os.environ:
+        shared_dir = tempfile.mkdtemp(prefix='smart_ea_bench_')
+        atexit.register(shutil.rmtree, shared_dir, True)
+        os.environ['SMART_EA_SHARED_STATE'] = os.path.join(shared_dir, 'smart_ea_state')
+    try:
+        from . import server_api
+    except ImportError:
+        import server_api
+    graph_server = serve_graph(port=0)
+    previous_graph = knowledge_graph._graph
+    knowledge_graph._graph = knowledge_graph.KnowledgeGraph(functools.partial(
+        knowledge_graph.mcp_call, url=f'http://127.0.0.1:{graph_server.server_address[1]}'))
+    server_api.refresher.update_inputs(regime='trending', sentiment='positive', volatility=0.3)
+    try:
+        yield server_api
+    finally:
+        graph_server.shutdown()
+        knowledge_graph._graph = previous_graph
+
+
+@contextlib.contextmanager
+def flask_server(app):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+
+
+DECISION_MIX = [('GET', '/strategy', None), ('POST', '/risk/lot', {'balance': 10000})]
+
+
+@benchmark('decision_routes', [2000])
+def bench_decision_routes(size, connections=16):
+    # /strategy and /risk/lot on the Flask app under concurrent keep-alive load
+    with decision_api() as server_api, flask_server(server_api.app) as url:
+        result = asyncio.run(loadtest.run(url, connections, size, DECISION_MIX))
+    if result['errors']:
+        raise RuntimeError(f"{result['errors']} failed requests")
+    return {'ops': result['requests'], 'seconds': result['seconds'], 'ops_per_sec': result['throughput'],
+            'p50_ms': result['p50_ms'], 'p99_ms': result['p99_ms'], 'connections': connections}
+
+
+@benchmark('binary_transport', [2000])
+def bench_binary_transport(size, window=64):
+    # The EA's strategy + lot calls one at a time over the binary socket and over HTTP/JSON (one
+    # connection each), plus binary throughput with `window` requests pipelined per send
+    mix = [(binary_server.STRATEGY, {'symbol': 'XAUUSD'}), (binary_server.LOT, {'balance': 10000, 'symbol': 'XAUUSD'})]
+    with decision_api() as server_api, flask_server(server_api.app) as url:
+        http = asyncio.run(loadtest.run(url, 1, size, DECISION_MIX))
+        server = binary_server.serve(port=0, backend=server_api.decisions)
+        try:
+            with binary_server.BinaryClient(port=server.server_address[1]) as client:
+                latencies = []
+                start = time.perf_counter()
+                for i in range(size):
+                    kind, values = mix[i % 2]
+                    sent = time.perf_counter()
+                    client.call(kind, **values)
+                    latencies.append(time.perf_counter() - sent)
+                elapsed = time.perf_counter() - start
+                pipelined_start = time.perf_counter()
+                for i in range(0, size, window):
+                    replies = client.pipeline([mix[j % 2] for j in range(i, min(size, i + window))])
+                    if any(isinstance(r, Exception) for r in replies):
+                        raise RuntimeError('binary request failed')
+                pipelined = time.perf_counter() - pipelined_start
+        finally:
+            server.shutdown()
+            server.server_close()
+    if http['errors']:
+        raise RuntimeError(f"{http['errors']} failed requests")
+    lat = np.array(latencies) * 1000
+    p50 = float(np.percentile(lat, 50))
+    return {'ops': size, 'seconds': elapsed, 'ops_per_sec': size / elapsed,
+            'p50_ms': p50, 'p99_ms': float(np.percentile(lat, 99)),
+            'pipelined_ops_per_sec': size / pipelined, 'window': window,
+            'http_ops_per_sec': http['throughput'], 'http_p50_ms': http['p50_ms'], 'http_p99_ms': http['p99_ms'],
+            'speedup_p50': http['p50_ms'] / p50}
+
+
+@benchmark('log_to_db', [20000])
+def bench_log_to_db(size):
+    # Rows per second from log_to_db until PostgREST (stub) acknowledged them
+    with tempfile.TemporaryDirectory() as tmp, stub_shipper(tmp) as shipper:
+        start = time.perf_counter()
+        for i in range(size):
+            logger.log_to_db('INFO', 'Trade executed with strategy scalping', {'trade_id': i, 'profit': 1.5})
+        shipper.close(timeout=60)
+        elapsed = time.perf_counter() - start
+        if PostgRESTStub.rows != size:
+            raise RuntimeError(f'{size - PostgRESTStub.rows} rows not delivered')
+    return {'ops': size, 'seconds': elapsed, 'ops_per_sec': size / elapsed}
+
+
+@benchmark('news_sentiment', [2000])
+def bench_news_sentiment(size):
+    # Concurrent news fetch + content-hash cache lookup; 20 distinct stories so most calls hit
+    os.environ.setdefault('BYTEPLUS_API_KEY', 'benchmark')
+    with tempfile.TemporaryDirectory() as tmp, stub_shipper(tmp):
+        service = SentimentService(cache=SentimentCache(os.path.join(tmp, 'cache.sqlite')),
+                                   session=StubNewsSession(synthetic.news_payloads(200, distinct=20)))
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = measure(lambda: [service.get_sentiment() for _ in range(size)], size, repeat=1)
+        result['hit_rate'] = service.metrics()['hit_rate']
+    return result
+
+
+@benchmark('state_journal', [20000])
+def bench_state_journal(size):
+    # /update-style win-rate changes recorded to the WAL with batched fsync, then cold recovery from
+    # the full log and from a snapshot
+    strategies = StrategySelector().strategies
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        selector, risk = StrategySelector(), RiskEngine()
+        durable = DurableState(selector, risk, 'api', directory=tmp, checkpoint_every=2 * size)
+        durable.open(restore=False)
+        durable.start()
+        start = time.perf_counter()
+        for i in range(size):
+            strategy, win = strategies[i % len(strategies)], i % 3 != 0
+            selector.update_win_rate(strategy, win)
+            risk.update_win_rate(selector.win_rates[strategy])
+            durable.record('update_win_rate', strategy=strategy, win=win)
+        elapsed = time.perf_counter() - start
+        durable.close()
+        syncs = durable.stats()['syncs']
+        recover_start = time.perf_counter()
+        restored = DurableState(StrategySelector(), RiskEngine(), 'api', directory=tmp).apply(recover(tmp))
+        wal_seconds = time.perf_counter() - recover_start
+        if restored == 0 or recover(tmp)[f'win_rates.{strategies[0]}'] != selector.win_rates[strategies[0]]:
+            raise RuntimeError('state not recovered from the WAL')
+        compact = DurableState(selector, risk, 'api', directory=tmp)
+        compact.open(restore=False)
+        compact.checkpoint()
+        compact.close()
+        snapshot_seconds = _timed(lambda: recover(tmp))
+    return {'ops': size, 'seconds': elapsed, 'ops_per_sec': size / elapsed, 'syncs': syncs,
+            'recover_wal_ms': wal_seconds * 1000, 'recover_snapshot_ms': snapshot_seconds * 1000}
+
+
+def run_suite(only=None, full=False, sizes=None):
+    results = {}
+    for name, (func, default_sizes, full_sizes) in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        for size in sizes or (full_sizes if full else default_sizes):
+            key = f'{name}[{size}]'
+            results[key] = func(size)
+            failed = f" FAILED: {results[key]['failed']}" if 'failed' in results[key] else ''
+            print(f"{key}: {results[key]['ops_per_sec']:.1f} ops/s ({results[key]['seconds']:.3f} s){failed}")
+    return {
+        'meta': {'created_at': time.time(), 'python': platform.python_version(), 'numpy': np.__version__,
+                 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    # Throughput change per benchmark present in both; a drop beyond `threshold` is a regression,
+    # and so is any failed current result (e.g. over its time budget)
+    rows, regressions = [], []
+    for key, base in baseline['results'].items():
+        result = current['results'].get(key)
+        if result is None:
+            continue
+        change = result['ops_per_sec'] / base['ops_per_sec'] - 1
+        rows.append((key, base['ops_per_sec'], result['ops_per_sec'], change))
+        if change < -threshold:
+            regressions.append(key)
+    regressions += [key for key, result in current['results'].items() if 'failed' in result and key not in regressions]
+    return rows, regressions
+
+
+def save(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Smart EA benchmark suite')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Run the benchmarks and write JSON results')
+    run_parser.add_argument('--only', help='Comma-separated benchmark names: ' + ', '.join(BENCHMARKS))
+    run_parser.add_argument('--full', action='store_true', help='Include 10M-trade histories and the report budget')
+    run_parser.add_argument('--out', default=LATEST_FILE)
+    run_parser.add_argument('--save-baseline', action='store_true', help=f'Also write {BASELINE_FILE}')
+    compare_parser = commands.add_parser('compare', help='Fail if a benchmark regressed against the baseline')
+    compare_parser.add_argument('--baseline', default=BASELINE_FILE)
+    compare_parser.add_argument('--current', default=LATEST_FILE)
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help='Allowed throughput drop (0.2 = 20%%)')
+    args = parser.parse_args()
+    if args.command == 'run':
+        results = run_suite(args.only.split(',') if args.only else None, args.full)
+        save(results, args.out)
+        if args.save_baseline:
+            save(results, BASELINE_FILE)
+    else:
+        for path, hint in ((args.baseline, 'record one on this machine with `python benchmark.py run --save-baseline`'),
+                           (args.current, 'run `python benchmark.py run` first')):
+            if not os.path.exists(path):
+                print(f'No benchmark results at {path}: {hint}')
+                raise SystemExit(2)
+        current = load(args.current)
+        rows, regressions = compare(load(args.baseline), current, args.threshold)
+        for key, base, ops_per_sec, change in rows:
+            flag = '  REGRESSION' if key in regressions else ''
+            print(f'{key:40s} {base:12.1f} -> {ops_per_sec:12.1f} ops/s ({change:+.1%}){flag}')
+        for key, result in current['results'].items():
+            if 'failed' in result:
+                print(f"{key:40s} FAILED: {result['failed']}")
+        raise SystemExit(1 if regressions else 0)
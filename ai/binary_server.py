@@ -0,0 +1,325 @@
+import argparse
+import math
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+try:
+    from . import instrumentation
+except ImportError:  # Run as a script from the ai/ folder
+    import instrumentation
+
+# Persistent TCP transport for the EA next to the Flask routes: fixed-layout little-endian
+# frames, any number of requests in flight per connection, replies carry the request id.
+#
+#   header  <HBBII  magic 0x4553, version, message type, request id, payload length   (12 bytes)
+#
+#   type  request                                          reply (type | 0x80)
+#   0x01  strategy  <32s     symbol                        <B7xdd   strategy, confidence, snapshot_age
+#   0x02  lot       <d32s    balance, symbol               <dd      lot, snapshot_age
+#   0x03  update    <BB6xQdd strategy, win, account,       <d       win_rate
+#                            profit, balance
+#   0x04  log       <B7xdd64s level, lot, confidence, msg  (empty)
+#   0x05  equity    <Qdd     account, equity, balance      <B7xdd   halted, drawdown, daily_loss
+#   0xFF  error                                            <H6x56s  code, message
+#
+# Strategies and log levels are sent as their index in STRATEGIES / LEVELS (same order as the EA),
+# 0xFF is "none". Accounts are the MT5 login (0 = "default"), NaN stands for an omitted profit/balance.
+# Symbols are NUL-padded names whose regime/volatility the decision uses, empty for the shared snapshot.
+# Layouts have no implicit padding so MQL5 structs map onto them directly.
+
+MAGIC = 0x4553
+VERSION = 3
+HEADER = struct.Struct('<HBBII')
+MAX_PAYLOAD = 1024
+DEFAULT_PORT = 5001
+
+STRATEGY, LOT, UPDATE, LOG, EQUITY = 0x01, 0x02, 0x03, 0x04, 0x05
+REPLY = 0x80
+ERROR = 0xFF
+BAD_MESSAGE, BAD_PAYLOAD, HANDLER_FAILED = 1, 2, 3
+
+STRATEGIES = ('scalping', 'breakout', 'reversal', 'news', 'trend_following')
+LEVELS = ('INFO', 'WARNING', 'ERROR', 'CRITICAL', 'TRADE_OPEN', 'TRADE_CLOSE', 'PARTIAL_CLOSE', 'HEDGE_OPEN')
+NONE = 0xFF
+
+MESSAGES = {
+    STRATEGY: ('strategy', struct.Struct('<32s'), ('symbol',)),
+    LOT: ('lot', struct.Struct('<d32s'), ('balance', 'symbol')),
+    UPDATE: ('update', struct.Struct('<BB6xQdd'), ('strategy', 'win', 'account', 'profit', 'balance')),
+    LOG: ('log', struct.Struct('<B7xdd64s'), ('level', 'lot', 'confidence', 'message')),
+    EQUITY: ('equity', struct.Struct('<Qdd'), ('account', 'equity', 'balance')),
+    STRATEGY | REPLY: ('strategy', struct.Struct('<B7xdd'), ('strategy', 'confidence', 'snapshot_age')),
+    LOT | REPLY: ('lot', struct.Struct('<dd'), ('lot', 'snapshot_age')),
+    UPDATE | REPLY: ('update', struct.Struct('<d'), ('win_rate',)),
+    LOG | REPLY: ('log', struct.Struct('<'), ()),
+    EQUITY | REPLY: ('equity', struct.Struct('<B7xdd'), ('halted', 'drawdown', 'daily_loss')),
+    ERROR: ('error', struct.Struct('<H6x56s'), ('code', 'message')),
+}
+
+
+class ProtocolError(Exception):
+    def __init__(self, message, code=BAD_MESSAGE):
+        super().__init__(message)
+        self.code = code
+
+
+def _index(names, value):
+    return names.index(value) if value in names else NONE
+
+
+def _name(names, index):
+    return names[index] if index < len(names) else 'none'
+
+
+def _text(raw):
+    return raw.rstrip(b'\0').decode('utf-8', 'ignore')
+
+
+def _optional(value):
+    return None if math.isnan(value) else value
+
+
+# Field name -> (to wire, from wire); fields not listed are numbers
+CODECS = {
+    'strategy': (lambda v: _index(STRATEGIES, v), lambda v: _name(STRATEGIES, v)),
+    'level': (lambda v: _index(LEVELS, v) if v in LEVELS else 0, lambda v: _name(LEVELS, v)),
+    'message': (lambda v: (v or '').encode('utf-8'), _text),
+    'symbol': (lambda v: (v or '').encode('utf-8'), lambda v: _text(v) or None),
+    'win': (int, bool),
+    'halted': (int, bool),
+    'account': (lambda v: int(v) if str(v).isdigit() else 0, lambda v: str(v) if v else 'default'),
+    'profit': (lambda v: math.nan if v is None else v, _optional),
+}
+
+
+def pack(kind, request_id, **values):
+    name, layout, fields = MESSAGES[kind]
+    # Fields with a codec may be omitted (an empty message/symbol, NaN profit)
+    raw = [CODECS[f][0](values.get(f)) if f in CODECS else values[f] for f in fields]
+    return HEADER.pack(MAGIC, VERSION, kind, request_id, layout.size) + layout.pack(*raw)
+
+
+def unpack(kind, payload):
+    if kind not in MESSAGES:
+        raise ProtocolError(f'Unknown message type 0x{kind:02x}')
+    name, layout, fields = MESSAGES[kind]
+    if len(payload) != layout.size:
+        raise ProtocolError(f'{name}: expected {layout.size} payload bytes, got {len(payload)}', BAD_PAYLOAD)
+    return {f: CODECS[f][1](v) if f in CODECS else v for f, v in zip(fields, layout.unpack(payload))}
+
+
+def frames(buffer):
+    # Complete frames at the start of `buffer` as (type, request id, payload); returns them and the bytes used
+    found, offset = [], 0
+    while len(buffer) - offset >= HEADER.size:
+        magic, version, kind, request_id, length = HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ProtocolError(f'Bad frame header (magic 0x{magic:04x}, version {version})')
+        if length > MAX_PAYLOAD:
+            raise ProtocolError(f'Payload of {length} bytes exceeds {MAX_PAYLOAD}', BAD_PAYLOAD)
+        end = offset + HEADER.size + length
+        if len(buffer) < end:
+            break
+        found.append((kind, request_id, bytes(buffer[offset + HEADER.size:end])))
+        offset = end
+    return found, offset
+
+
+class Dispatcher:
+    # Maps request frames onto a backend with strategy(symbol), lot(balance, symbol), update(strategy, win, profit,
+    # account, balance), equity(account, equity, balance) and log(level, message, data) --
+    # server_api.decisions in production
+    def __init__(self, backend):
+        self.backend = backend
+        self.handlers = {STRATEGY: self.strategy, LOT: self.lot, UPDATE: self.update, LOG: self.log,
+                         EQUITY: self.equity}
+
+    def strategy(self, symbol):
+        strategy, confidence, age = self.backend.strategy(symbol)
+        return {'strategy': strategy, 'confidence': confidence, 'snapshot_age': age}
+
+    def lot(self, balance, symbol):
+        lot, age = self.backend.lot(balance, symbol)
+        return {'lot': lot, 'snapshot_age': age}
+
+    def update(self, strategy, win, account, profit, balance):
+        if strategy not in STRATEGIES:
+            raise ProtocolError('Unknown strategy', BAD_PAYLOAD)
+        return {'win_rate': self.backend.update(strategy, win, profit, account, _optional(balance))}
+
+    def equity(self, account, equity, balance):
+        result = self.backend.equity(account, equity, _optional(balance))
+        return {'halted': result['halted'], 'drawdown': result['account']['drawdown'],
+                'daily_loss': result['account']['daily_loss']}
+
+    def log(self, level, lot, confidence, message):
+        self.backend.log(level, message, {'lot': lot, 'confidence': confidence})
+        return {}
+
+    def dispatch(self, kind, request_id, payload):
+        start = time.perf_counter()
+        handler = self.handlers.get(kind)
+        try:
+            if handler is None:
+                raise ProtocolError(f'Unknown request type 0x{kind:02x}')
+            reply = pack(kind | REPLY, request_id, **handler(**unpack(kind, payload)))
+            status = 200
+        except ProtocolError as e:
+            reply = pack(ERROR, request_id, code=e.code, message=str(e))
+            status = 400
+        except Exception as e:
+            reply = pack(ERROR, request_id, code=HANDLER_FAILED, message=f'{type(e).__name__}: {e}')
+            status = 500
+        name = MESSAGES[kind][0] if handler is not None else 'unknown'
+        instrumentation.REQUEST_SECONDS.observe(time.perf_counter() - start, 'BINARY', name, status)
+        return reply
+
+
+class ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buffer = bytearray()
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            try:
+                found, used = frames(buffer)
+            except ProtocolError as e:
+                # The stream can't be resynchronised after a bad header: report it and drop the connection
+                sock.sendall(pack(ERROR, 0, code=e.code, message=str(e)))
+                return
+            del buffer[:used]
+            if found:
+                # Pipelined requests that arrived together are answered with a single send
+                sock.sendall(b''.join(self.server.dispatcher.dispatch(*frame) for frame in found))
+
+
+class BinaryServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, backend):
+        super().__init__(address, ConnectionHandler)
+        self.dispatcher = Dispatcher(backend)
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, backend=None):
+    # Returns the running server; port=0 picks a free port (server.server_address[1])
+    if backend is None:
+        try:
+            from .server_api import decisions
+        except ImportError:
+            from server_api import decisions
+        backend = decisions
+    server = BinaryServer((host, port), backend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class BinaryClient:
+    # Reference client: call() for one round trip, send()/flush()/receive() or pipeline() for
+    # keeping many requests in flight on the same connection
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.next_id = 1
+        self.pending = []
+        self.buffer = bytearray()
+        self.replies = {}
+
+    def send(self, kind, **values):
+        request_id = self.next_id
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF or 1
+        self.pending.append(pack(kind, request_id, **values))
+        return request_id
+
+    def flush(self):
+        if self.pending:
+            self.sock.sendall(b''.join(self.pending))
+            self.pending = []
+
+    def receive(self, request_id):
+        # Reply for `request_id`; replies to other ids read on the way are kept for later
+        while request_id not in self.replies:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError('Connection closed by server')
+            self.buffer += chunk
+            found, used = frames(self.buffer)
+            del self.buffer[:used]
+            for kind, reply_id, payload in found:
+                self.replies[reply_id] = (kind, payload)
+        kind, payload = self.replies.pop(request_id)
+        values = unpack(kind, payload)
+        if kind == ERROR:
+            raise ProtocolError(values['message'], values['code'])
+        return values
+
+    def call(self, kind, **values):
+        request_id = self.send(kind, **values)
+        self.flush()
+        return self.receive(request_id)
+
+    def pipeline(self, requests):
+        # [(type, {field: value}), ...] -> replies in the same order, errors returned as ProtocolError
+        ids = [self.send(kind, **values) for kind, values in requests]
+        self.flush()
+        results = []
+        for request_id in ids:
+            try:
+                results.append(self.receive(request_id))
+            except ProtocolError as e:
+                results.append(e)
+        return results
+
+    def strategy(self, symbol=None):
+        return self.call(STRATEGY, symbol=symbol)
+
+    def lot(self, balance, symbol=None):
+        return self.call(LOT, balance=balance, symbol=symbol)
+
+    def update(self, strategy, win, profit=None, account=0, balance=math.nan):
+        return self.call(UPDATE, strategy=strategy, win=win, account=account, profit=profit,
+                         balance=math.nan if balance is None else balance)
+
+    def equity(self, account, equity, balance=math.nan):
+        return self.call(EQUITY, account=account, equity=equity, balance=math.nan if balance is None else balance)
+
+    def log(self, level, message, lot=0.0, confidence=0.0):
+        return self.call(LOG, level=level, message=message, lot=lot, confidence=confidence)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Binary TCP transport for the Smart EA decision routes')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        from .server_api import decisions, refresher
+    except ImportError:
+        from server_api import decisions, refresher
+    refresher.start()
+    server = serve(args.host, args.port, decisions)
+    print(f'Binary server listening on {args.host}:{server.server_address[1]}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,31 @@
+import time
+
+# Shared by the sentiment sources/LLM calls and the log shipper's PostgREST writes
+
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive failures, lets one trial call through after reset_timeout
+    def __init__(self, failure_threshold=3, reset_timeout=60, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if self.clock() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        return self.state != 'open'
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == 'half_open':
+            self.opened_at = self.clock()
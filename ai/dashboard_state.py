@@ -0,0 +1,159 @@
+import collections
+import json
+import threading
+import time
+
+# Versioned, cached dashboard state plus a server-sent-events stream of deltas, so dashboards
+# cost the tick-serving process one fingerprint comparison per poll instead of a page render.
+
+DASHBOARD_EVENTS = 50  # Recent log/trade entries included in the full state
+RISK_FIELDS = ['lot', 'max_positions', 'max_drawdown', 'current_drawdown', 'win_rate', 'volatility']
+TRADE_LEVELS = ('TRADE_OPEN', 'TRADE_CLOSE', 'PARTIAL_CLOSE', 'HEDGE_OPEN')
+
+
+class EventRing:
+    # Last `size` log/trade entries with a global sequence number, so a reader can ask
+    # for everything after the entry it saw last
+    def __init__(self, size=500):
+        self.entries = collections.deque(maxlen=size)
+        self.seq = 0
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        with self._lock:
+            self.seq += 1
+            entry = dict(entry, seq=self.seq)
+            self.entries.append(entry)
+        for listener in self.listeners:
+            listener()
+        return entry
+
+    def since(self, seq):
+        # Entries after `seq`, or None when some of them were already overwritten
+        with self._lock:
+            if self.seq - seq > len(self.entries):
+                return None
+            return list(self.entries)[len(self.entries) - (self.seq - seq):]
+
+    def recent(self, n):
+        with self._lock:
+            return list(self.entries)[-n:]
+
+
+def log_entry(level, message, data=None, timestamp=None):
+    return {
+        'kind': 'trade' if level in TRADE_LEVELS else 'log',
+        'level': level,
+        'message': message,
+        'data': data,
+        'timestamp': timestamp or time.time(),
+    }
+
+
+def diff(old, new):
+    # Changed strategy/risk fields only
+    delta = {}
+    strategies = {}
+    for name, fields in new['strategies'].items():
+        before = old['strategies'].get(name, {})
+        changed = {k: v for k, v in fields.items() if before.get(k) != v}
+        if changed:
+            strategies[name] = changed
+    if strategies:
+        delta['strategies'] = strategies
+    risk = {k: v for k, v in new['risk'].items() if old['risk'].get(k) != v}
+    if risk:
+        delta['risk'] = risk
+    return delta
+
+
+def sse(event, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class DashboardState:
+    def __init__(self, selector, risk, events, sync=None, poll_interval=1.0, keepalive=15.0):
+        self.selector = selector
+        self.risk = risk
+        self.events = events
+        self.sync = sync  # Called before reading, e.g. to pick up state published by the scheduler
+        self.poll_interval = poll_interval
+        self.keepalive = keepalive
+        self.boot = int(time.time())  # Keeps ETags from one run from matching the next
+        self.version = 0
+        self._fingerprint = None
+        self._state = None
+        self._body = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        events.listeners.append(self.changed)
+
+    def changed(self):
+        # Wake the SSE streams; mutating routes call this after updating selector/risk
+        with self._changed:
+            self._changed.notify_all()
+
+    def _current_fingerprint(self):
+        s, r = self.selector, self.risk
+        return (tuple(s.win_rates[n] for n in s.strategies), tuple(s.active[n] for n in s.strategies),
+                tuple(s.confidence[n] for n in s.strategies), tuple(getattr(r, f) for f in RISK_FIELDS),
+                self.events.seq)
+
+    def _build(self):
+        s, r = self.selector, self.risk
+        return {
+            'version': self.version,
+            'strategies': {n: {'win_rate': s.win_rates[n], 'active': s.active[n], 'confidence': s.confidence[n]}
+                           for n in s.strategies},
+            'risk': {**{f: getattr(r, f) for f in RISK_FIELDS}, 'risk_level': r.current_risk_level},
+            'events': self.events.recent(DASHBOARD_EVENTS),
+            'last_event': self.events.seq,
+        }
+
+    def current(self):
+        # (version, state dict, JSON bytes); rebuilt only when something changed
+        if self.sync is not None:
+            self.sync()
+        fingerprint = self._current_fingerprint()
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self.version += 1
+                self._state = self._build()
+                self._body = json.dumps(self._state).encode()
+            return self.version, self._state, self._body
+
+    def etag(self, version):
+        return f'"{self.boot}-{version}"'
+
+    def stream(self):
+        # Full state first, then only deltas and new log/trade entries
+        version, state, _ = self.current()
+        yield sse('snapshot', state, version)
+        last_seq = state['last_event']
+        idle = 0.0
+        while True:
+            with self._changed:
+                self._changed.wait(self.poll_interval)
+            new_version, new_state, _ = self.current()
+            if new_version == version:
+                idle += self.poll_interval
+                if idle >= self.keepalive:
+                    idle = 0.0
+                    yield ': keepalive\n\n'
+                continue
+            idle = 0.0
+            entries = self.events.since(last_seq)
+            if entries is None:  # Fell behind the ring: start over from a full state
+                yield sse('snapshot', new_state, new_version)
+                last_seq = new_state['last_event']
+            else:
+                delta = diff(state, new_state)
+                if delta:
+                    yield sse('state', dict(delta, version=new_version), new_version)
+                for entry in entries:
+                    yield sse(entry['kind'], entry, new_version)
+                    last_seq = entry['seq']
+            version, state = new_version, new_state
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+# Immutable view of every remote input the decision routes need. The request
+# handlers only read the latest snapshot, the refresher thread builds new ones.
+# Remote fetches run outside the lock that guards the inputs, so local updates never wait on them.
+# Regime and volatility are per symbol once the EA pushed enough bars for it (market_state.py),
+# layered over the shared inputs by symbol_inputs / SnapshotRefresher.for_symbol.
+DecisionSnapshot = namedtuple('DecisionSnapshot', [
+    'regime', 'sentiment', 'graph_hint', 'volatility', 'confidence', 'input_times', 'created_at'
+])
+
+DEFAULTS = {
+    'regime': 'ranging',
+    'sentiment': 'neutral',
+    'graph_hint': 'scalping',
+    'volatility': 0.5,
+}
+# Seconds between refreshes of each input
+REFRESH_INTERVALS = {
+    'regime': 1,
+    'sentiment': 300,  # Same as the old in-selector sentiment cache
+    'graph_hint': 60,
+    'volatility': 30,
+}
+# After this many seconds without a successful refresh the input falls back to its default
+MAX_AGE = {
+    'regime': 30,
+    'sentiment': 1800,
+    'graph_hint': 600,
+    'volatility': 300,
+}
+
+
+def snapshot_age(snapshot, now=None):
+    return max(0.0, (now if now is not None else time.time()) - snapshot.created_at)
+
+
+def symbol_inputs(selector, snapshot, symbol):
+    # (regime, graph_hint, volatility) for `symbol`: from its own bars when MarketState has enough
+    # of them, the snapshot's shared values otherwise
+    market = selector.market
+    state = market.get(symbol) if market is not None and symbol else None
+    if state is None:
+        return snapshot.regime, snapshot.graph_hint, snapshot.volatility
+    regime = state.regime
+    hint = snapshot.graph_hint if regime == snapshot.regime else selector.get_graph_data(regime)
+    return regime, hint, state.volatility
+
+
+class SnapshotRefresher:
+    def __init__(self, selector, risk, intervals=None, max_age=None, clock=time.time):
+        self.selector = selector
+        self.risk = risk
+        self.intervals = {**REFRESH_INTERVALS, **(intervals or {})}
+        self.max_age = {**MAX_AGE, **(max_age or {})}
+        self.clock = clock
+        self.values = dict(DEFAULTS)
+        self.times = {name: 0.0 for name in DEFAULTS}
+        self.snapshot = None
+        self._symbols = {}  # symbol -> ((snapshot time, bars), snapshot for that symbol)
+        self._lock = threading.Lock()  # Guards values/times while they are recorded, never held over a fetch
+        self._refreshing = threading.Lock()  # Serializes refreshes, readers never take it
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _fetch(self, name, regime=None):
+        if name == 'regime':
+            return self.selector.get_market_regime()
+        if name == 'sentiment':
+            return self.selector.get_news_sentiment()
+        if name == 'graph_hint':
+            return self.selector.get_graph_data(regime if regime is not None else self.values['regime'])
+        if name == 'volatility':
+            self.risk.update_volatility()
+            return self.risk.volatility
+        raise KeyError(name)
+
+    def due(self, now, force=False):
+        return [name for name in DEFAULTS if force or now - self.times[name] >= self.intervals[name]]
+
+    def record(self, name, value, now):
+        self.values[name] = value
+        self.times[name] = now
+
+    def build(self, now):
+        values = {
+            name: (self.values[name] if now - self.times[name] <= self.max_age[name] else DEFAULTS[name])
+            for name in DEFAULTS
+        }
+        scores = self.selector.score_strategies(values['regime'], values['sentiment'], values['graph_hint'])
+        self.snapshot = DecisionSnapshot(
+            regime=values['regime'],
+            sentiment=values['sentiment'],
+            graph_hint=values['graph_hint'],
+            volatility=values['volatility'],
+            confidence=MappingProxyType(scores),
+            input_times=MappingProxyType(dict(self.times)),
+            created_at=now,
+        )
+        return self.snapshot
+
+    def refresh(self, force=False):
+        with self._refreshing:
+            now = self.clock()
+            fetched = {}
+            for name in self.due(now, force):  # Regime first, graph_hint depends on it
+                try:
+                    fetched[name] = self._fetch(name, fetched.get('regime'))
+                except Exception as e:
+                    print(f"Snapshot refresh of {name} failed: {e}")
+            with self._lock:
+                for name, value in fetched.items():
+                    self.record(name, value, now)
+                return self.build(now)
+
+    def update_inputs(self, **values):
+        # Inputs computed locally are applied at once instead of on the next tick
+        now = self.clock()
+        if 'regime' in values and 'graph_hint' not in values:
+            try:
+                values['graph_hint'] = self._fetch('graph_hint', values['regime'])
+            except Exception as e:
+                print(f"Snapshot refresh of graph_hint failed: {e}")
+        with self._lock:
+            for name, value in values.items():
+                self.record(name, value, now)
+            return self.build(now)
+
+    def for_symbol(self, symbol, snapshot=None):
+        # Snapshot with the symbol's own regime/volatility (symbol_inputs), rebuilt only when the
+        # shared snapshot or the symbol's bars changed
+        snapshot = snapshot if snapshot is not None else self.current()
+        market = self.selector.market
+        state = market.get(symbol) if market is not None and symbol else None
+        if state is None:
+            return snapshot
+        key = (snapshot.created_at, state.bars)
+        cached = self._symbols.get(symbol)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        regime, hint, volatility = symbol_inputs(self.selector, snapshot, symbol)
+        scores = self.selector.score_strategies(regime, snapshot.sentiment, hint)
+        derived = snapshot._replace(regime=regime, graph_hint=hint, volatility=volatility,
+                                    confidence=MappingProxyType(scores))
+        self._symbols[symbol] = (key, derived)
+        return derived
+
+    def current(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self.refresh(force=True)
+        return snapshot
+
+    def _run(self):
+        tick = min(self.intervals.values())
+        while not self._stop.wait(tick):
+            self.refresh()
+
+    def start(self):
+        if self._thread is None:
+            self.refresh(force=True)
+            self._thread = threading.Thread(target=self._run, name='snapshot-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
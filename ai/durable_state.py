@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+try:
+    from .shared_state import RISK_FIELDS
+except ImportError:  # Run as a script from the ai/ folder
+    from shared_state import RISK_FIELDS
+
+# Learned strategy/risk state on disk, for warm restarts: every state change appends the changed
+# fields to a write-ahead log, and a compact snapshot replaces the log every CHECKPOINT_EVERY
+# records. Each process writes its own journal (state/api, state/scheduler); on startup the
+# snapshots and log tails of all journals are merged, newest value per field wins.
+#
+#   state/<name>/snapshot.json   {"values": {field: value}, "times": {field: t}}
+#   state/<name>/wal.log         "<crc32> {"t": ..., "event": ..., "set": {field: value}}" per line
+
+STATE_DIR = os.environ.get('SMART_EA_STATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state'))
+# Seconds between WAL fsyncs (records are written immediately, fsync is batched); 0 = fsync every record
+SYNC_INTERVAL = float(os.environ.get('SMART_EA_WAL_SYNC_INTERVAL', 0.2))
+CHECKPOINT_EVERY = 1000
+SNAPSHOT_FILE = 'snapshot.json'
+WAL_FILE = 'wal.log'
+
+
+class WriteAheadLog:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab', buffering=0)  # One write() per record, nothing held in userspace
+        self.records = 0
+        self.syncs = 0
+        self.dirty = False
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')).encode()
+        self._file.write(b'%08x %s\n' % (zlib.crc32(line), line))
+        self.records += 1
+        self.dirty = True
+
+    def sync(self):
+        if self.dirty:
+            os.fsync(self._file.fileno())
+            self.syncs += 1
+            self.dirty = False
+
+    def rotate(self, old_path):
+        # Current log becomes `old_path` (kept until the snapshot covering it is durable), a new one starts
+        self.sync()
+        self._file.close()
+        os.replace(self.path, old_path)
+        self._file = open(self.path, 'ab', buffering=0)
+        self.records = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+def read_log(path):
+    # Records in file order; stops at the first torn or corrupt line (a crash mid-write)
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                crc, _, body = line.rstrip(b'\n').partition(b' ')
+                if not line.endswith(b'\n') or crc != b'%08x' % zlib.crc32(body):
+                    break
+                yield json.loads(body)
+    except OSError:
+        return
+
+
+def _merge(values, times, fields, t):
+    for field, value in fields.items():
+        if t >= times.get(field, float('-inf')):
+            values[field] = value
+            times[field] = t
+
+
+def load_journal(directory):
+    # (values, times, log records) of one journal: snapshot, then a log left over from a checkpoint, then the log
+    values, times = {}, {}
+    try:
+        with open(os.path.join(directory, SNAPSHOT_FILE)) as f:
+            snapshot = json.load(f)
+        values, times = snapshot['values'], snapshot['times']
+    except (OSError, ValueError, KeyError):
+        pass
+    records = 0
+    for name in (WAL_FILE + '.old', WAL_FILE):
+        for record in read_log(os.path.join(directory, name)):
+            _merge(values, times, record['set'], record['t'])
+            records += 1
+    return values, times, records
+
+
+def recover(directory=STATE_DIR):
+    # Newest value of every field across all journals in `directory`
+    values, times = {}, {}
+    if not os.path.isdir(directory):
+        return values
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            journal_values, journal_times, _ = load_journal(path)
+            for field, value in journal_values.items():
+                _merge(values, times, {field: value}, journal_times[field])
+    return values
+
+
+class DurableState:
+    def __init__(self, selector, risk, name, loop=None, directory=STATE_DIR, sync_interval=SYNC_INTERVAL,
+                 checkpoint_every=CHECKPOINT_EVERY, clock=time.time, fleet=None):
+        self.selector = selector
+        self.risk = risk
+        self.loop = loop  # ModelLoop, for last_retrain
+        self.fleet = fleet  # FleetState, for the batch routes' per-symbol/per-account rows
+        self.name = name
+        self.directory = directory
+        self.path = os.path.join(directory, name)
+        self.sync_interval = sync_interval
+        self.checkpoint_every = checkpoint_every
+        self.clock = clock
+        self.wal = None  # Nothing is touched on disk until open()
+        self.values = {}
+        self.times = {}
+        self.records = 0
+        self.syncs = 0  # fsyncs of closed logs; the open one counts its own
+        self.checkpoints = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def fields(self):
+        values = {}
+        for s in self.selector.strategies:
+            values[f'win_rates.{s}'] = self.selector.win_rates[s]
+            values[f'active.{s}'] = self.selector.active[s]
+            values[f'confidence.{s}'] = self.selector.confidence[s]
+        for field in RISK_FIELDS:
+            values[field] = getattr(self.risk, field)
+        if self.loop is not None:
+            values['last_retrain'] = self.loop.last_retrain
+        if self.fleet is not None:
+            values.update(self.fleet.fields())
+        return values
+
+    def apply(self, values):
+        applied = 0
+        if self.fleet is not None:
+            applied += self.fleet.apply(values)
+        for field, value in values.items():
+            group, _, strategy = field.partition('.')
+            if strategy:
+                target = getattr(self.selector, group, None)
+                if not isinstance(target, dict) or strategy not in target:
+                    continue
+                target[strategy] = value
+            elif field in RISK_FIELDS:
+                setattr(self.risk, field, value)
+            elif field == 'last_retrain' and self.loop is not None:
+                self.loop.last_retrain = value
+            else:
+                continue
+            applied += 1
+        return applied
+
+    def open(self, restore=True):
+        # Loads this journal as the base for later diffs; with restore=True also applies the merged
+        # state of all journals to selector/risk/loop. Returns the number of fields restored.
+        os.makedirs(self.path, exist_ok=True)
+        self.values, self.times, records = load_journal(self.path)
+        old_path = os.path.join(self.path, WAL_FILE + '.old')
+        if os.path.exists(old_path):  # Interrupted checkpoint: finish it from what was just loaded
+            self._write_snapshot(self._snapshot())
+            os.remove(old_path)
+            open(os.path.join(self.path, WAL_FILE), 'wb').close()
+            records = 0
+        self.wal = WriteAheadLog(os.path.join(self.path, WAL_FILE))
+        self.wal.records = records
+        return self.apply(recover(self.directory)) if restore else 0
+
+    def record(self, event, **info):
+        # Appends the fields that changed since the last record; cheap enough for the request path
+        if self.wal is None:
+            return 0
+        now = self.clock()
+        current = self.fields()
+        with self._lock:
+            changed = {k: v for k, v in current.items() if self.values.get(k) != v}
+            if not changed:
+                return 0
+            _merge(self.values, self.times, changed, now)
+            self.wal.append({'t': now, 'event': event, **info, 'set': changed})
+            self.records += 1
+            if self.sync_interval <= 0:
+                self.wal.sync()
+        if self.sync_interval <= 0 and self.wal.records >= self.checkpoint_every:
+            self.checkpoint()
+        return len(changed)
+
+    def _snapshot(self):
+        return {'created_at': self.clock(), 'values': dict(self.values), 'times': dict(self.times)}
+
+    def _write_snapshot(self, snapshot):
+        tmp = os.path.join(self.path, SNAPSHOT_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, SNAPSHOT_FILE))
+
+    def checkpoint(self):
+        # The log is rotated under the lock (cheap), the snapshot is written outside it; until the
+        # snapshot is in place the rotated log stays on disk and is replayed on recovery
+        if self.wal is None:
+            return
+        old_path = os.path.join(self.path, WAL_FILE + '.old')
+        with self._lock:
+            snapshot = self._snapshot()
+            self.wal.rotate(old_path)
+        self._write_snapshot(snapshot)
+        os.remove(old_path)
+        self.checkpoints += 1
+
+    def flush(self):
+        # Batched fsync, plus a checkpoint once enough records accumulated
+        if self.wal is None:
+            return
+        with self._lock:
+            self.wal.sync()
+        if self.wal.records >= self.checkpoint_every:
+            self.checkpoint()
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f'State journal flush failed: {e}')
+
+    def start(self):
+        if self._thread is None and self.sync_interval > 0:
+            self._thread = threading.Thread(target=self._run, name=f'durable-{self.name}', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.wal is not None:
+            with self._lock:
+                self.wal.close()
+                self.syncs += self.wal.syncs
+            self.wal = None
+
+    def stats(self):
+        wal_syncs = self.wal.syncs if self.wal is not None else 0
+        return {'records': self.records, 'syncs': self.syncs + wal_syncs, 'checkpoints': self.checkpoints}
@@ -0,0 +1,283 @@
+import queue
+import threading
+import time
+
+try:
+    from .trade_analytics import INITIAL_BALANCE
+    from .knowledge_graph import create_entities
+    from . import logger
+except ImportError:  # Run as a script from the ai/ folder
+    from trade_analytics import INITIAL_BALANCE
+    from knowledge_graph import create_entities
+    import logger
+
+# Live equity, peak, drawdown and daily loss per account, pushed by /update trade outcomes and
+# /equity floating P&L from the EA instead of polled from the trade history. Each push is O(1);
+# crossing the limits flips `halted`. KillSwitch publishes it through SharedState, so a halt tripped
+# in any worker or server mode stops decisions in all of them with one slot read per tick.
+# Alerts go through a queue to a background thread, the request path never waits on them.
+
+DAY = 24 * 3600
+DAILY_LOSS_LIMIT = 0.03  # 3% of the equity at the start of the (UTC) day
+WARN_FRACTION = 0.8  # Same early-warning level as RiskEngine.calculate_lot's pause rule
+DRAWDOWN_PUBLISH_STEP = 0.001
+
+
+def log_alert(level, message, data, created_at):
+    logger.log_to_db(level, message, data)
+
+
+def graph_alert(level, message, data, created_at):
+    create_entities([{'name': f'Equity_Alert_{created_at}', 'entityType': 'Alert', 'observations': [message]}])
+
+
+class AlertQueue:
+    def __init__(self, sinks=None):
+        self.sinks = sinks if sinks is not None else [log_alert, graph_alert]
+        self.queue = queue.SimpleQueue()
+        self.sent = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def emit(self, level, message, data=None):
+        self.queue.put((level, message, data, time.time()))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='equity-alerts', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            alert = self.queue.get()
+            if alert is None:
+                return
+            for sink in self.sinks:
+                try:
+                    sink(*alert)
+                except Exception as e:
+                    print(f'Alert sink {getattr(sink, "__name__", sink)} failed: {e}')
+            self.sent += 1
+
+    def close(self, timeout=5):
+        with self._lock:
+            if self._thread is not None:
+                self.queue.put(None)
+                self._thread.join(timeout)
+                self._thread = None
+
+
+class AccountEquity:
+    __slots__ = ('balance', 'floating', 'peak', 'day', 'day_start', 'drawdown', 'daily_loss', 'halted',
+                 'updated_at')
+
+    def __init__(self, balance, day):
+        self.balance = balance
+        self.floating = 0.0
+        self.peak = balance
+        self.day = day
+        self.day_start = balance
+        self.drawdown = 0.0
+        self.daily_loss = 0.0
+        self.halted = None  # (kind, reason) once a limit was crossed
+        self.updated_at = None
+
+    @property
+    def equity(self):
+        return self.balance + self.floating
+
+    def update(self, day):
+        equity = self.equity
+        if day != self.day:
+            self.day = day
+            self.day_start = equity
+            if self.halted is not None and self.halted[0] == 'daily_loss':
+                self.halted = None  # Daily limits reset with the day, drawdown halts need reset()
+        self.peak = max(self.peak, equity)
+        self.drawdown = (self.peak - equity) / self.peak if self.peak > 0 else 0.0
+        self.daily_loss = max(0.0, (self.day_start - equity) / self.day_start) if self.day_start > 0 else 0.0
+
+    def as_dict(self):
+        return {'balance': self.balance, 'equity': self.equity, 'peak': self.peak, 'drawdown': self.drawdown,
+                'daily_loss': self.daily_loss, 'halted': self.halted[1] if self.halted else None,
+                'updated_at': self.updated_at}
+
+
+class EquityMonitor:
+    def __init__(self, risk, daily_loss_limit=DAILY_LOSS_LIMIT, initial_balance=INITIAL_BALANCE, alerts=None,
+                 clock=time.time):
+        self.risk = risk  # max_drawdown is read from here; current_drawdown is kept at the worst account
+        self.daily_loss_limit = daily_loss_limit
+        self.initial_balance = initial_balance
+        self.alerts = alerts if alerts is not None else AlertQueue()
+        self.clock = clock
+        self.accounts = {}
+        self.halted = False  # Kill switch
+        self.reason = None
+        self.kind = None  # 'drawdown' or 'daily_loss', of the halt `reason` describes
+        self.worst = None  # Account with the largest drawdown
+        self.drawdown = 0.0  # Its drawdown, mirrored into risk.current_drawdown
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def _account(self, account, balance):
+        state = self.accounts.get(account)
+        if state is None:
+            start = balance if balance is not None else self.initial_balance
+            state = self.accounts[account] = AccountEquity(start, int(self.clock() // DAY))
+        return state
+
+    def record_trade(self, account, profit, balance=None):
+        # Closed trade: realized P&L, or the balance reported after the close
+        with self._lock:
+            state = self._account(account, balance if balance is None else balance - profit)
+            state.balance = balance if balance is not None else state.balance + profit
+            return self._check(account, state)
+
+    def update_equity(self, account, equity, balance=None):
+        # Floating P&L push from the EA
+        with self._lock:
+            state = self._account(account, balance if balance is not None else equity)
+            if balance is not None:
+                state.balance = balance
+            state.floating = equity - state.balance
+            return self._check(account, state)
+
+    def _check(self, account, state):
+        now = self.clock()
+        was_halted = state.halted is not None
+        state.update(int(now // DAY))
+        state.updated_at = now
+        if was_halted and state.halted is None:
+            self._refresh_halted()
+        if account == self.worst:
+            if state.drawdown < self.drawdown:
+                # Only when the worst account recovered is a scan over the accounts needed
+                self.worst = max(self.accounts, key=lambda a: self.accounts[a].drawdown)
+        elif self.worst is None or state.drawdown >= self.drawdown:
+            self.worst = account
+        self.drawdown = self.risk.current_drawdown = self.accounts[self.worst].drawdown
+        max_drawdown = self.risk.max_drawdown
+        if state.drawdown >= max_drawdown * WARN_FRACTION:
+            if account not in self._warned:
+                self._warned.add(account)
+                self.alerts.emit('WARNING', f'Account {account} drawdown {state.drawdown:.2%} '
+                                            f'approaching {max_drawdown:.2%}', state.as_dict())
+        else:
+            self._warned.discard(account)
+        if state.halted is None:
+            if state.drawdown >= max_drawdown:
+                self._trip(account, state, 'drawdown', f'drawdown {state.drawdown:.2%} >= {max_drawdown:.2%}')
+            elif state.daily_loss >= self.daily_loss_limit:
+                self._trip(account, state, 'daily_loss',
+                           f'daily loss {state.daily_loss:.2%} >= {self.daily_loss_limit:.2%}')
+        return state
+
+    def _trip(self, account, state, kind, reason):
+        state.halted = (kind, reason)
+        self.reason = f'{account}: {reason}'
+        self.kind = kind
+        self.halted = True
+        self.alerts.emit('CRITICAL', f'Kill switch on, account {account} {reason}', state.as_dict())
+
+    def _refresh_halted(self):
+        halted = [(a, s.halted) for a, s in self.accounts.items() if s.halted is not None]
+        self.reason = f'{halted[0][0]}: {halted[0][1][1]}' if halted else None
+        self.kind = halted[0][1][0] if halted else None
+        self.halted = bool(halted)
+
+    def reset(self, account=None, alert=True):
+        # Manual resume: the account's peak and day start are re-based on its current equity
+        with self._lock:
+            for name, state in self.accounts.items():
+                if account is None or name == account:
+                    state.halted = None
+                    state.peak = state.day_start = state.equity
+                    state.update(state.day)
+            self._refresh_halted()
+            if self.worst is not None:
+                self.worst = max(self.accounts, key=lambda a: self.accounts[a].drawdown)
+                self.drawdown = self.risk.current_drawdown = self.accounts[self.worst].drawdown
+        if alert:
+            self.alerts.emit('INFO', f'Kill switch reset ({account or "all accounts"})', {'halted': self.halted})
+
+    def as_dict(self):
+        with self._lock:
+            return {'halted': self.halted, 'reason': self.reason, 'daily_loss_limit': self.daily_loss_limit,
+                    'max_drawdown': self.risk.max_drawdown,
+                    'accounts': {name: state.as_dict() for name, state in self.accounts.items()}}
+
+
+class KillSwitch:
+    # An EquityMonitor's halt shared by every worker: trips are published to SharedState, decision
+    # paths read the shared flag, and manual resumes made through one worker are replayed in the others
+    def __init__(self, monitor, shared):
+        self.monitor = monitor
+        self.shared = shared
+        self.resets = shared.halt_resets
+        self.published = None  # (kind, reason) of the halt this worker published
+
+    @property
+    def halted(self):
+        return self.shared.halted
+
+    def record_trade(self, account, profit, balance=None):
+        self.sync()
+        return self._publish(self.monitor.record_trade(account, profit, balance))
+
+    def update_equity(self, account, equity, balance=None):
+        self.sync()
+        return self._publish(self.monitor.update_equity(account, equity, balance))
+
+    def _publish(self, state):
+        if self.monitor.halted:
+            if not self.shared.halted:
+                self.shared.publish_halt(True, self.monitor.reason)
+                self.published = (self.monitor.kind, self.monitor.reason)
+        elif self.published is not None:
+            kind, reason = self.published
+            self.published = None
+            # This worker's daily-loss halt lapsed with the day: resume every worker. The shared
+            # reason may be truncated; a halt published since by another worker stays on
+            shared_reason = self.shared.read_halt()['reason']
+            if kind == 'daily_loss' and self.shared.halted and shared_reason and reason.startswith(shared_reason):
+                self.shared.publish_halt(False)
+        return state
+
+    def sync(self):
+        # Resets made through another worker, applied without a second alert
+        if self.shared.halt_resets != self.resets:
+            info = self.shared.read_halt()
+            self.resets = info['resets']
+            self.published = None
+            self.monitor.reset(None if info['reset'] == '*' else info['reset'], alert=False)
+
+    def reset(self, account=None):
+        self.sync()
+        self.monitor.reset(account)
+        self.published = None
+        info = self.shared.read_halt()
+        # A halt another worker tripped for a different account stays on
+        other = info['halted'] and account is not None and not (info['reason'] or '').startswith(f'{account}: ')
+        if self.monitor.halted:
+            halted, reason = True, self.monitor.reason
+        elif other:
+            halted, reason = True, info['reason']
+        else:
+            halted, reason = False, None
+        self.resets = self.shared.publish_halt(halted, reason, reset=account or '*')
+
+    def publish_drawdown(self, selector, risk, step=DRAWDOWN_PUBLISH_STEP):
+        # Live drawdown into the shared risk fields in steps rather than per tick, for the
+        # scheduler's check_drawdown and the other workers
+        if abs(self.monitor.drawdown - self.shared.read_risk()['current_drawdown']) < step:
+            return False
+        with self.shared.transaction(selector, risk):
+            risk.current_drawdown = self.monitor.drawdown
+        return True
+
+    def as_dict(self):
+        data = self.monitor.as_dict()
+        info = self.shared.read_halt()
+        data.update(halted=info['halted'], reason=info['reason'])
+        return data
@@ -0,0 +1,198 @@
+import threading
+import numpy as np
+
+try:
+    from .scoring import decide
+    from .decision_snapshot import symbol_inputs
+except ImportError:  # Run as a script from the ai/ folder
+    from scoring import decide
+    from decision_snapshot import symbol_inputs
+
+# Per-symbol strategy state and per-account risk state for EA fleets. Rows are keyed
+# by symbol / account and start from the values of the template StrategySelector and
+# RiskEngine; a batch of decisions is computed in one NumPy pass over the rows. Regime and
+# volatility are the symbol's own (MarketState bars pushed by the EA) once it has enough bars.
+# With a kill switch (equity_monitor.KillSwitch) a halt answers every row with no trade, and
+# batch outcomes carrying a profit feed its equity monitor. Rows are journaled by the server's
+# DurableState (fields()/apply()) so batch outcomes survive a restart; only the Flask server
+# has the batch routes, so the rows live in that one process rather than in SharedState.
+
+RISK_COLUMNS = ['lot', 'max_positions', 'max_drawdown', 'current_drawdown', 'win_rate']
+
+
+class FleetState:
+    def __init__(self, selector, risk, capacity=16, kill_switch=None):
+        self.selector = selector  # Template and source of the scoring rules
+        self.risk = risk  # Template and source of lot multipliers
+        self.kill_switch = kill_switch
+        self.strategies = selector.strategies
+        self.symbols = {}
+        self.accounts = {}
+        self.win_rates = np.empty((capacity, len(self.strategies)))
+        self.active = np.empty((capacity, len(self.strategies)), dtype=bool)
+        self.risk_state = {name: np.empty(capacity) for name in RISK_COLUMNS}
+        self._lock = threading.Lock()
+
+    def _grow(self, arrays, needed):
+        size = len(next(iter(arrays.values())))
+        if needed <= size:
+            return arrays
+        size = max(needed, size * 2)
+        grown = {}
+        for name, values in arrays.items():
+            new = np.empty((size,) + values.shape[1:], dtype=values.dtype)
+            new[:len(values)] = values
+            grown[name] = new
+        return grown
+
+    def symbol_rows(self, symbols):
+        # Row index per symbol, creating rows from the template selector for new symbols
+        rows = np.empty(len(symbols), dtype=np.intp)
+        for i, symbol in enumerate(symbols):
+            row = self.symbols.get(symbol)
+            if row is None:
+                with self._lock:
+                    row = self.symbols.get(symbol)
+                    if row is None:
+                        row = len(self.symbols)
+                        grown = self._grow({'win_rates': self.win_rates, 'active': self.active}, row + 1)
+                        self.win_rates, self.active = grown['win_rates'], grown['active']
+                        self.win_rates[row] = [self.selector.win_rates[s] for s in self.strategies]
+                        self.active[row] = [self.selector.active[s] for s in self.strategies]
+                        self.symbols[symbol] = row
+            rows[i] = row
+        return rows
+
+    def account_rows(self, accounts):
+        rows = np.empty(len(accounts), dtype=np.intp)
+        for i, account in enumerate(accounts):
+            row = self.accounts.get(account)
+            if row is None:
+                with self._lock:
+                    row = self.accounts.get(account)
+                    if row is None:
+                        row = len(self.accounts)
+                        self.risk_state = self._grow(self.risk_state, row + 1)
+                        for name in RISK_COLUMNS:
+                            self.risk_state[name][row] = getattr(self.risk, name)
+                        self.accounts[account] = row
+            rows[i] = row
+        return rows
+
+    def decide(self, requests, snapshot, risk_per_trade=0.01):
+        # requests: list of {'symbol', 'account', 'balance'}; returns one decision per request
+        if not requests:
+            return []
+        if self.kill_switch is not None and self.kill_switch.halted:
+            return [{'symbol': r.get('symbol'), 'account': r.get('account'), 'strategy': 'none', 'confidence': 0.0,
+                     'lot': 0.0} for r in requests]
+        names = [str(r.get('symbol', '')) for r in requests]
+        symbols = self.symbol_rows(names)
+        accounts = self.account_rows([str(r.get('account', '')) for r in requests])
+        balances = np.array([float(r.get('balance', 10000)) for r in requests])
+        scoring = self.selector.scoring
+        # Scoring index and volatility once per distinct symbol, then gathered per row
+        inputs = {}
+        for name in set(names):
+            regime, hint, volatility = symbol_inputs(self.selector, snapshot, name)
+            inputs[name] = scoring.index(regime, snapshot.sentiment, hint) + (volatility,)
+        rows = np.array([inputs[name] for name in names])
+        # Copies of the rows taken under the lock: update() writes them and new rows replace the arrays
+        with self._lock:
+            win_rates, active = self.win_rates[symbols], self.active[symbols]
+            risk = {name: self.risk_state[name][accounts] for name in ('lot', 'max_drawdown', 'current_drawdown')}
+        confidence = scoring.confidences(win_rates, *rows[:, :3].astype(np.intp).T)
+        best, best_confidence = decide(confidence, active)
+        # Same rule as RiskEngine.calculate_lot with each symbol's volatility
+        paused = risk['current_drawdown'] > risk['max_drawdown'] * 0.8
+        adjusted_risk = risk_per_trade * (1 - rows[:, 3])
+        lots = np.where(paused, 0.0, np.minimum(risk['lot'], balances * adjusted_risk / 1000))
+        return [
+            {
+                'symbol': r.get('symbol'),
+                'account': r.get('account'),
+                'strategy': self.strategies[best[i]] if best[i] >= 0 else 'none',
+                'confidence': float(best_confidence[i]),
+                'lot': float(lots[i]),
+            }
+            for i, r in enumerate(requests)
+        ]
+
+    def update(self, outcomes):
+        # outcomes: list of {'symbol', 'account', 'strategy', 'win'}, applied in order; optional
+        # 'profit' and 'balance' go to the kill switch's equity monitor like /update's
+        codes = {s: i for i, s in enumerate(self.strategies)}
+        outcomes = [o for o in outcomes if o.get('strategy') in codes]
+        symbols = self.symbol_rows([str(o.get('symbol', '')) for o in outcomes])
+        accounts = self.account_rows([str(o.get('account', '')) for o in outcomes])
+        ema = self.selector.ema_factor
+        with self._lock:
+            risk = self.risk_state
+            for o, row, account in zip(outcomes, symbols, accounts):
+                col = codes[o['strategy']]
+                rate = self.win_rates[row, col] * ema + ((1 - ema) if o.get('win') in (True, 1, '1', 'true') else 0)
+                self.win_rates[row, col] = rate
+                if rate < 0.4:
+                    self.active[row, col] = False
+                elif rate > 0.6:
+                    self.active[row, col] = True
+                # Same adjustment as RiskEngine.update_win_rate
+                risk['win_rate'][account] = rate
+                if rate < 0.5:
+                    risk['lot'][account] *= self.risk.lot_decrease
+                    risk['max_positions'][account] = max(1, risk['max_positions'][account] - 1)
+                elif rate > 0.7:
+                    risk['lot'][account] *= self.risk.lot_increase
+                    risk['max_positions'][account] += 1
+        if self.kill_switch is not None:
+            for o, account in zip(outcomes, accounts):
+                if o.get('profit') is not None:
+                    balance = o.get('balance')
+                    state = self.kill_switch.record_trade(str(o.get('account', '')), float(o['profit']),
+                                                          float(balance) if balance is not None else None)
+                    with self._lock:
+                        self.risk_state['current_drawdown'][account] = state.drawdown
+        return len(outcomes)
+
+    def fields(self):
+        # Values of every row keyed like DurableState's fields: fleet.<win_rates|active>.<strategy>.<symbol>
+        # and fleet.risk.<column>.<account> (symbols and accounts may contain dots, strategies don't)
+        values = {}
+        with self._lock:
+            for symbol, row in self.symbols.items():
+                for i, s in enumerate(self.strategies):
+                    values[f'fleet.win_rates.{s}.{symbol}'] = float(self.win_rates[row, i])
+                    values[f'fleet.active.{s}.{symbol}'] = bool(self.active[row, i])
+            for account, row in self.accounts.items():
+                for name in RISK_COLUMNS:
+                    values[f'fleet.risk.{name}.{account}'] = float(self.risk_state[name][row])
+        return values
+
+    def apply(self, values):
+        # Restores fields() values, e.g. recovered from the journals; returns how many were applied
+        codes = {s: i for i, s in enumerate(self.strategies)}
+        applied = 0
+        for field, value in values.items():
+            parts = field.split('.', 3)
+            if len(parts) < 4 or parts[0] != 'fleet':
+                continue
+            _, group, name, key = parts
+            if group in ('win_rates', 'active') and name in codes:
+                row = self.symbol_rows([key])[0]
+                with self._lock:
+                    getattr(self, group)[row, codes[name]] = value
+            elif group == 'risk' and name in RISK_COLUMNS:
+                row = self.account_rows([key])[0]
+                with self._lock:
+                    self.risk_state[name][row] = value
+            else:
+                continue
+            applied += 1
+        return applied
+
+    def symbol_win_rates(self, symbol):
+        row = self.symbols.get(symbol)
+        if row is None:
+            return dict(self.selector.win_rates)
+        with self._lock:
+            return {s: float(self.win_rates[row, i]) for i, s in enumerate(self.strategies)}
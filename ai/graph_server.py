@@ -0,0 +1,118 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Persistent Knowledge Graph MCP server (same tools, in memory),
+# used by the tests and for running the API without Trae
+
+
+class MemoryGraph:
+    def __init__(self):
+        self.entities = {}
+        self.relations = []
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def call(self, tool, arguments):
+        handler = getattr(self, tool, None)
+        if handler is None or tool.startswith('_') or tool == 'call':
+            raise ValueError(f'Unknown tool: {tool}')
+        with self._lock:
+            self.calls[tool] = self.calls.get(tool, 0) + 1
+            return handler(**(arguments or {}))
+
+    def create_entities(self, entities):
+        created = []
+        for entity in entities:
+            if entity['name'] not in self.entities:
+                self.entities[entity['name']] = {'name': entity['name'], 'entityType': entity['entityType'],
+                                                 'observations': list(entity.get('observations', []))}
+                created.append(self.entities[entity['name']])
+        return created
+
+    def create_relations(self, relations):
+        created = []
+        for relation in relations:
+            relation = {'from': relation['from'], 'to': relation['to'], 'relationType': relation['relationType']}
+            if relation not in self.relations:
+                self.relations.append(relation)
+                created.append(relation)
+        return created
+
+    def add_observations(self, observations):
+        results = []
+        for item in observations:
+            entity = self.entities[item['entityName']]
+            added = [o for o in item['contents'] if o not in entity['observations']]
+            entity['observations'].extend(added)
+            results.append({'entityName': item['entityName'], 'addedObservations': added})
+        return results
+
+    def delete_entities(self, entityNames):
+        for name in entityNames:
+            self.entities.pop(name, None)
+        self.relations = [r for r in self.relations if r['from'] not in entityNames and r['to'] not in entityNames]
+        return 'Entities deleted successfully'
+
+    def delete_relations(self, relations):
+        self.relations = [r for r in self.relations if r not in relations]
+        return 'Relations deleted successfully'
+
+    def read_graph(self):
+        return {'entities': [dict(e, observations=list(e['observations'])) for e in self.entities.values()],
+                'relations': [dict(r) for r in self.relations]}
+
+    def open_nodes(self, names):
+        entities = [self.entities[n] for n in names if n in self.entities]
+        return {'entities': entities, 'relations': [r for r in self.relations if r['from'] in names and r['to'] in names]}
+
+    def search_nodes(self, query):
+        query = query.lower()
+        names = [name for name, e in self.entities.items()
+                 if query in name.lower() or query in e['entityType'].lower()
+                 or any(query in o.lower() for o in e['observations'])]
+        return self.open_nodes(names)
+
+
+def make_handler(graph):
+    class Handler(BaseHTTPRequestHandler):
+        # Body: {"server": ..., "tool": ..., "arguments": {...}}, same shape as a run_mcp call
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            try:
+                status, payload = 200, {'result': graph.call(body['tool'], body.get('arguments'))}
+            except (KeyError, TypeError, ValueError) as e:
+                status, payload = 400, {'error': str(e)}
+            response = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8765, graph=None):
+    # Returns the running server; port=0 picks a free port (server.server_address[1])
+    graph = graph or MemoryGraph()
+    server = ThreadingHTTPServer((host, port), make_handler(graph))
+    server.graph = graph
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Local stand-in for the Persistent Knowledge Graph MCP server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+    print(f'Knowledge graph stand-in on http://{args.host}:{args.port} (set MCP_GRAPH_URL to use it)')
+    while True:
+        time.sleep(3600)
@@ -0,0 +1,245 @@
+import bisect
+import contextlib
+import functools
+import math
+import os
+import sys
+import threading
+import time
+
+# In-process metrics rendered in the Prometheus text format (no client library needed).
+# Recording is a lock plus a bisect per observation; gauges are callbacks evaluated at scrape time.
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles', 'slow_requests.folded')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = list(buckets)
+        self.values = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts)) for labels, counts in self.values.items()]
+        names = self.labelnames + ('le',)
+        for labels, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [math.inf], counts):
+                cumulative += count
+                yield self.name + '_bucket', _labels(names, labels + (_number(bound),)), cumulative
+            yield self.name + '_count', _labels(self.labelnames, labels), cumulative
+            yield self.name + '_sum', _labels(self.labelnames, labels), counts[-1]
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help, func, labelnames=()):
+        # func returns a number, or {label values tuple: number} when labelnames are given
+        self.name = name
+        self.help = help
+        self.func = func
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"Gauge {self.name} failed: {e}")
+            return
+        items = value.items() if self.labelnames else [((), value)]
+        for labels, number in items:
+            yield self.name, _labels(self.labelnames, labels), number
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # Modules register at import time; re-registering returns the existing metric
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'smart_ea_request_seconds', 'API request latency', ('method', 'route', 'status')))
+DEPENDENCY_SECONDS = REGISTRY.register(Histogram(
+    'smart_ea_dependency_seconds', 'Latency of calls to external dependencies', ('dependency',)))
+DEPENDENCY_ERRORS = REGISTRY.register(Counter(
+    'smart_ea_dependency_errors_total', 'Failed calls to external dependencies', ('dependency',)))
+SECTION_SECONDS = REGISTRY.register(Histogram(
+    'smart_ea_section_seconds', 'Time spent in internal decision/model steps', ('section',)))
+
+
+def gauge(name, help, func, labelnames=()):
+    return REGISTRY.register(Gauge(name, help, func, labelnames))
+
+
+def observe_dependency(dependency, seconds, ok=True):
+    DEPENDENCY_SECONDS.observe(seconds, dependency)
+    if not ok:
+        DEPENDENCY_ERRORS.inc(dependency)
+
+
+@contextlib.contextmanager
+def track(dependency):
+    # with track('byteplus'): ... -> latency histogram plus an error count if the block raises
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe_dependency(dependency, time.perf_counter() - start, ok)
+
+
+def timed(section):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                SECTION_SECONDS.observe(time.perf_counter() - start, section)
+        return wrapper
+    return decorator
+
+
+def render():
+    return REGISTRY.render()
+
+
+class SamplingProfiler:
+    # Opt-in: while enabled, a background thread samples the stacks of threads inside a request
+    # every `interval` seconds. Requests slower than `threshold` get their stacks appended to
+    # `path` in the folded format flamegraph.pl / speedscope read ("root;frame;frame count").
+    def __init__(self, interval=0.005, threshold=0.25, path=PROFILE_FILE):
+        self.interval = interval
+        self.threshold = threshold
+        self.path = path
+        self.enabled = False
+        self.dumped = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enable(self, threshold=None, interval=None):
+        if threshold is not None:
+            self.threshold = threshold
+        if interval is not None:
+            self.interval = interval
+        if not self.enabled:
+            if self._thread is not None:
+                self._thread.join()  # Sampler of an earlier enable(), exits within one interval of disable()
+            self.enabled = True
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def disable(self):
+        self.enabled = False
+        with self._lock:
+            self._active.clear()
+
+    def begin(self):
+        if self.enabled:
+            self._active[threading.get_ident()] = {}
+
+    def end(self, label, duration):
+        stacks = self._active.pop(threading.get_ident(), None)
+        if not stacks or duration < self.threshold:
+            return False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        root = label.replace(' ', '_').replace(';', ':')
+        with self._lock, open(self.path, 'a') as f:
+            f.write(''.join(f'{root};{stack} {count}\n' for stack, count in stacks.items()))
+        self.dumped += 1
+        return True
+
+    @staticmethod
+    def collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while self.enabled:
+            frames = sys._current_frames()
+            for ident, stacks in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = self.collapse(frame)
+                    stacks[stack] = stacks.get(stack, 0) + 1
+            del frames
+            time.sleep(self.interval)
+
+
+profiler = SamplingProfiler()
+if os.environ.get('SMART_EA_PROFILE') == '1':
+    profiler.enable(threshold=float(os.environ.get('SMART_EA_PROFILE_SLOW_MS', 250)) / 1000)
@@ -0,0 +1,282 @@
+import atexit
+import json
+import os
+import threading
+import time
+import requests
+
+try:
+    from .instrumentation import gauge, track
+except ImportError:  # Run as a script from the ai/ folder
+    from instrumentation import gauge, track
+
+GRAPH_SERVER = 'mcp.config.usrlocalmcp.Persistent Knowledge Graph'
+# Optional HTTP endpoint speaking the graph_server.py protocol; without it calls go through run_mcp
+GRAPH_URL = os.environ.get('MCP_GRAPH_URL')
+SYNC_INTERVAL = 60
+FLUSH_INTERVAL = 5.0
+MAX_PENDING = 10000  # Entities buffered while the graph is unreachable, and local-only entities in the replica
+# SMART_EA_GRAPH_BACKGROUND=0 keeps the module graph (get_graph) from starting its sync and writer
+# threads, e.g. in tests: writes stay in the buffer and reads use the replica as it is
+GRAPH_BACKGROUND = os.environ.get('SMART_EA_GRAPH_BACKGROUND', '1') != '0'
+# Relation from a MarketRegime entity to the strategy entity suited for it
+REGIME_RELATION = 'recommends'
+REGIME_STRATEGY = {  # Used until the graph says otherwise
+    'high_volatility': 'scalping',
+    'trending': 'breakout',
+    'ranging': 'reversal'
+}
+
+
+def mcp_call(tool, arguments, url=GRAPH_URL, timeout=10):
+    with track('mcp'):
+        return _mcp_call(tool, arguments, url, timeout)
+
+
+def _mcp_call(tool, arguments, url, timeout):
+    if url:
+        response = requests.post(url, json={'server': GRAPH_SERVER, 'tool': tool, 'arguments': arguments}, timeout=timeout)
+        response.raise_for_status()
+        return response.json()['result']
+    # Assuming run_mcp is available; in practice, integrate via Trae.ai agent
+    return run_mcp(GRAPH_SERVER, tool, arguments)
+
+
+def parse_graph(result):
+    # MCP tools may return the graph as a dict, a JSON string or a list of text content blocks
+    if isinstance(result, dict) and 'content' in result:
+        result = ''.join(block.get('text', '') for block in result['content'])
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result.get('entities', []), result.get('relations', [])
+
+
+def merge_entities(entities):
+    # Coalesce entities with the same name into one, keeping observation order
+    merged = {}
+    for entity in entities:
+        current = merged.get(entity['name'])
+        if current is None:
+            merged[entity['name']] = {'name': entity['name'], 'entityType': entity['entityType'],
+                                      'observations': list(entity.get('observations', []))}
+        else:
+            current['observations'].extend(o for o in entity.get('observations', []) if o not in current['observations'])
+    return list(merged.values())
+
+
+class GraphReplica:
+    # In-memory copy of the knowledge graph with name/type indexes and a precomputed
+    # regime -> strategy map, so request-path reads never leave the process.
+    # Local writes mostly carry unique names (Log_<ts>, ...): past `max_local` of them not yet seen
+    # remotely, the oldest are evicted, as the write buffer drops its oldest past max_pending.
+    def __init__(self, call=mcp_call, max_local=MAX_PENDING):
+        self.call = call
+        self.max_local = max_local
+        self.entities = {}
+        self.by_type = {}
+        self.relations = set()
+        self.regime_strategy = dict(REGIME_STRATEGY)
+        self.local = {}  # Written here but not yet seen in the remote graph, oldest first (values unused)
+        self.remote = set()  # Names in the remote graph at the last sync
+        self.evicted = 0
+        self.synced_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _add(self, entity):
+        old = self.entities.get(entity['name'])
+        if old is not None and old['entityType'] != entity['entityType']:
+            self.by_type[old['entityType']].discard(entity['name'])
+        self.entities[entity['name']] = entity
+        self.by_type.setdefault(entity['entityType'], set()).add(entity['name'])
+
+    def _remove(self, name):
+        entity = self.entities.pop(name)
+        self.by_type[entity['entityType']].discard(name)
+
+    def _rebuild_lookup(self):
+        lookup = dict(REGIME_STRATEGY)
+        for source, target, relation_type in self.relations:
+            if relation_type == REGIME_RELATION:
+                lookup[source] = target
+        self.regime_strategy = lookup  # Swapped in one assignment, readers never see a partial map
+
+    def apply(self, entities=(), relations=()):
+        # Local writes are visible immediately, before the buffer ships them
+        with self._lock:
+            for entity in merge_entities(entities):
+                current = self.entities.get(entity['name'])
+                if current is not None:
+                    entity['observations'] = current['observations'] + [
+                        o for o in entity['observations'] if o not in current['observations']]
+                self._add(entity)
+                self.local.pop(entity['name'], None)
+                self.local[entity['name']] = None
+            while len(self.local) > self.max_local:
+                name = next(iter(self.local))
+                del self.local[name]
+                if name not in self.remote:
+                    self._remove(name)
+                self.evicted += 1
+            if relations:
+                self.relations.update((r['from'], r['to'], r['relationType']) for r in relations)
+                self._rebuild_lookup()
+
+    def sync(self):
+        # The MCP memory server has no change feed: diff its graph against the replica and
+        # touch only what changed. Returns the number of changed entities/relations.
+        entities, relations = parse_graph(self.call('read_graph', {}))
+        remote = {e['name']: e for e in entities}
+        relations = {(r['from'], r['to'], r['relationType']) for r in relations}
+        with self._lock:
+            changed = 0
+            for name in remote:
+                self.local.pop(name, None)
+            self.remote = set(remote)
+            for name, entity in remote.items():
+                current = self.entities.get(name)
+                if current is None or current['entityType'] != entity['entityType'] or current['observations'] != entity['observations']:
+                    self._add({'name': name, 'entityType': entity['entityType'], 'observations': list(entity.get('observations', []))})
+                    changed += 1
+            for name in [n for n in self.entities if n not in remote and n not in self.local]:
+                self._remove(name)
+                changed += 1
+            if relations != self.relations:
+                changed += len(relations ^ self.relations)
+                self.relations = relations
+                self._rebuild_lookup()
+            self.synced_at = time.time()
+        return changed
+
+    def get(self, name):
+        return self.entities.get(name)
+
+    def find(self, entity_type):
+        return [self.entities[n] for n in list(self.by_type.get(entity_type, ()))]
+
+    def strategy_for(self, regime, default='scalping'):
+        return self.regime_strategy.get(regime, default)
+
+    def start(self, interval=SYNC_INTERVAL):
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f'Knowledge graph sync failed: {e}')
+                self._stop.wait(interval)
+        self._thread = threading.Thread(target=run, name='graph-sync', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+class GraphWriteBuffer:
+    # Collects create_entities calls and ships them as one bulk call per flush interval
+    def __init__(self, call=mcp_call, flush_interval=FLUSH_INTERVAL, max_batch=100, max_pending=MAX_PENDING):
+        self.call = call
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.pending = []
+        self.stats = {'submitted': 0, 'sent': 0, 'calls': 0, 'failed': 0, 'dropped': 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, entities):
+        with self._lock:
+            self.pending.extend(entities)
+            self.stats['submitted'] += len(entities)
+            overflow = len(self.pending) - self.max_pending
+            if overflow > 0:  # Graph unreachable for a long time: keep the newest
+                del self.pending[:overflow]
+                self.stats['dropped'] += overflow
+            if len(self.pending) >= self.max_batch:
+                self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self.pending = merge_entities(self.pending), []
+        for start in range(0, len(batch), self.max_batch):
+            chunk = batch[start:start + self.max_batch]
+            try:
+                self.call('create_entities', {'entities': chunk})
+            except Exception as e:
+                print(f'Knowledge graph write failed, will retry: {e}')
+                self.stats['failed'] += 1
+                with self._lock:
+                    self.pending[:0] = batch[start:]
+                return False
+            self.stats['calls'] += 1
+            self.stats['sent'] += len(chunk)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self.pending:
+                self.flush()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='graph-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.pending:
+            self.flush()
+
+
+class KnowledgeGraph:
+    def __init__(self, call=mcp_call, flush_interval=FLUSH_INTERVAL):
+        self.writes = GraphWriteBuffer(call, flush_interval)
+        self.replica = GraphReplica(call, max_local=self.writes.max_pending)
+
+    def create_entities(self, entities):
+        self.replica.apply(entities)
+        self.writes.submit(entities)
+
+    def strategy_for(self, regime, default='scalping'):
+        return self.replica.strategy_for(regime, default)
+
+    def start(self, sync_interval=SYNC_INTERVAL):
+        self.replica.start(sync_interval)
+        self.writes.start()
+        return self
+
+    def close(self):
+        self.replica.stop()
+        self.writes.close()
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = KnowledgeGraph()
+                if GRAPH_BACKGROUND:
+                    _graph.start()
+                    atexit.register(_graph.close)
+    return _graph
+
+
+def create_entities(entities):
+    get_graph().create_entities(entities)
+
+
+gauge('smart_ea_graph_write_queue_depth', 'Knowledge graph entities waiting to be written',
+      lambda: len(_graph.writes.pending) if _graph is not None else 0)
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import json
+import time
+import urllib.parse
+import numpy as np
+
+# Keep-alive HTTP load generator for the decision routes. Point it at the Flask server
+# and at the asyncio server to compare throughput, e.g.:
+#   python loadtest.py http://127.0.0.1:5000 --connections 32 --requests 20000
+
+REQUESTS = [
+    ('GET', '/strategy', None),
+    ('POST', '/risk/lot', {'balance': 10000}),
+    ('GET', '/strategy', None),
+    ('POST', '/update', {'strategy': 'scalping', 'win': True}),
+]
+
+
+def _encode(method, path, host, payload):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    head = f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\nContent-Length: {len(body)}\r\n'
+    if payload is not None:
+        head += 'Content-Type: application/json\r\n'
+    return (head + '\r\n').encode() + body
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length, keep_alive = None, not head.startswith(b'HTTP/1.0')
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection':
+            keep_alive = value == b'keep-alive'
+    if length is None:
+        await reader.read()  # Body runs until the server closes the connection
+        keep_alive = False
+    else:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _worker(host, port, count, offset, latencies, errors, mix=REQUESTS):
+    messages = [_encode(m, p, host, body) for m, p, body in mix]
+    writer = None
+    for i in range(count):
+        start = time.perf_counter()
+        if writer is None:
+            # Servers without keep-alive (e.g. the Flask dev server) pay a new connection per request
+            reader, writer = await asyncio.open_connection(host, port)
+        writer.write(messages[(offset + i) % len(messages)])
+        await writer.drain()
+        status, keep_alive = await _read_response(reader)
+        if status != 200:
+            errors.append(i)
+        if not keep_alive:
+            writer.close()
+            writer = None
+        latencies.append(time.perf_counter() - start)
+    if writer is not None:
+        writer.close()
+
+
+async def run(url, connections=16, requests=5000, mix=REQUESTS):
+    parsed = urllib.parse.urlparse(url)
+    latencies, errors = [], []
+    per_connection = max(1, requests // connections)
+    start = time.perf_counter()
+    await asyncio.gather(*(_worker(parsed.hostname, parsed.port or 80, per_connection, i, latencies, errors, mix)
+                           for i in range(connections)))
+    elapsed = time.perf_counter() - start
+    lat = np.array(latencies) * 1000
+    return {
+        'url': url,
+        'connections': connections,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(lat, 50)),
+        'p99_ms': float(np.percentile(lat, 99)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the Smart EA decision API')
+    parser.add_argument('urls', nargs='+', help='Base URLs to compare, e.g. http://127.0.0.1:5000')
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+    for url in args.urls:
+        result = asyncio.run(run(url, args.connections, args.requests))
+        print(f"{url}: {result['throughput']:.0f} req/s, p50 {result['p50_ms']:.2f} ms, "
+              f"p99 {result['p99_ms']:.2f} ms, errors {result['errors']}/{result['requests']}")
@@ -2,29 +2,233 @@ import requests
 import json
 import datetime
 import logging  # Untuk standard logging
+import os
+import queue
+import shutil
+import threading
+import time
+import atexit
+
+try:
+    from .knowledge_graph import create_entities
+    from .instrumentation import gauge, observe_dependency
+    from .dashboard_state import EventRing, log_entry
+    from .circuit_breaker import CircuitBreaker
+except ImportError:  # Run as a script from the ai/ folder
+    from knowledge_graph import create_entities
+    from instrumentation import gauge, observe_dependency
+    from dashboard_state import EventRing, log_entry
+    from circuit_breaker import CircuitBreaker
 
 POSTGREST_URL = 'http://localhost:3000/logs'  # Adjust as needed
 HEADERS = {'Content-Type': 'application/json'}
+FALLBACK_FILE = 'fallback_logs.txt'  # Spill journal, replayed once PostgREST is reachable again
+
+class LogShipper:
+    # Queues log rows in memory and ships them to PostgREST as bulk array inserts
+    # from a background thread, so callers never wait on the database or the disk. Rows the
+    # writer can't send (PostgREST down, circuit open) go to the journal; a full queue under the
+    # 'drop' policy drops and counts the row, 'block' makes the caller wait for room.
+    def __init__(self, url=POSTGREST_URL, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 policy='drop', journal_path=FALLBACK_FILE, retry_interval=5.0, timeout=5.0, session=None,
+                 failure_threshold=3):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.journal_path = journal_path
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.stats = {
+            'enqueued': 0, 'dropped': 0, 'sent': 0, 'spilled': 0, 'replayed': 0,
+            'flushes': 0, 'failed_flushes': 0, 'skipped_flushes': 0, 'last_flush_latency': 0.0,
+            'total_flush_latency': 0.0,
+        }
+        # After failure_threshold failed posts, batches go straight to the journal until a trial
+        # post every retry_interval seconds succeeds
+        self.breaker = CircuitBreaker(failure_threshold, retry_interval)
+        self._lock = threading.Lock()  # Guards stats, updated from callers and the shipper thread
+        self._journal_lock = threading.Lock()
+        self._stop = object()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+            self._thread.start()
+        return self
+
+    def _count(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self.stats[key] += amount
+
+    def submit(self, payload):
+        try:
+            if self.policy == 'block':
+                self.queue.put(payload)
+            else:
+                self.queue.put_nowait(payload)
+            self._count(enqueued=1)
+        except queue.Full:
+            self._count(dropped=1)
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self.queue_depth()
+        stats['breaker'] = self.breaker.state
+        stats['avg_flush_latency'] = stats['total_flush_latency'] / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
+
+    def _post(self, rows):
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.post(self.url, headers=HEADERS, json=rows, timeout=self.timeout)
+            response.raise_for_status()
+            ok = True
+            self.breaker.record_success()
+            return True
+        except requests.exceptions.RequestException as e:
+            logging.error(f'Logging to DB failed: {e}')
+            self.breaker.record_failure()
+            self._count(failed_flushes=1)
+            return False
+        finally:
+            latency = time.perf_counter() - start
+            observe_dependency('postgrest', latency, ok)
+            with self._lock:
+                self.stats['flushes'] += 1
+                self.stats['last_flush_latency'] = latency
+                self.stats['total_flush_latency'] += latency
+
+    def _spill(self, rows):
+        with self._journal_lock:
+            with open(self.journal_path, 'a') as f:
+                f.write(''.join(json.dumps(row) + '\n' for row in rows))
+        self._count(spilled=len(rows))
+
+    def flush(self, rows):
+        if not rows:
+            return
+        if not self.breaker.allow():
+            self._count(skipped_flushes=1)
+            self._spill(rows)  # Circuit open: no request, straight to the journal
+        elif self._post(rows):
+            self._count(sent=len(rows))
+            self.replay_journal()
+        else:
+            self._spill(rows)
+
+    def _batches(self, lines):
+        batch = []
+        for line in lines:
+            if line.strip():
+                batch.append(json.loads(line))
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def replay_journal(self):
+        # Move the journal aside first so rows spilled during the replay are not lost
+        with self._journal_lock:
+            if not os.path.exists(self.journal_path):
+                return
+            replay_path = self.journal_path + '.replay'
+            if os.path.exists(replay_path):
+                with open(replay_path) as src, open(self.journal_path, 'a') as dst:
+                    shutil.copyfileobj(src, dst)
+            os.replace(self.journal_path, replay_path)
+        # Streamed batch by batch, the journal can be far larger than memory
+        with open(replay_path) as f:
+            for batch in self._batches(f):
+                if not self.breaker.allow() or not self._post(batch):
+                    # This batch and the unread rest go back to the journal
+                    self._spill(batch)
+                    with self._journal_lock, open(self.journal_path, 'a') as dst:
+                        rest = 0
+                        for line in f:
+                            dst.write(line)
+                            rest += 1
+                    self._count(spilled=rest)
+                    break
+                self._count(replayed=len(batch))
+        os.remove(replay_path)
+
+    def _run(self):
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is self._stop:
+                    running = False
+                    break
+                batch.append(item)
+            if batch:
+                self.flush(batch)
+            elif self.breaker.allow() and os.path.exists(self.journal_path):
+                self.replay_journal()
+
+    def close(self, timeout=10):
+        if self._thread is not None:
+            self.queue.put(self._stop)
+            self._thread.join(timeout)
+            self._thread = None
+
+_shipper = None
+_shipper_lock = threading.Lock()
+
+def get_shipper():
+    global _shipper
+    if _shipper is None:
+        with _shipper_lock:
+            if _shipper is None:
+                _shipper = LogShipper().start()
+                atexit.register(_shipper.close)
+    return _shipper
+
+gauge('smart_ea_log_queue_depth', 'Log rows waiting to be shipped to PostgREST',
+      lambda: _shipper.queue_depth() if _shipper is not None else 0)
+gauge('smart_ea_log_rows', 'Log shipper row counts since start',
+      lambda: {(k,): v for k, v in _shipper.metrics().items()
+               if k in ('enqueued', 'dropped', 'sent', 'spilled', 'replayed')} if _shipper is not None else {},
+      ('outcome',))
+
+recent_logs = EventRing()  # Last entries in memory for the dashboard stream
 
 def log_to_db(level, message, data=None):
+    recent_logs.append(log_entry(level, message, data))
     payload = {
         'level': level,
         'message': message,
         'data': json.dumps(data) if data else None,
         'timestamp': datetime.datetime.now().isoformat()
     }
-    try:
-        response = requests.post(POSTGREST_URL, headers=HEADERS, json=payload)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logging.error(f'Logging to DB failed: {e}')
-        # Fallback to local file
-        with open('fallback_logs.txt', 'a') as f:
-            f.write(json.dumps(payload) + '\n')
+    get_shipper().submit(payload)
     # Integrate with Persistent Knowledge Graph for critical logs
     if level in ['ERROR', 'CRITICAL']:
         entities = [{'name': f'Log_{datetime.datetime.now().isoformat()}', 'entityType': 'ErrorLog', 'observations': [message, json.dumps(data)]}]
-        run_mcp('mcp.config.usrlocalmcp.Persistent Knowledge Graph', 'create_entities', {'entities': entities})
+        create_entities(entities)  # Batched with other graph writes
 
 # Example integration in other modules
 # In smart_ea.mq5 or via API, call this function
@@ -34,4 +238,4 @@ if __name__ == '__main__':
 
 def log_trade(strategy, profit, other_data=None):
     data = {'strategy': strategy, 'profit': profit, **(other_data or {})}
-    log_to_db('INFO', f'Trade executed with strategy {strategy}', data)
\ No newline at end of file
+    log_to_db('INFO', f'Trade executed with strategy {strategy}', data)
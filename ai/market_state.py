@@ -0,0 +1,227 @@
+import math
+import os
+import threading
+import numpy as np
+
+# Streaming estimators fed with closed bars pushed by the EA. Every update is O(1):
+# Wilder smoothing for ATR/ADX, an exponential variance for realized volatility and
+# fixed-size ring buffers with running sums for the rolling windows.
+# Volatility blends the ATR (bar ranges) and the EWMA of close-to-close returns, each relative to
+# its own recent level; the regime is high_volatility above 0.7 of it, else ADX/efficiency decide.
+
+ATR_PERIOD = 14
+ADX_PERIOD = 14
+EWMA_LAMBDA = 0.94  # RiskMetrics decay for per-bar log returns
+BASELINE_BARS = 200  # Window for the "normal" ATR level that volatility is measured against
+RANGE_BARS = 20  # Window for the efficiency ratio
+TREND_ADX = 25.0
+TREND_EFFICIENCY = 0.3
+# Symbol behind callers that pass none (the global snapshot, /strategy without ?symbol=);
+# unset, it is the first symbol the EA pushed bars for
+DEFAULT_SYMBOL = os.environ.get('SMART_EA_SYMBOL') or None
+
+
+class RingBuffer:
+    # Fixed-size window keeping a running sum, so the mean is O(1)
+    def __init__(self, size):
+        self.values = np.zeros(size)
+        self.size = size
+        self.count = 0
+        self.index = 0
+        self.total = 0.0
+
+    def push(self, value):
+        # Returns the value that fell out of the window (None while filling)
+        dropped = self.values[self.index] if self.count == self.size else None
+        if dropped is not None:
+            self.total -= dropped
+        self.values[self.index] = value
+        self.total += value
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return dropped
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    def oldest(self):
+        return self.values[self.index if self.full else 0]
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class StreamingATR:
+    def __init__(self, period=ATR_PERIOD):
+        self.period = period
+        self.value = None
+        self.seed = RingBuffer(period)  # First `period` true ranges are averaged, then Wilder smoothing
+
+    def update(self, true_range):
+        if self.value is None:
+            self.seed.push(true_range)
+            if self.seed.full:
+                self.value = self.seed.mean()
+        else:
+            self.value += (true_range - self.value) / self.period
+        return self.value
+
+
+class EWMAVolatility:
+    def __init__(self, lam=EWMA_LAMBDA):
+        self.lam = lam
+        self.variance = None
+
+    def update(self, ret):
+        if self.variance is None:
+            self.variance = ret * ret
+        else:
+            self.variance = self.lam * self.variance + (1 - self.lam) * ret * ret
+        return self.value
+
+    @property
+    def value(self):
+        return math.sqrt(self.variance) if self.variance is not None else None
+
+
+class StreamingADX:
+    def __init__(self, period=ADX_PERIOD):
+        self.period = period
+        self.tr = StreamingATR(period)
+        self.plus_dm = StreamingATR(period)
+        self.minus_dm = StreamingATR(period)
+        self.dx = StreamingATR(period)
+        self.plus_di = self.minus_di = self.value = None
+
+    def update(self, true_range, up_move, down_move):
+        plus = up_move if up_move > down_move and up_move > 0 else 0.0
+        minus = down_move if down_move > up_move and down_move > 0 else 0.0
+        tr = self.tr.update(true_range)
+        plus = self.plus_dm.update(plus)
+        minus = self.minus_dm.update(minus)
+        if tr is None:
+            return None
+        self.plus_di = 100 * plus / tr if tr else 0.0
+        self.minus_di = 100 * minus / tr if tr else 0.0
+        di_sum = self.plus_di + self.minus_di
+        self.value = self.dx.update(100 * abs(self.plus_di - self.minus_di) / di_sum if di_sum else 0.0)
+        return self.value
+
+
+class RangeDetector:
+    # Kaufman efficiency ratio: net move over the window / sum of bar-to-bar moves.
+    # Near 0 the price is chopping in a range, near 1 it moves in one direction.
+    def __init__(self, window=RANGE_BARS):
+        self.closes = RingBuffer(window + 1)
+        self.moves = RingBuffer(window)
+        self.value = None
+
+    def update(self, close, previous_close):
+        self.closes.push(close)
+        self.moves.push(abs(close - previous_close))
+        if self.closes.full:
+            self.value = abs(close - self.closes.oldest()) / self.moves.total if self.moves.total > 0 else 0.0
+        return self.value
+
+
+class SymbolState:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.atr = StreamingATR()
+        self.atr_baseline = RingBuffer(BASELINE_BARS)
+        self.ewma = EWMAVolatility()
+        self.ewma_baseline = RingBuffer(BASELINE_BARS)
+        self.adx = StreamingADX()
+        self.range = RangeDetector()
+        self.last_bar = None
+        self.bars = 0
+
+    def push(self, bar):
+        # bar: {'time', 'open', 'high', 'low', 'close'}; returns False for bars already seen
+        if self.last_bar is not None and bar['time'] <= self.last_bar['time']:
+            return False
+        high, low, close = float(bar['high']), float(bar['low']), float(bar['close'])
+        previous = self.last_bar
+        if previous is not None:
+            prev_close = previous['close']
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+            atr = self.atr.update(true_range)
+            if atr is not None:
+                self.atr_baseline.push(atr)
+            if prev_close > 0 and close > 0:
+                self.ewma_baseline.push(self.ewma.update(math.log(close / prev_close)))
+            self.adx.update(true_range, high - previous['high'], previous['low'] - low)
+            self.range.update(close, prev_close)
+        self.last_bar = {'time': bar['time'], 'high': high, 'low': low, 'close': close}
+        self.bars += 1
+        return True
+
+    @property
+    def ready(self):
+        return self.adx.value is not None and self.range.value is not None
+
+    @property
+    def volatility(self):
+        # Mean of the ATR and EWMA levels relative to their recent means, 2x the mean -> 1.0 as in
+        # backtest.market_inputs (which has the ATR only)
+        ratios = [value / baseline.mean() for value, baseline in ((self.atr.value, self.atr_baseline),
+                                                                   (self.ewma.value, self.ewma_baseline))
+                  if value is not None and baseline.mean() > 0]
+        if not ratios:
+            return 0.0
+        return min(1.0, sum(ratios) / len(ratios) / 2.0)
+
+    @property
+    def regime(self):
+        if self.volatility > 0.7:
+            return 'high_volatility'
+        if self.adx.value >= TREND_ADX and self.range.value >= TREND_EFFICIENCY:
+            return 'trending'
+        return 'ranging'
+
+    def as_dict(self):
+        return {
+            'symbol': self.symbol,
+            'bars': self.bars,
+            'ready': self.ready,
+            'atr': self.atr.value,
+            'ewma_volatility': self.ewma.value,
+            'adx': self.adx.value,
+            'efficiency_ratio': self.range.value,
+            'volatility': self.volatility,
+            'regime': self.regime if self.ready else None,
+        }
+
+
+class MarketState:
+    def __init__(self, default_symbol=DEFAULT_SYMBOL):
+        self.symbols = {}
+        self.default_symbol = default_symbol
+        self.first_symbol = None  # Stands in for default_symbol when none is configured
+        self._lock = threading.Lock()
+
+    def push(self, symbol, bars):
+        with self._lock:
+            state = self.symbols.get(symbol)
+            if state is None:
+                state = self.symbols[symbol] = SymbolState(symbol)
+            accepted = sum(state.push(bar) for bar in sorted(bars, key=lambda b: b['time']))
+            if self.first_symbol is None:
+                self.first_symbol = symbol
+        return accepted
+
+    def get(self, symbol=None):
+        # Without a symbol: always the same one, whichever chart pushed bars last
+        if symbol is None:
+            symbol = self.default_symbol or self.first_symbol
+        state = self.symbols.get(symbol)
+        return state if state is not None and state.ready else None
+
+    def regime(self, symbol=None):
+        state = self.get(symbol)
+        return state.regime if state else None
+
+    def volatility(self, symbol=None):
+        state = self.get(symbol)
+        return state.volatility if state else None
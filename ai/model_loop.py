@@ -1,109 +1,119 @@
+import os
 import time
+import json
 import requests  # Untuk PostgREST
-import random  # Untuk simulasi data
-import numpy as np  # Untuk kalkulasi Sharpe ratio
 
-from strategy_selector import StrategySelector
-from risk_engine import RiskEngine
+try:
+    from .strategy_selector import StrategySelector
+    from .risk_engine import RiskEngine
+    from .trade_analytics import TradeAnalytics
+    from .trade_store import TradeStore
+    from .optimizer import ParameterOptimizer, apply_params, load_best_params, save_best_params
+    from .knowledge_graph import create_entities
+    from .instrumentation import timed, track
+    from . import metrics
+    from . import logger
+except ImportError:  # Run as a script from the ai/ folder
+    from strategy_selector import StrategySelector
+    from risk_engine import RiskEngine
+    from trade_analytics import TradeAnalytics
+    from trade_store import TradeStore
+    from optimizer import ParameterOptimizer, apply_params, load_best_params, save_best_params
+    from knowledge_graph import create_entities
+    from instrumentation import timed, track
+    import metrics
+    import logger
+
+# M1 history for re_optimize, one .npy per field as written by backtest.save_bars. Nothing fills it
+# automatically (bars pushed to /market/bars only feed the live estimators); export M1 bars from MT5
+# to CSV and run `python ai/backtest.py bars.csv --save data/bars` whenever the history should grow.
+BARS_DIR = os.environ.get('SMART_EA_BARS_DIR',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'bars'))
 
 class ModelLoop:
-    def __init__(self):
+    def __init__(self, analytics=None, store=None):
         self.selector = StrategySelector()
         self.risk = RiskEngine()
+        # Defaults live under ai/state; benchmarks and tests pass their own
+        self.analytics = analytics if analytics is not None else TradeAnalytics(self.selector.strategies)
+        self.store = store if store is not None else TradeStore(strategies=self.selector.strategies)
+        best_params = load_best_params()
+        if best_params:
+            apply_params(best_params, self.selector, self.risk)
         self.last_retrain = time.time()
 
-    def evaluate_performance(self):
-        # Fetch real trade data from PostgreSQL via PostgREST
-        postgrest_url = 'http://localhost:3000/trades'  # Ambil dari config jika diperlukan
+    @timed('evaluate_performance')
+    def evaluate_performance(self, rebuild=False):
+        # Fetch only trades above the high-water mark; rebuild=True recomputes from scratch
         try:
-            response = requests.get(postgrest_url)
-            response.raise_for_status()
-            trades = response.json()
+            with track('postgrest'):
+                trades = self.analytics.rebuild() if rebuild else self.analytics.sync()
         except Exception as e:
             print(f"Error fetching trades: {e}")
             trades = []  # Fallback
         
-        # Calculate win rates per strategy and drawdown from real data
-        if trades:
-            strategy_trades = {s: [t for t in trades if t.get('strategy') == s] for s in self.selector.strategies}
-            win_rates = {}
-            total_profit = 0
-            max_drawdown = 0
-            current_drawdown = 0
-            peak = 0
-            for s, st in strategy_trades.items():
-                if st:
-                    wins = sum(1 for t in st if t.get('profit', 0) > 0)
-                    win_rates[s] = wins / len(st)
-                    strategy_profit = sum(t.get('profit', 0) for t in st)
-                    total_profit += strategy_profit
-                else:
-                    win_rates[s] = 0.5  # Default jika tidak ada trade
-            # Calculate drawdown (simple running calculation)
-            balance = 10000  # Assume initial balance
-            for t in sorted(trades, key=lambda x: x.get('timestamp')):
-                balance += t.get('profit', 0)
-                peak = max(peak, balance)
-                current_drawdown = (peak - balance) / peak if peak > 0 else 0
-                max_drawdown = max(max_drawdown, current_drawdown)
-            drawdown = max_drawdown
+        # Win rates per strategy and drawdown are maintained incrementally
+        if self.analytics.state['trades']:
+            win_rates = self.analytics.win_rates()
+            drawdown = self.analytics.max_drawdown
         else:
-            # Fallback to simulation
-            win_rates = {s: random.uniform(0.4, 0.8) for s in self.selector.strategies}
-            drawdown = random.uniform(0, 0.1)
+            # No trades yet: nothing to learn from, and a simulated result would be published to the API
+            print("No trades yet, performance unchanged")
+            win_rates, drawdown = {}, self.risk.current_drawdown
         
         self.risk.update_drawdown(drawdown)
         for s, rate in win_rates.items():
             self.selector.update_win_rate(s, rate > 0.5)  # Simulate win/loss
             self.risk.update_win_rate(rate)
             if rate < 0.4:  # Auto-disable low performing strategy
-                if s in self.selector.active_strategies:
-                    self.selector.active_strategies.remove(s)
+                self.selector.active[s] = False
         print("Performance evaluated")
         
-        # Enhanced with Sharpe ratio
+        # Risk metrics over the full local history, read straight from the memory-mapped columns
         if trades:
-            profits = [t.get('profit', 0) for t in trades]
-            if len(profits) > 1:
-                returns = np.diff(profits) / np.abs(profits[:-1])
-                sharpe = np.mean(returns) / np.std(returns) if np.std(returns) != 0 else 0
-            else:
-                sharpe = 0
-            print(f"Sharpe Ratio: {sharpe}")
-            # Use Sharpe to adjust risk
-            self.risk.update_volatility(sharpe)  # Assuming update_volatility can take this
-        else:
-            # Fallback to simulation
-            win_rates = {s: random.uniform(0.4, 0.8) for s in self.selector.strategies}
-            drawdown = random.uniform(0, 0.1)
-        
-        self.risk.update_drawdown(drawdown)
-        for s, rate in win_rates.items():
-            self.selector.update_win_rate(s, rate > 0.5)  # Simulate win/loss
-            self.risk.update_win_rate(rate)
-            if rate < 0.4:  # Auto-disable low performing strategy
-                if s in self.selector.active_strategies:
-                    self.selector.active_strategies.remove(s)
-        print("Performance evaluated")
+            self.store.ingest_trades(trades)
+        if len(self.store):
+            columns = self.store.columns()
+            report = metrics.strategy_report(columns['strategy'], columns['profit'], self.store.strategies,
+                                             columns['timestamp'], self.analytics.initial_balance)
+            print(f"Sharpe Ratio: {report['total']['sharpe']}, Sortino: {report['total']['sortino']}, "
+                  f"Profit factor: {report['total']['profit_factor']}")
+            # Use realized volatility of trade returns to adjust risk
+            self.risk.update_volatility(metrics.trade_returns(columns['profit'], self.analytics.initial_balance))
+            return report
 
+    @timed('retrain_model')
     def retrain_model(self):
         print("Retraining model...")
-        # Integrate real historical data via MCP Fetch
-        historical_data = self.fetch_historical_data()
-        # Process historical data to bias win rates (simplified)
-        trend_bias = 0.1 if 'trending' in str(historical_data) else 0
-        self.selector.win_rates = {s: random.uniform(0.5, 0.7) + trend_bias for s in self.selector.strategies}
-        self.risk.lot = random.uniform(0.01, 0.05)  # Optimized lot
+        # The scheduler publishes the result to the state the API trades with, so nothing is simulated:
+        # win rates are re-estimated over the whole recorded history (strategies without trades keep
+        # theirs) and the parameters come from the last optimization. The lot is left to the risk engine.
+        stats = self.analytics.state['strategies']
+        self.selector.win_rates = {s: stats[s]['wins'] / stats[s]['trades'] if s in stats and stats[s]['trades'] else rate
+                                   for s, rate in self.selector.win_rates.items()}
+        best_params = load_best_params()
+        if best_params:
+            apply_params(best_params, self.selector, self.risk)
+        self.last_retrain = time.time()
         
         entities = [{"name": f"Retrained_{time.time()}", "entityType": "ModelUpdate", "observations": [f"Win rates: {self.selector.win_rates}"]}]
-        run_mcp('mcp.config.usrlocalmcp.Persistent Knowledge Graph', 'create_entities', {'entities': entities})
+        create_entities(entities)
 
-    def re_optimize(self):
+    @timed('re_optimize')
+    def re_optimize(self, method='bayesian', budget=32):
         print("Re-optimizing parameters...")
-        avg_win_rate = sum(self.selector.win_rates.values()) / len(self.selector.win_rates)
-        self.risk.lot = max(0.01, 0.05 * avg_win_rate)  # Optimized lot
-        opt_entities = [{"name": f"Optimized_{time.time()}", "entityType": "OptimizationUpdate", "observations": [f"Average win rate: {avg_win_rate}, New lot: {self.risk.lot}"]}]
-        run_mcp('mcp.config.usrlocalmcp.Persistent Knowledge Graph', 'create_entities', {'entities': opt_entities})
+        if not os.path.isdir(BARS_DIR):
+            message = f"No market data in {BARS_DIR}, skipping optimization"
+            print(message)
+            logger.log_to_db('WARNING', message, {'hint': 'python ai/backtest.py bars.csv --save data/bars'})
+            return None
+        # Walk-forward parameter search over replayed history, evaluated in worker processes
+        result = ParameterOptimizer(BARS_DIR).optimize(method=method, budget=budget)
+        apply_params(result['params'], self.selector, self.risk)
+        save_best_params(result['params'], result['score'])
+        opt_entities = [{"name": f"Optimized_{time.time()}", "entityType": "OptimizationUpdate", "observations": [f"Best params: {result['params']}, Training Sharpe: {result['train_score']}, Out-of-sample Sharpe: {result['score']}, Walk-forward Sharpe: {result['walk_forward_score']}"]}]
+        create_entities(opt_entities)
+        return result
 
     def check_and_retrain(self):
         if time.time() - self.last_retrain > 2 * 24 * 3600:  # Every 2 days
@@ -115,11 +125,16 @@ class ModelLoop:
     def fetch_historical_data(self):
         # Fetch historical market data via MCP Fetch
         try:
-            result = run_mcp('mcp.config.usrlocalmcp.Fetch', 'fetch', {'url': 'https://api.example.com/historical/forex', 'max_length': 5000})
+            with track('mcp_fetch'):
+                result = run_mcp('mcp.config.usrlocalmcp.Fetch', 'fetch', {'url': 'https://api.example.com/historical/forex', 'max_length': 5000})
             return json.loads(result)  # Assume JSON response
         except:
             return {}  # Fallback
 
 if __name__ == '__main__':
+    import sys
     loop = ModelLoop()
-    loop.check_and_retrain()
\ No newline at end of file
+    if '--rebuild' in sys.argv:
+        loop.evaluate_performance(rebuild=True)
+    else:
+        loop.check_and_retrain()
\ No newline at end of file
@@ -0,0 +1,272 @@
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+try:
+    from .strategy_selector import StrategySelector, DEFAULT_BOOSTS
+    from .scoring import load_weights, WEIGHTS_FILE
+    from .risk_engine import RiskEngine
+    from .backtest import Backtester, load_bars
+    from .durable_state import STATE_DIR
+except ImportError:  # Run as a script from the ai/ folder
+    from strategy_selector import StrategySelector, DEFAULT_BOOSTS
+    from scoring import load_weights, WEIGHTS_FILE
+    from risk_engine import RiskEngine
+    from backtest import Backtester, load_bars
+    from durable_state import STATE_DIR
+
+BEST_PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'best_params.json')
+CACHE_FILE = os.path.join(STATE_DIR, 'optimizer_cache.json')  # Next to the journals, not in the cwd
+
+# (low, high) bounds of every tunable
+PARAM_SPACE = {
+    'lot_decrease': (0.6, 0.95),  # RiskEngine.update_win_rate multiplier on low win rate
+    'lot_increase': (1.05, 1.5),  # ... and on high win rate
+    'max_drawdown': (0.02, 0.1),  # calculate_lot pauses at 80% of this
+    'graph_boost': (0.2, 0.6),
+    'regime_boost': (0.1, 0.5),
+    'sentiment_boost': (0.0, 0.4),
+    'news_positive_boost': (0.0, 0.4),
+    'news_negative_boost': (-0.3, 0.0),
+    'ema_factor': (0.8, 0.98),  # StrategySelector.update_win_rate smoothing
+}
+DEFAULT_PARAMS = {
+    'lot_decrease': 0.8, 'lot_increase': 1.2, 'max_drawdown': 0.05, 'ema_factor': 0.9,
+    **{f'{key}_boost': value for key, value in DEFAULT_BOOSTS.items()},
+}
+
+
+def apply_params(params, selector=None, risk=None):
+    params = {**DEFAULT_PARAMS, **params}
+    if selector is not None:
+        # Recompiled into a new scoring table, swapped in while the selector keeps serving
+        selector.set_boosts({key: params[f'{key}_boost'] for key in DEFAULT_BOOSTS})
+        selector.ema_factor = params['ema_factor']
+    if risk is not None:
+        risk.lot_decrease = params['lot_decrease']
+        risk.lot_increase = params['lot_increase']
+        risk.max_drawdown = params['max_drawdown']
+    return params
+
+
+def save_best_params(params, score, path=BEST_PARAMS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'params': params, 'score': score, 'updated': time.time()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_best_params(path=BEST_PARAMS_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['params']
+
+
+class ScoringReloader:
+    # Hot swap of the scoring table when the optimizer (best_params.json) or an operator
+    # (scoring_weights.json, which wins over the boosts) rewrote its source; no restart needed.
+    # Without best params the defaults are restored. Checked at most every `interval` seconds.
+    def __init__(self, selector, params_path=BEST_PARAMS_FILE, weights_path=WEIGHTS_FILE, interval=5,
+                 clock=time.monotonic):
+        self.selector = selector
+        self.params_path = params_path
+        self.weights_path = weights_path
+        self.interval = interval
+        self.clock = clock
+        self.mtimes = None
+        self.checked = float('-inf')
+
+    def reload(self, force=False):
+        now = self.clock()
+        if not force and now - self.checked < self.interval:
+            return False
+        self.checked = now
+        mtimes = [os.path.getmtime(path) if os.path.exists(path) else None
+                  for path in (self.params_path, self.weights_path)]
+        if mtimes == self.mtimes and not force:
+            return False
+        self.mtimes = mtimes
+        try:
+            # Risk parameters reach the API processes through the shared state
+            apply_params(load_best_params(self.params_path) or {}, self.selector)
+            table = load_weights(self.weights_path)
+            if table is not None:
+                self.selector.set_scoring(table)
+        except (OSError, ValueError) as e:
+            print(f'Scoring weights reload failed: {e}')
+            return False
+        return True
+
+
+def param_hash(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+# Worker side: bars are opened once per process as read-only memmaps, slices are views
+_bars = None
+
+def _init_worker(bars_path):
+    global _bars
+    _bars = load_bars(bars_path)
+
+def _evaluate(params, start, end, min_trades):
+    bars = {field: values[start:end] for field, values in _bars.items()}
+    selector, risk = StrategySelector(), RiskEngine()
+    apply_params(params, selector, risk)
+    result = Backtester(bars, selector=selector, risk=risk).run()
+    trades = result['report']['total']['trades']
+    # Too few fills say nothing about the parameters; rank them below any real result
+    return result['sharpe'] if trades >= min_trades else -1.0
+
+
+class ParameterOptimizer:
+    def __init__(self, bars_path, space=None, folds=3, workers=None, cache_path=CACHE_FILE, min_trades=5, seed=0):
+        self.bars_path = bars_path
+        self.space = space or PARAM_SPACE
+        self.folds = folds
+        self.workers = workers or os.cpu_count()
+        self.cache_path = cache_path
+        self.min_trades = min_trades
+        self.rng = random.Random(seed)
+        self.n_bars = len(load_bars(bars_path)['time'])
+        # Walk-forward: consecutive segments, fold k trains on segment k and tests on segment k + 1
+        bounds = np.linspace(0, self.n_bars, folds + 2).astype(int)
+        self.segments = list(zip(bounds[:-1], bounds[1:]))
+        self.cache = self._load_cache()
+        self.evaluated = 0
+
+    def _data_key(self):
+        stat = os.stat(os.path.join(self.bars_path, 'time.npy'))
+        return f'{self.n_bars}:{stat.st_size}:{int(stat.st_mtime)}'
+
+    def _load_cache(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+            if cache.get('data') == self._data_key():
+                return cache
+        return {'data': self._data_key(), 'scores': {}}
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def full_params(self, point):
+        return {**DEFAULT_PARAMS, **{k: round(float(v), 6) for k, v in point.items()}}
+
+    def evaluate(self, points):
+        # Returns one list of per-segment scores per point; cached points are not re-run
+        candidates = [self.full_params(p) for p in points]
+        todo = {}
+        for params in candidates:
+            key = param_hash(params)
+            if key not in self.cache['scores'] and key not in todo:
+                todo[key] = params
+        if todo:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.bars_path,)) as pool:
+                futures = {
+                    key: [pool.submit(_evaluate, params, int(start), int(end), self.min_trades) for start, end in self.segments]
+                    for key, params in todo.items()
+                }
+                for key, segment_futures in futures.items():
+                    self.cache['scores'][key] = [f.result() for f in segment_futures]
+            self.evaluated += len(todo)
+            self._save_cache()
+        return [self.cache['scores'][param_hash(params)] for params in candidates]
+
+    def grid_points(self, steps=3):
+        axes = [np.linspace(low, high, steps) for low, high in self.space.values()]
+        return [dict(zip(self.space, values)) for values in itertools.product(*axes)]
+
+    def random_points(self, n):
+        return [{k: self.rng.uniform(low, high) for k, (low, high) in self.space.items()} for _ in range(n)]
+
+    def bayesian_points(self, history, n, candidates=64, gamma=0.25):
+        # Tree-structured Parzen style proposal: sample around the best points and keep the
+        # candidates where the density of good points is high relative to the rest
+        names = list(self.space)
+        low = np.array([self.space[k][0] for k in names])
+        high = np.array([self.space[k][1] for k in names])
+        ranked = sorted(history, key=lambda item: item[1], reverse=True)
+        n_good = max(1, int(len(ranked) * gamma))
+        to_unit = lambda p: (np.array([p[k] for k in names]) - low) / (high - low)
+        good = np.array([to_unit(p) for p, _ in ranked[:n_good]])
+        bad = np.array([to_unit(p) for p, _ in ranked[n_good:]]) if len(ranked) > n_good else np.empty((0, len(names)))
+        width = 0.15
+        def density(x, centers):
+            if len(centers) == 0:
+                return np.ones(len(x))
+            d = ((x[:, None, :] - centers[None, :, :]) / width) ** 2
+            return np.exp(-0.5 * d.sum(axis=2)).mean(axis=1) + 1e-12
+        np_rng = np.random.default_rng(self.rng.randrange(2 ** 32))
+        centers = good[np_rng.integers(0, len(good), candidates * n)]
+        x = np.clip(centers + np_rng.normal(0, width, centers.shape), 0, 1)
+        ratio = density(x, good) / density(x, bad)
+        best = x[np.argsort(ratio)[::-1][:n]]
+        return [dict(zip(names, low + row * (high - low))) for row in best]
+
+    def train_scores(self, scores):
+        # Selection score: mean over the training segments; the last segment is only ever a test set
+        return [float(np.mean(s[:-1])) for s in scores]
+
+    def walk_forward(self, points, scores):
+        # Out-of-sample score of the point picked on each fold's training segment
+        report = []
+        for fold in range(self.folds):
+            train = [s[fold] for s in scores]
+            chosen = int(np.argmax(train))
+            report.append({'fold': fold, 'params': self.full_params(points[chosen]),
+                           'train_score': train[chosen], 'test_score': scores[chosen][fold + 1]})
+        return report
+
+    def optimize(self, method='random', budget=32, batch=8, steps=3):
+        if method == 'grid':
+            points = self.grid_points(steps)
+            scores = self.evaluate(points)
+        elif method == 'random':
+            points = self.random_points(budget)
+            scores = self.evaluate(points)
+        elif method == 'bayesian':
+            points = self.random_points(min(budget, batch))
+            scores = self.evaluate(points)
+            while len(points) < budget:
+                history = list(zip(points, self.train_scores(scores)))
+                proposals = self.bayesian_points(history, min(batch, budget - len(points)))
+                points += proposals
+                scores += self.evaluate(proposals)
+        else:
+            raise ValueError(f'Unknown search method: {method}')
+        # Selected on the training segments; the score reported (and saved with the params) is the
+        # chosen point's result on the last segment, which no selection step has seen
+        train = self.train_scores(scores)
+        best = int(np.argmax(train))
+        walk_forward = self.walk_forward(points, scores)
+        return {
+            'params': self.full_params(points[best]),
+            'train_score': train[best],
+            'score': scores[best][-1],
+            'walk_forward': walk_forward,
+            'walk_forward_score': float(np.mean([fold['test_score'] for fold in walk_forward])),
+            'evaluated': self.evaluated,
+            'points': len(points),
+        }
+
+
+if __name__ == '__main__':
+    import sys
+    optimizer = ParameterOptimizer(sys.argv[1])
+    result = optimizer.optimize(method=sys.argv[2] if len(sys.argv) > 2 else 'bayesian')
+    save_best_params(result['params'], result['score'])
+    print(json.dumps(result, indent=2))
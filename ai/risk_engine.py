@@ -1,14 +1,37 @@
 import random  # Untuk simulasi volatilitas
+import json
 import requests  # Untuk fetch volatilitas
 
+try:
+    from . import metrics
+    from .instrumentation import timed, track
+except ImportError:  # Run as a script from the ai/ folder
+    import metrics
+    from instrumentation import timed, track
+
+VOLATILITY_WINDOW = 50  # Trades in the rolling volatility window
+VOLATILITY_CAP = 0.02  # Per-trade return std that maps to volatility 1.0
+
 class RiskEngine:
-    def __init__(self, initial_lot=0.01, max_positions=5, max_drawdown=0.05):
+    def __init__(self, initial_lot=0.01, max_positions=5, max_drawdown=0.05, lot_decrease=0.8, lot_increase=1.2):
         self.lot = initial_lot
         self.max_positions = max_positions
         self.max_drawdown = max_drawdown
         self.current_drawdown = 0.0
         self.win_rate = 0.5  # Initial
         self.volatility = 0.0  # Initial volatility
+        self.lot_decrease = lot_decrease
+        self.lot_increase = lot_increase
+        self.market = None  # MarketState fed with bars from the EA, set by the API server
+
+    @property
+    def current_risk_level(self):
+        # Same thresholds as calculate_lot: trading pauses above 80% of the max drawdown
+        if self.current_drawdown > self.max_drawdown * 0.8:
+            return 'paused'
+        if self.current_drawdown > self.max_drawdown * 0.5 or self.volatility > 0.7:
+            return 'elevated'
+        return 'normal'
 
     def update_drawdown(self, current_dd):
         self.current_drawdown = current_dd
@@ -16,26 +39,42 @@ class RiskEngine:
     def update_win_rate(self, new_rate):
         self.win_rate = new_rate
         if self.win_rate < 0.5:
-            self.lot *= 0.8  # Reduce lot
+            self.lot *= self.lot_decrease  # Reduce lot
             self.max_positions = max(1, self.max_positions - 1)
         elif self.win_rate > 0.7:
-            self.lot *= 1.2  # Increase cautiously
+            self.lot *= self.lot_increase  # Increase cautiously
             self.max_positions += 1
 
-    def update_volatility(self):
+    def update_volatility(self, returns=None):
+        # Realized volatility from recent per-trade returns when available
+        if returns is not None and len(returns) > 1:
+            window = min(VOLATILITY_WINDOW, len(returns))
+            realized = metrics.rolling_volatility(returns[-window:], window)[-1]
+            self.volatility = float(min(1.0, realized / VOLATILITY_CAP))
+            return
+        # Local streaming ATR estimate, no network call
+        if self.market is not None:
+            volatility = self.market.volatility()
+            if volatility is not None:
+                self.volatility = volatility
+                return
         # Real volatility update using MCP Fetch or API
         try:
-            result = run_mcp('mcp.config.usrlocalmcp.Fetch', 'fetch', {'url': 'https://api.example.com/volatility/forex'})
+            with track('mcp_fetch'):
+                result = run_mcp('mcp.config.usrlocalmcp.Fetch', 'fetch', {'url': 'https://api.example.com/volatility/forex'})
             data = json.loads(result)
             self.volatility = data.get('volatility', random.uniform(0, 1))
         except:
             self.volatility = random.uniform(0, 1)  # Fallback
 
-    def calculate_lot(self, balance, risk_per_trade=0.01, confidence=1.0):
-        self.update_volatility()
+    @timed('calculate_lot')
+    def calculate_lot(self, balance, risk_per_trade=0.01, confidence=1.0, volatility=None):
+        if volatility is None:
+            self.update_volatility()
+            volatility = self.volatility
         if self.current_drawdown > self.max_drawdown * 0.8:  # Pause if approaching max
             return 0
-        adjusted_risk = risk_per_trade * (1 - self.volatility) * confidence  # Include confidence
+        adjusted_risk = risk_per_trade * (1 - volatility) * confidence  # Include confidence
         return min(self.lot, (balance * adjusted_risk) / 1000)  # Example calculation
 
     def can_open_position(self, current_positions):
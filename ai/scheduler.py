@@ -1,31 +1,242 @@
-import schedule
-import time
-from model_loop import ModelLoop
+import heapq
+import itertools
+import json
 import logging  # Untuk logging jadwal
-from risk_engine import RiskEngine  # Untuk cek drawdown
-
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
-
-loop = ModelLoop()
-risk = RiskEngine()  # Instance untuk monitoring
-
-def check_drawdown():
-    current_dd = risk.current_drawdown
-    if current_dd > 0.04:  # 4% threshold
-        logging.warning(f'Drawdown alert: {current_dd * 100:.2f}%')
-        # Integrate MCP for alert
-        run_mcp('mcp.config.usrlocalmcp.Persistent Knowledge Graph', 'create_entities', {'entities': [{'name': f'Drawdown_Alert_{time.time()}', 'entityType': 'Alert', 'observations': [f'Drawdown exceeded 4%: {current_dd}']}]})
-
-# Untuk kompatibilitas cloud, scheduler ini bisa dijalankan di MCP Trae.ai server
-# dengan integrasi run_mcp untuk tugas terjadwal
-schedule.every(1).days.do(loop.evaluate_performance)  # Daily performance evaluation
-schedule.every(3).days.do(loop.retrain_model)  # Retrain every 3 days
-schedule.every(7).days.do(loop.re_optimize)  # Re-optimize every week
-schedule.every(1).days.do(lambda: run_mcp('mcp.config.usrlocalmcp.Persistent Knowledge Graph', 'create_entities', {'entities': [{'name': f'Schedule_Log_{time.time()}', 'entityType': 'ScheduleEvent', 'observations': ['Daily evaluation completed']}]}))  # Log to KG daily
-schedule.every(1).hours.do(check_drawdown)  # Check drawdown every hour
-
-while True:
-    schedule.run_pending()
-    logging.info('Scheduler checked pending tasks')
-    time.sleep(3600)  # Sleep 1 hour
\ No newline at end of file
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .model_loop import ModelLoop
+    from .shared_state import SharedState
+    from .durable_state import DurableState, STATE_DIR
+    from .knowledge_graph import create_entities  # Ditulis batch ke Knowledge Graph
+except ImportError:  # Run as a script from the ai/ folder
+    from model_loop import ModelLoop
+    from shared_state import SharedState
+    from durable_state import DurableState, STATE_DIR
+    from knowledge_graph import create_entities
+
+STATE_FILE = os.path.join(STATE_DIR, 'scheduler_state.json')  # Last run per job, for catching up after a restart
+DURATION_BUCKETS = [0.1, 1, 10, 60, 300, 1800, 3600]  # Seconds, upper bounds of the histogram buckets
+DRAWDOWN_ALERT = 0.04  # 4% threshold
+LIVE_FIELDS = ('current_drawdown',)  # Owned by the API's equity monitor, never published by model jobs
+DAY = 24 * 3600
+
+
+class Job:
+    def __init__(self, name, func, interval, timeout=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.next_run = 0.0
+        self.last_run = None
+        self.running = False
+        self.started_at = None
+        self.timed_out = False
+        self.stats = {'runs': 0, 'failures': 0, 'skipped': 0, 'timeouts': 0}
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)  # Last bucket is +Inf
+        self.duration_sum = 0.0
+
+    def observe(self, duration):
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                break
+        else:
+            i = len(DURATION_BUCKETS)
+        self.buckets[i] += 1
+        self.duration_sum += duration
+
+    def metrics(self):
+        return {
+            **self.stats,
+            'interval': self.interval,
+            'running': self.running,
+            'last_run': self.last_run,
+            'next_run': self.next_run,
+            'duration_sum': self.duration_sum,
+            'duration_buckets': dict(zip([str(b) for b in DURATION_BUCKETS] + ['+Inf'], self.buckets)),
+        }
+
+
+class Scheduler:
+    # Jobs sit in a heap ordered by next run time; the timer thread sleeps until the earliest
+    # one is due and hands it to a worker pool, so a slow job never delays the others.
+    def __init__(self, state_path=STATE_FILE, workers=4, clock=time.time):
+        self.state_path = state_path
+        self.clock = clock
+        self.jobs = {}
+        self.last_run = self.load()
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._save_lock = threading.Lock()
+        self._stop = False
+        self._thread = None
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f).get('last_run', {})
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self._save_lock:
+            state = {'last_run': {name: job.last_run for name, job in self.jobs.items() if job.last_run is not None},
+                     'jobs': self.metrics()}
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            tmp = self.state_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+
+    def every(self, interval, func, name=None, timeout=None):
+        job = Job(name or func.__name__, func, interval, timeout)
+        job.last_run = self.last_run.get(job.name)
+        # Catch up: if the period elapsed while the scheduler was down, the job is due now
+        # (once, not once per missed period)
+        job.next_run = (job.last_run if job.last_run is not None else self.clock()) + interval
+        with self._cond:
+            self.jobs[job.name] = job
+            heapq.heappush(self._heap, (job.next_run, next(self._seq), job.name))
+            self._cond.notify()
+        return job
+
+    def _dispatch(self, job, now):
+        if job.running:  # Previous run still going: skip rather than stack up
+            job.stats['skipped'] += 1
+            logging.warning(f'{job.name} still running, skipped this run')
+        else:
+            job.running, job.started_at, job.timed_out = True, now, False
+            self._pool.submit(self._execute, job)
+        job.next_run += job.interval
+        if job.next_run <= now:
+            job.next_run = now + job.interval
+        heapq.heappush(self._heap, (job.next_run, next(self._seq), job.name))
+
+    def _execute(self, job):
+        start = time.perf_counter()
+        try:
+            job.func()
+            job.stats['runs'] += 1
+        except Exception:
+            job.stats['failures'] += 1
+            logging.exception(f'{job.name} failed')
+        finally:
+            job.observe(time.perf_counter() - start)
+            job.last_run = self.clock()
+            job.running = False
+            self.save()
+            with self._cond:
+                self._cond.notify()
+
+    def _check_timeouts(self, now):
+        # Threads can't be killed: an overdue job is reported and, through the running flag,
+        # kept from being started again until it returns
+        for job in self.jobs.values():
+            if job.running and job.timeout and not job.timed_out and now - job.started_at > job.timeout:
+                job.timed_out = True
+                job.stats['timeouts'] += 1
+                logging.error(f'{job.name} exceeded its {job.timeout}s timeout')
+
+    def _next_wake(self):
+        deadlines = [self._heap[0][0]] if self._heap else []
+        deadlines += [job.started_at + job.timeout for job in self.jobs.values()
+                      if job.running and job.timeout and not job.timed_out]
+        return min(deadlines) if deadlines else None
+
+    def run_pending(self):
+        # Dispatch every job that is due; returns their names
+        with self._cond:
+            now = self.clock()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                _, _, name = heapq.heappop(self._heap)
+                self._dispatch(self.jobs[name], now)
+                due.append(name)
+            self._check_timeouts(now)
+            return due
+
+    def run_forever(self):
+        while True:
+            self.run_pending()
+            with self._cond:
+                if self._stop:
+                    return
+                wake = self._next_wake()
+                self._cond.wait(None if wake is None else max(0.0, wake - self.clock()))
+                if self._stop:
+                    return
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self._pool.shutdown(wait=wait)
+
+    def metrics(self):
+        return {name: job.metrics() for name, job in self.jobs.items()}
+
+
+def build_scheduler(loop=None, shared=None, scheduler=None, durable=None):
+    loop = loop or ModelLoop()
+    # Live strategy/risk state shared with the API server(s) instead of a private RiskEngine
+    shared = shared or SharedState(loop.selector.strategies)
+    shared.publish_if_empty(loop.selector, loop.risk)
+    scheduler = scheduler or Scheduler()
+    model_lock = threading.Lock()  # Model jobs share one ModelLoop; check_drawdown never waits on them
+
+    def model_job(func):
+        def run():
+            with model_lock:
+                shared.load(loop.selector, loop.risk)  # Start from what the API is trading with
+                before = shared.fields(loop.selector, loop.risk)
+                func()
+                # Jobs run for up to hours: only what the job changed is published, over the live
+                # state, and the drawdown stays the equity monitor's push-based value
+                shared.publish_changes(loop.selector, loop.risk, before, skip=LIVE_FIELDS)
+                if durable is not None:
+                    durable.record(func.__name__)
+        run.__name__ = func.__name__
+        return run
+
+    def check_drawdown():
+        current_dd = shared.read_risk()['current_drawdown']
+        if current_dd > DRAWDOWN_ALERT:
+            logging.warning(f'Drawdown alert: {current_dd * 100:.2f}%')
+            create_entities([{'name': f'Drawdown_Alert_{time.time()}', 'entityType': 'Alert', 'observations': [f'Drawdown exceeded 4%: {current_dd}']}])
+
+    def log_schedule_event():
+        create_entities([{'name': f'Schedule_Log_{time.time()}', 'entityType': 'ScheduleEvent', 'observations': ['Daily evaluation completed']}])
+
+    # Untuk kompatibilitas cloud, scheduler ini bisa dijalankan di MCP Trae.ai server
+    scheduler.every(DAY, model_job(loop.evaluate_performance), timeout=1800)  # Daily performance evaluation
+    scheduler.every(3 * DAY, model_job(loop.retrain_model), timeout=3600)  # Retrain every 3 days
+    scheduler.every(7 * DAY, model_job(loop.re_optimize), timeout=6 * 3600)  # Re-optimize every week
+    scheduler.every(DAY, log_schedule_event)  # Log to KG daily
+    scheduler.every(3600, check_drawdown, timeout=60)  # Check drawdown every hour
+    return scheduler
+
+
+if __name__ == '__main__':
+    # Setup logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    loop = ModelLoop()
+    # Restores win rates, risk settings and last_retrain from ai/state before seeding the shared state
+    durable = DurableState(loop.selector, loop.risk, 'scheduler', loop=loop)
+    durable.open(restore=True)
+    durable.start()
+    scheduler = build_scheduler(loop, durable=durable)
+    logging.info(f'Scheduler started with jobs: {", ".join(scheduler.jobs)}')
+    scheduler.run_forever()
@@ -0,0 +1,135 @@
+import json
+import os
+import numpy as np
+
+try:
+    from .shared_state import REGIMES, SENTIMENTS
+except ImportError:  # Run as a script from the ai/ folder
+    from shared_state import REGIMES, SENTIMENTS
+
+# Strategy scoring as a weight tensor instead of a chain of if statements:
+#   weights[regime, sentiment, graph_hint, strategy]  score before weighting by the win rate
+# The last label of every input axis is OTHER and catches values outside the known lists (no boost).
+# Confidences for any number of inputs are one broadcast multiply, and the winning strategy of every
+# input combination is precomputed per (win rates, active) state, so a decision is a table lookup.
+# Tables are immutable: hot swapping the weights means replacing the selector's table.
+#
+#   config/scoring_weights.json  {"strategies": [...], "regimes": [...], "sentiments": [...],
+#                                 "hints": [...], "weights": nested list of that shape}
+
+WEIGHTS_FILE = os.environ.get('SMART_EA_SCORING_WEIGHTS', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'scoring_weights.json'))
+OTHER = 'other'
+BASE_SCORE = 0.5
+MIN_CONFIDENCE = 0.5  # A strategy is only traded above this
+
+
+def rule_score(regime, sentiment, hint, strategy, boosts):
+    # The hand-written rules the default tensor is compiled from
+    score = BASE_SCORE
+    if strategy == hint: score += boosts['graph']  # Boost from graph
+    if regime == 'trending' and strategy == 'trend_following': score += boosts['regime']
+    if regime == 'high_volatility' and strategy == 'scalping': score += boosts['regime']
+    if regime == 'ranging' and strategy == 'reversal': score += boosts['regime']
+    if sentiment == 'positive' and strategy == 'breakout': score += boosts['sentiment']
+    elif sentiment == 'negative' and strategy == 'reversal': score += boosts['sentiment']
+    if sentiment == 'positive' and strategy == 'news': score += boosts['news_positive']
+    elif sentiment == 'negative' and strategy == 'news': score += boosts['news_negative']
+    return score
+
+
+def decide(confidence, active):
+    # (best strategy index or -1, its confidence) along the last axis, same rule as select_strategy
+    eligible = active & (confidence > MIN_CONFIDENCE)
+    best = np.argmax(np.where(eligible, confidence, -np.inf), axis=-1)
+    has_strategy = eligible.any(axis=-1)
+    best_confidence = np.take_along_axis(confidence, best[..., None], axis=-1)[..., 0]
+    return np.where(has_strategy, best, -1), np.where(has_strategy, best_confidence, 0.0)
+
+
+class ScoringTable:
+    def __init__(self, strategies, weights, regimes=None, sentiments=None, hints=None):
+        self.strategies = list(strategies)
+        self.regimes = list(regimes) if regimes is not None else REGIMES + [OTHER]
+        self.sentiments = list(sentiments) if sentiments is not None else SENTIMENTS + [OTHER]
+        self.hints = list(hints) if hints is not None else self.strategies + [OTHER]
+        shape = (len(self.regimes), len(self.sentiments), len(self.hints), len(self.strategies))
+        self.weights = np.array(weights, dtype=float)
+        if self.weights.shape != shape:
+            raise ValueError(f'Scoring weights have shape {self.weights.shape}, expected {shape}')
+        if not np.all(np.isfinite(self.weights)):
+            raise ValueError('Scoring weights must be finite')
+        self.weights.setflags(write=False)
+        self._regime = {name: i for i, name in enumerate(self.regimes)}
+        self._sentiment = {name: i for i, name in enumerate(self.sentiments)}
+        self._hint = {name: i for i, name in enumerate(self.hints)}
+        self._decisions = None  # (win rates, active, best, best confidence, confidences) as Python lists
+
+    @classmethod
+    def from_boosts(cls, strategies, boosts):
+        regimes, sentiments, hints = REGIMES + [OTHER], SENTIMENTS + [OTHER], list(strategies) + [OTHER]
+        weights = [[[[rule_score(regime, sentiment, hint, s, boosts) for s in strategies]
+                     for hint in hints] for sentiment in sentiments] for regime in regimes]
+        return cls(strategies, weights, regimes, sentiments, hints)
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            return cls(data['strategies'], data['weights'], data.get('regimes'), data.get('sentiments'),
+                       data.get('hints'))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid scoring weights: {e!r}')
+
+    def as_dict(self):
+        return {'strategies': self.strategies, 'regimes': self.regimes, 'sentiments': self.sentiments,
+                'hints': self.hints, 'weights': self.weights.tolist()}
+
+    def index(self, regime, sentiment, hint):
+        # Unknown values map to the last (OTHER) slot of their axis
+        return (self._regime.get(regime, len(self.regimes) - 1),
+                self._sentiment.get(sentiment, len(self.sentiments) - 1),
+                self._hint.get(hint, len(self.hints) - 1))
+
+    def indices(self, regimes, sentiments, hints):
+        # Index arrays for a batch of inputs
+        rows = [self.index(r, s, h) for r, s, h in zip(regimes, sentiments, hints)]
+        return tuple(np.array(rows, dtype=np.intp).reshape(-1, 3).T)
+
+    def base(self, regime, sentiment, hint):
+        return self.weights[self.index(regime, sentiment, hint)]
+
+    def confidences(self, win_rates, regime, sentiment, hint):
+        # Index arguments may be scalars or arrays; win_rates is (strategies,) or (rows, strategies)
+        return np.minimum(1.0, self.weights[regime, sentiment, hint] * win_rates)
+
+    def decisions(self, win_rates, active):
+        # Decision for every input combination under these win rates, rebuilt only when they change
+        win_rates, active = tuple(win_rates), tuple(active)
+        cached = self._decisions
+        if cached is None or cached[0] != win_rates or cached[1] != active:
+            confidence = np.minimum(1.0, self.weights * np.array(win_rates))
+            best, best_confidence = decide(confidence, np.array(active, dtype=bool))
+            cached = self._decisions = (win_rates, active, best.tolist(), best_confidence.tolist(),
+                                        confidence.tolist())
+        return cached
+
+    def lookup(self, win_rates, active, regime, sentiment, hint):
+        # (best strategy index or -1, its confidence, confidence of every strategy)
+        r, s, h = self.index(regime, sentiment, hint)
+        _, _, best, best_confidence, confidence = self.decisions(win_rates, active)
+        return best[r][s][h], best_confidence[r][s][h], confidence[r][s][h]
+
+
+def save_weights(table, path=WEIGHTS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(table.as_dict(), f)
+    os.replace(tmp_path, path)
+
+
+def load_weights(path=WEIGHTS_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return ScoringTable.from_dict(json.load(f))
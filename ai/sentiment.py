@@ -0,0 +1,222 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+
+try:
+    from .logger import log_to_db
+    from .instrumentation import gauge, observe_dependency
+    from .circuit_breaker import CircuitBreaker
+except ImportError:  # Run as a script from the ai/ folder
+    from logger import log_to_db
+    from instrumentation import gauge, observe_dependency
+    from circuit_breaker import CircuitBreaker
+
+BYTEPLUS_MODELARK_API = 'https://api.byteplus.com/modelark/analyze'
+NEWS_SOURCES = [
+    'https://forexnewsapi.com/api/v1/news?section=general&items=1&token=YOUR_FOREXNEWSAPI_TOKEN',
+    'https://another-news-api.com/latest'  # Add more sources
+]
+# One SQLite file shared by the API server and the scheduler
+CACHE_PATH = os.environ.get('SENTIMENT_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentiment_cache.sqlite'))
+SOURCE_TIMEOUT = 3.0
+LLM_TIMEOUT = 10.0
+
+
+def news_key(text):
+    # Same headlines with different spacing/case hit the same cache entry
+    normalized = re.sub(r'\s+', ' ', text).strip().lower()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class SentimentCache:
+    # LRU + TTL cache of LLM results keyed by news_key, persisted in SQLite (WAL mode so
+    # several processes can read while one writes)
+    def __init__(self, path=CACHE_PATH, max_entries=1000, ttl=6 * 3600, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS sentiment (key TEXT PRIMARY KEY, sentiment TEXT, reasoning TEXT, '
+                       'created REAL, accessed REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS sentiment_accessed ON sentiment (accessed)')
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        now = self.clock()
+        with self._connect() as db:
+            row = db.execute('SELECT sentiment, reasoning, created FROM sentiment WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl:
+                db.execute('DELETE FROM sentiment WHERE key = ?', (key,))
+                return None
+            db.execute('UPDATE sentiment SET accessed = ? WHERE key = ?', (now, key))
+        return {'sentiment': row[0], 'reasoning': row[1]}
+
+    def put(self, key, sentiment, reasoning=''):
+        now = self.clock()
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO sentiment VALUES (?, ?, ?, ?, ?)', (key, sentiment, reasoning, now, now))
+            db.execute('DELETE FROM sentiment WHERE created < ?', (now - self.ttl,))
+            # Evict least recently used entries beyond the bound
+            db.execute('DELETE FROM sentiment WHERE key IN (SELECT key FROM sentiment ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                       (self.max_entries,))
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM sentiment').fetchone()[0]
+
+
+class LatencyStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+
+    def record(self, latency, ok):
+        self.calls += 1
+        self.failures += not ok
+        self.total_latency += latency
+        self.last_latency = latency
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'avg_latency': self.total_latency / self.calls if self.calls else 0.0,
+            'last_latency': self.last_latency,
+        }
+
+
+class SentimentService:
+    def __init__(self, sources=NEWS_SOURCES, cache=None, source_timeout=SOURCE_TIMEOUT, llm_timeout=LLM_TIMEOUT, session=None):
+        self.sources = list(sources)
+        self.cache = cache if cache is not None else SentimentCache()
+        self.source_timeout = source_timeout
+        self.llm_timeout = llm_timeout
+        self.session = session or requests.Session()
+        self.breakers = {source: CircuitBreaker() for source in self.sources}
+        self.llm_breaker = CircuitBreaker()
+        self.source_stats = {source: LatencyStats() for source in self.sources}
+        self.llm_stats = LatencyStats()
+        self.hits = 0
+        self.misses = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.sources)), thread_name_prefix='news-fetch')
+
+    def _fetch_source(self, source):
+        start = time.perf_counter()
+        try:
+            response = self.session.get(source, timeout=self.source_timeout)
+            response.raise_for_status()
+            news_item = response.json().get('data', [{}])[0]
+            self.breakers[source].record_success()
+            self.source_stats[source].record(time.perf_counter() - start, True)
+            observe_dependency('news_source', time.perf_counter() - start)
+            return news_item.get('title', '') + ' ' + news_item.get('snippet', '')
+        except Exception as e:
+            self.breakers[source].record_failure()
+            self.source_stats[source].record(time.perf_counter() - start, False)
+            observe_dependency('news_source', time.perf_counter() - start, False)
+            print(f"News source failed ({source}): {e}")
+            return ''
+
+    def fetch_news(self):
+        # All sources in parallel; sources with an open breaker are skipped
+        futures = [self._pool.submit(self._fetch_source, s) for s in self.sources if self.breakers[s].allow()]
+        done, _ = wait(futures, timeout=self.source_timeout * 2)
+        return ' '.join(f.result() for f in futures if f in done).strip()
+
+    def analyze(self, news):
+        if not self.llm_breaker.allow():
+            raise RuntimeError('BytePlus circuit open')
+        # Enhanced prompt for BytePlus
+        api_key = os.environ.get('BYTEPLUS_API_KEY')
+        if not api_key:
+            raise ValueError("BYTEPLUS_API_KEY not set")
+        headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
+        prompt = f"Analyze the sentiment of this forex news text in detail and classify as positive, negative, or neutral with reasoning: {news[:1000]}"
+        start = time.perf_counter()
+        try:
+            response = self.session.post(BYTEPLUS_MODELARK_API, json={'prompt': prompt, 'model': 'skylark'},
+                                         headers=headers, timeout=self.llm_timeout)
+            response.raise_for_status()
+            result = response.json()
+        except Exception:
+            self.llm_breaker.record_failure()
+            self.llm_stats.record(time.perf_counter() - start, False)
+            observe_dependency('byteplus', time.perf_counter() - start, False)
+            raise
+        self.llm_breaker.record_success()
+        self.llm_stats.record(time.perf_counter() - start, True)
+        observe_dependency('byteplus', time.perf_counter() - start)
+        return result.get('sentiment', 'neutral'), result.get('reasoning', '')
+
+    def lookup(self, news):
+        cached = self.cache.get(news_key(news))
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def remember(self, news, sentiment, reasoning=''):
+        self.cache.put(news_key(news), sentiment, reasoning)
+
+    def get_sentiment(self):
+        news = self.fetch_news()
+        if not news:
+            return 'neutral'
+        cached = self.lookup(news)
+        if cached is not None:
+            return cached['sentiment']
+        sentiment, reasoning = self.analyze(news)
+        self.remember(news, sentiment, reasoning)
+        # Log to database with more details
+        log_to_db('INFO', 'Sentiment analysis', {'sentiment': sentiment, 'reasoning': reasoning, 'news': news[:200]})
+        print(f"BytePlus ModelArk Sentiment: {sentiment} (Reason: {reasoning})")
+        return sentiment
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'cache_entries': len(self.cache),
+            'llm': {**self.llm_stats.as_dict(), 'breaker': self.llm_breaker.state},
+            'sources': {s: {**self.source_stats[s].as_dict(), 'breaker': self.breakers[s].state} for s in self.sources},
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = SentimentService()
+    return _service
+
+
+def _hit_ratio():
+    if _service is None or not _service.hits + _service.misses:
+        return {}
+    return {('sentiment',): _service.hits / (_service.hits + _service.misses)}
+
+gauge('smart_ea_cache_hit_ratio', 'Share of lookups answered from cache', _hit_ratio, ('cache',))
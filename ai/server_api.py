@@ -1,33 +1,253 @@
-from flask import Flask, request, jsonify
-from strategy_selector import StrategySelector
-from risk_engine import RiskEngine
-import logger  # Add import for logger
-import json  # For handling JSON data in dashboard
+from flask import Flask, Response, request, jsonify, g
+import os
+import time
+
+try:
+    from .strategy_selector import StrategySelector
+    from .risk_engine import RiskEngine
+    from .decision_snapshot import SnapshotRefresher, snapshot_age
+    from .optimizer import apply_params, load_best_params, ScoringReloader
+    from .scoring import ScoringTable, save_weights
+    from .fleet import FleetState
+    from .sentiment import get_service
+    from .market_state import MarketState
+    from .shared_state import SharedState
+    from .dashboard_state import DashboardState
+    from .durable_state import DurableState, recover
+    from .equity_monitor import EquityMonitor, KillSwitch
+    from . import binary_server, instrumentation
+    from . import logger  # Add import for logger
+except ImportError:  # Run as a script from the ai/ folder
+    from strategy_selector import StrategySelector
+    from risk_engine import RiskEngine
+    from decision_snapshot import SnapshotRefresher, snapshot_age
+    from optimizer import apply_params, load_best_params, ScoringReloader
+    from scoring import ScoringTable, save_weights
+    from fleet import FleetState
+    from sentiment import get_service
+    from market_state import MarketState
+    from shared_state import SharedState
+    from dashboard_state import DashboardState
+    from durable_state import DurableState, recover
+    from equity_monitor import EquityMonitor, KillSwitch
+    import binary_server
+    import instrumentation
+    import logger
 
 app = Flask(__name__)
 selector = StrategySelector()
 risk = RiskEngine()
+best_params = load_best_params()  # Written by the optimizer (ModelLoop.re_optimize)
+if best_params:
+    apply_params(best_params, selector, risk)
+# Live strategy/risk state shared with the scheduler (and ASGI workers, if any)
+shared = SharedState(selector.strategies)
+seeded = shared.publish_if_empty(selector, risk)
+shared_version = -1
+# Remote inputs (regime, sentiment, graph, volatility) are refreshed in the background,
+# the tick routes below only read the latest snapshot
+refresher = SnapshotRefresher(selector, risk)
+# Streaming ATR/volatility/ADX/range estimators over closed bars pushed by the EA,
+# regime and volatility come from here once enough bars have arrived
+market = MarketState()
+selector.market = market
+risk.market = market
+# Equity/drawdown per account from trade outcomes and EA equity pushes; its kill switch stops new trades
+# in every worker and transport through the shared state
+equity = EquityMonitor(risk)
+kill_switch = KillSwitch(equity, shared)
+# Per-symbol / per-account state for the batch routes used by multi-chart EA fleets
+fleet = FleetState(selector, risk, kill_switch=kill_switch)
+# Write-ahead log + snapshots of the learned state (fleet rows included) under ai/state/api, opened in __main__
+durable = DurableState(selector, risk, 'api', fleet=fleet)
+
+instrumentation.gauge('smart_ea_snapshot_age_seconds', 'Age of the decision snapshot served to the EA',
+                      lambda: snapshot_age(refresher.snapshot) if refresher.snapshot is not None else 0)
+instrumentation.gauge('smart_ea_kill_switch', '1 while new trades are halted by the equity monitor',
+                      lambda: int(kill_switch.halted))
+instrumentation.gauge('smart_ea_live_drawdown', 'Largest live drawdown across accounts', lambda: risk.current_drawdown)
+
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+    instrumentation.profiler.begin()
+
+@app.after_request
+def record_latency(response):
+    duration = time.perf_counter() - g.start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    instrumentation.REQUEST_SECONDS.observe(duration, request.method, route, response.status_code)
+    instrumentation.profiler.end(f'{request.method} {route}', duration)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return instrumentation.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/debug/profile', methods=['POST'])
+def toggle_profiler():
+    # Body: {"enabled": true, "threshold_ms": 250}; stacks of slower requests go to profiles/slow_requests.folded
+    data = request.get_json(silent=True) or {}
+    if data.get('enabled'):
+        threshold = data.get('threshold_ms')
+        instrumentation.profiler.enable(threshold=threshold / 1000 if threshold is not None else None)
+    else:
+        instrumentation.profiler.disable()
+    profiler = instrumentation.profiler
+    return jsonify({'enabled': profiler.enabled, 'threshold_ms': profiler.threshold * 1000, 'dumped': profiler.dumped,
+                    'path': profiler.path})
+
+# Scoring table follows best_params.json / scoring_weights.json without a restart
+scoring_reloader = ScoringReloader(selector)
+scoring_reloader.reload(force=True)
+
+def sync_shared():
+    # Cheap version check; state is copied in only when the scheduler or another server changed it
+    global shared_version
+    scoring_reloader.reload()
+    version = shared.version
+    if version != shared_version:
+        shared.load(selector, risk)
+        kill_switch.sync()
+        if equity.accounts:
+            risk.current_drawdown = equity.drawdown  # The live value wins over what was published
+        shared_version = version
+        durable.record('sync')  # Changes published by the scheduler or other workers
+
+# Cached, versioned state for dashboards (JSON + SSE deltas) instead of rendering per hit
+dashboard_view = DashboardState(selector, risk, logger.recent_logs, sync=sync_shared)
+
+class Decisions:
+    # Handlers shared by the Flask routes and the binary socket server (binary_server.py)
+    def strategy(self, symbol=None):
+        sync_shared()
+        snapshot = refresher.for_symbol(symbol)
+        if kill_switch.halted:
+            return 'none', 0.0, snapshot_age(snapshot)
+        strategy, confidence = selector.select_strategy(snapshot.regime, snapshot.sentiment, snapshot.graph_hint)
+        return strategy, confidence, snapshot_age(snapshot)
+
+    def lot(self, balance, symbol=None):
+        sync_shared()
+        snapshot = refresher.for_symbol(symbol)
+        if kill_switch.halted:
+            return 0, snapshot_age(snapshot)
+        return risk.calculate_lot(balance, volatility=snapshot.volatility), snapshot_age(snapshot)
+
+    def update(self, strategy, win, profit=None, account='default', balance=None):
+        global shared_version
+        if profit is not None:
+            kill_switch.record_trade(account, profit, balance)  # May publish a halt, so not inside the transaction
+        with shared.transaction(selector, risk):
+            selector.update_win_rate(strategy, win)
+            risk.update_win_rate(selector.win_rates[strategy])
+            if equity.accounts:
+                risk.current_drawdown = equity.drawdown  # Live value, published with the rest
+        shared_version = shared.version
+        durable.record('update_win_rate', strategy=strategy, win=win)
+        dashboard_view.changed()
+        return selector.win_rates[strategy]
+
+    def equity(self, account, value, balance=None):
+        global shared_version
+        state = kill_switch.update_equity(account, value, balance)
+        if kill_switch.publish_drawdown(selector, risk):
+            shared_version = shared.version
+        return {'halted': kill_switch.halted, 'reason': shared.read_halt()['reason'], 'account': state.as_dict()}
+
+    def log(self, level, message, data=None):
+        logger.log_to_db(level, message, data)
+
+decisions = Decisions()
 
 @app.route('/strategy', methods=['GET'])
 def get_strategy():
-    strategy, confidence = selector.select_strategy()
-    return jsonify({'strategy': strategy, 'confidence': confidence})
+    # ?symbol=XAUUSD uses that symbol's regime/volatility from /market/bars
+    strategy, confidence, age = decisions.strategy(request.args.get('symbol'))
+    return jsonify({'strategy': strategy, 'confidence': confidence, 'snapshot_age': age})
 
 @app.route('/risk/lot', methods=['POST'])
 def get_lot():
+    # Body: {"balance": ..., "symbol": ...}
     data = request.json
-    balance = data.get('balance', 10000)
-    lot = risk.calculate_lot(balance)
-    return jsonify({'lot': lot})
+    lot, age = decisions.lot(data.get('balance', 10000), data.get('symbol'))
+    return jsonify({'lot': lot, 'snapshot_age': age})
 
 @app.route('/update', methods=['POST'])
 def update():
+    # Body: {"strategy": ..., "win": ...}, optionally "profit", "account" and "balance" for the equity monitor
+    data = request.json
+    decisions.update(data['strategy'], data['win'], data.get('profit'), str(data.get('account', 'default')),
+                     data.get('balance'))
+    return jsonify({'status': 'updated', 'halted': kill_switch.halted})
+
+@app.route('/equity', methods=['GET', 'POST'])
+def push_equity():
+    # POST body: {"account": ..., "equity": ..., "balance": ...} with floating P&L, as often as every tick
+    if request.method == 'POST':
+        data = request.json
+        return jsonify(decisions.equity(str(data.get('account', 'default')), data['equity'], data.get('balance')))
+    return jsonify(kill_switch.as_dict())
+
+@app.route('/equity/reset', methods=['POST'])
+def reset_equity():
+    # Body: {"account": ...} or {} for all accounts; resumes trading after a kill-switch halt
+    data = request.get_json(silent=True) or {}
+    kill_switch.reset(data.get('account'))
+    return jsonify(kill_switch.as_dict())
+
+@app.route('/market/bars', methods=['POST'])
+def push_bars():
+    # Body: {"symbol": "XAUUSD", "bars": [{"time": ..., "open": ..., "high": ..., "low": ..., "close": ...}, ...]}
     data = request.json
-    strategy = data['strategy']
-    win = data['win']
-    selector.update_win_rate(strategy, win)
-    risk.update_win_rate(selector.win_rates[strategy])
-    return jsonify({'status': 'updated'})
+    symbol = data['symbol']
+    # Only this symbol's inputs change: decisions that pass it read them through refresher.for_symbol
+    accepted = market.push(symbol, data.get('bars', []))
+    return jsonify({'accepted': accepted, 'state': market.symbols[symbol].as_dict()})
+
+@app.route('/batch/strategy', methods=['POST'])
+def batch_strategy():
+    # Body: [{"symbol": ..., "account": ..., "balance": ...}, ...] or {"requests": [...]}, each row
+    # decided with its symbol's regime/volatility
+    data = request.json
+    requests_ = data.get('requests', []) if isinstance(data, dict) else data
+    snapshot = refresher.current()
+    scoring_reloader.reload()
+    reply = {'decisions': fleet.decide(requests_, snapshot), 'snapshot_age': snapshot_age(snapshot)}
+    if kill_switch.halted:
+        reply['halted'] = True
+    return jsonify(reply)
+
+@app.route('/batch/update', methods=['POST'])
+def batch_update():
+    # Body: [{"symbol": ..., "account": ..., "strategy": ..., "win": ...}, ...] or {"updates": [...]},
+    # rows may carry "profit" and "balance" for the equity monitor as on /update
+    global shared_version
+    data = request.json
+    outcomes = data.get('updates', []) if isinstance(data, dict) else data
+    count = fleet.update(outcomes)
+    if kill_switch.publish_drawdown(selector, risk):
+        shared_version = shared.version
+    durable.record('batch_update', count=count)
+    dashboard_view.changed()
+    return jsonify({'status': 'updated', 'count': count, 'halted': kill_switch.halted})
+
+@app.route('/scoring/weights', methods=['GET', 'POST'])
+def scoring_weights():
+    # POST body: a weight tensor as in scoring_weights.json, saved for the other processes and swapped in,
+    # or {} to reload from the config files now
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            if 'weights' in data:
+                table = ScoringTable.from_dict(data)
+                selector.set_scoring(table)
+                save_weights(table, scoring_reloader.weights_path)
+            else:
+                scoring_reloader.reload(force=True)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(selector.scoring.as_dict())
 
 @app.route('/log', methods=['POST'])
 def log():
@@ -35,78 +255,149 @@ def log():
     level = data.get('level', 'INFO')
     message = data.get('message')
     log_data = data.get('data')
-    logger.log_to_db(level, message, log_data)
+    decisions.log(level, message, log_data)
     return jsonify({'status': 'logged'})
 
+@app.route('/sentiment/metrics', methods=['GET'])
+def sentiment_metrics():
+    return jsonify(get_service().metrics())
+
+# Static page; live data comes from /dashboard/state and the /dashboard/stream SSE deltas
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Smart EA Dashboard</title>
+    <style>
+        body { font-family: Arial, sans-serif; background-color: #f0f4f8; color: #333; margin: 0; padding: 20px; }
+        .container { max-width: 1200px; margin: auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        h1 { color: #007bff; }
+        .section { margin-bottom: 20px; }
+        table { width: 100%; border-collapse: collapse; }
+        th, td { padding: 10px; border: 1px solid #ddd; text-align: left; }
+        th { background-color: #007bff; color: white; }
+        .status { font-weight: bold; color: #28a745; }
+        .status.elevated { color: #fd7e14; }
+        .status.paused { color: #dc3545; }
+        /* Responsive design */
+        @media (max-width: 768px) { .container { padding: 10px; } }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Smart EA Monitoring Dashboard</h1>
+
+        <div class="section">
+            <h2>Current Status</h2>
+            <p>Risk Level: <span id="risk-level" class="status">-</span></p>
+            <table id="risk"><tr><th>Field</th><th>Value</th></tr></table>
+        </div>
+
+        <div class="section">
+            <h2>Strategies & Win Rates</h2>
+            <table id="strategies"><tr><th>Strategy</th><th>Win Rate</th><th>Confidence</th><th>Active</th></tr></table>
+        </div>
+
+        <div class="section">
+            <h2>Sentiment</h2>
+            <p>Cache Hit Rate: <span id="hit-rate" class="status">-</span></p>
+            <table id="sentiment"><tr><th>Service</th><th>Calls</th><th>Failures</th><th>Avg Latency</th><th>Breaker</th></tr></table>
+        </div>
+
+        <div class="section">
+            <h2>Recent Logs</h2>
+            <table id="logs"><tr><th>Time</th><th>Level</th><th>Message</th><th>Data</th></tr></table>
+        </div>
+    </div>
+    <script>
+        let state = null;
+        const pct = v => (100 * v).toFixed(2) + '%';
+        function cell(row, text) { row.insertCell().textContent = text; }
+        function render() {
+            const level = document.getElementById('risk-level');
+            level.textContent = state.risk.risk_level;
+            level.className = 'status ' + state.risk.risk_level;
+            const risk = document.getElementById('risk');
+            while (risk.rows.length > 1) risk.deleteRow(1);
+            for (const [field, value] of Object.entries(state.risk)) {
+                const row = risk.insertRow(); cell(row, field); cell(row, value);
+            }
+            const table = document.getElementById('strategies');
+            while (table.rows.length > 1) table.deleteRow(1);
+            for (const [name, s] of Object.entries(state.strategies)) {
+                const row = table.insertRow();
+                cell(row, name); cell(row, pct(s.win_rate)); cell(row, s.confidence.toFixed(3)); cell(row, s.active ? 'yes' : 'no');
+            }
+        }
+        function addLog(entry) {
+            const row = document.getElementById('logs').insertRow(1);
+            cell(row, new Date(entry.timestamp * 1000).toLocaleTimeString());
+            cell(row, entry.level); cell(row, entry.message); cell(row, JSON.stringify(entry.data));
+        }
+        function load(full) {
+            state = full;
+            const logs = document.getElementById('logs');
+            while (logs.rows.length > 1) logs.deleteRow(1);
+            full.events.forEach(addLog);
+            render();
+        }
+        const stream = new EventSource('/dashboard/stream');
+        stream.addEventListener('snapshot', e => load(JSON.parse(e.data)));
+        stream.addEventListener('state', e => {
+            const delta = JSON.parse(e.data);
+            for (const [name, fields] of Object.entries(delta.strategies || {})) Object.assign(state.strategies[name], fields);
+            Object.assign(state.risk, delta.risk || {});
+            render();
+        });
+        stream.addEventListener('log', e => addLog(JSON.parse(e.data)));
+        stream.addEventListener('trade', e => addLog(JSON.parse(e.data)));
+        function loadSentiment() {
+            fetch('/sentiment/metrics').then(r => r.json()).then(m => {
+                document.getElementById('hit-rate').textContent = pct(m.hit_rate) + ' (' + m.cache_entries + ' cached)';
+                const table = document.getElementById('sentiment');
+                while (table.rows.length > 1) table.deleteRow(1);
+                for (const [name, s] of [['BytePlus ModelArk', m.llm], ...Object.entries(m.sources)]) {
+                    const row = table.insertRow();
+                    cell(row, name); cell(row, s.calls); cell(row, s.failures);
+                    cell(row, (s.avg_latency * 1000).toFixed(0) + ' ms'); cell(row, s.breaker);
+                }
+            });
+        }
+        loadSentiment();
+        setInterval(loadSentiment, 30000);  // Upstream stats are not part of the SSE state
+    </script>
+</body>
+</html>
+"""
+
 @app.route('/', methods=['GET'])
 def dashboard():
-    # Simulate fetching data for dashboard
-    strategies = selector.strategies
-    win_rates = selector.win_rates
-    current_risk = risk.current_risk_level
-    # For logs, assume a function to fetch recent logs (simulated)
-    recent_logs = [
-        {'level': 'INFO', 'message': 'Trade opened', 'data': {'strategy': 'Scalping'}},
-        {'level': 'WARNING', 'message': 'High volatility detected', 'data': {}}
-    ]  # In real, fetch from database via logger
-    
-    # Modern HTML dashboard with CSS for beautiful UI
-    html = '''
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Smart EA Dashboard</title>
-        <style>
-            body { font-family: Arial, sans-serif; background-color: #f0f4f8; color: #333; margin: 0; padding: 20px; }
-            .container { max-width: 1200px; margin: auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
-            h1 { color: #007bff; }
-            .section { margin-bottom: 20px; }
-            table { width: 100%; border-collapse: collapse; }
-            th, td { padding: 10px; border: 1px solid #ddd; text-align: left; }
-            th { background-color: #007bff; color: white; }
-            .status { font-weight: bold; color: #28a745; }
-            /* Responsive design */
-            @media (max-width: 768px) { .container { padding: 10px; } }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Smart EA Monitoring Dashboard</h1>
-            
-            <div class="section">
-                <h2>Current Status</h2>
-                <p>Risk Level: <span class="status">{current_risk}</span></p>
-            </div>
-            
-            <div class="section">
-                <h2>Strategies & Win Rates</h2>
-                <table>
-                    <tr><th>Strategy</th><th>Win Rate</th></tr>
-                    {strategy_rows}
-                </table>
-            </div>
-            
-            <div class="section">
-                <h2>Recent Logs</h2>
-                <table>
-                    <tr><th>Level</th><th>Message</th><th>Data</th></tr>
-                    {log_rows}
-                </table>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
-    
-    # Generate table rows
-    strategy_rows = ''.join([f'<tr><td>{s}</td><td>{win_rates.get(s, 0.0):.2%}</td></tr>' for s in strategies])
-    log_rows = ''.join([f'<tr><td>{log["level"]}</td><td>{log["message"]}</td><td>{json.dumps(log["data"])}</td></tr>' for log in recent_logs])
-    
-    return html.format(current_risk=current_risk, strategy_rows=strategy_rows, log_rows=log_rows)
+    return DASHBOARD_HTML
+
+@app.route('/dashboard/state', methods=['GET'])
+def dashboard_state():
+    version, _, body = dashboard_view.current()
+    etag = dashboard_view.etag(version)
+    if etag in request.headers.get('If-None-Match', ''):
+        return '', 304, {'ETag': etag}
+    return body, 200, {'Content-Type': 'application/json', 'ETag': etag, 'Cache-Control': 'no-cache'}
+
+@app.route('/dashboard/stream', methods=['GET'])
+def dashboard_stream():
+    return Response(dashboard_view.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Remove duplicated routes below
 
 if __name__ == '__main__':
+    # Warm restart: without live shared state (cold boot) the last snapshot + WAL tail are loaded
+    if durable.open(restore=seeded) and seeded:
+        shared.publish(selector, risk)
+    if not seeded:
+        fleet.apply(recover(durable.directory))  # Fleet rows are not in the shared state
+    durable.start()
+    refresher.start()
+    # Persistent binary socket transport for the EA (UseBinarySocket), same handlers as the routes above
+    binary_server.serve('0.0.0.0', int(os.environ.get('SMART_EA_BINARY_PORT', binary_server.DEFAULT_PORT)), decisions)
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,240 @@
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+
+try:
+    from .decision_snapshot import DecisionSnapshot
+except ImportError:  # Run as a script from the ai/ folder
+    from decision_snapshot import DecisionSnapshot
+
+# Strategy/risk state shared by every worker process through one memory-mapped file
+# (in /dev/shm when available). Writers serialize on an flock (between processes) plus a
+# thread lock (flock doesn't exclude threads sharing the fd) and bump a sequence counter
+# around each write; readers retry until they see an even, unchanged counter.
+
+DEFAULT_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+DEFAULT_PATH = os.path.join(DEFAULT_DIR, 'smart_ea_state')
+MAX_STRATEGIES = 32
+REGIMES = ['ranging', 'trending', 'high_volatility']
+SENTIMENTS = ['neutral', 'positive', 'negative']
+RISK_FIELDS = ['lot', 'max_positions', 'max_drawdown', 'current_drawdown', 'win_rate', 'volatility',
+               'lot_decrease', 'lot_increase']
+SNAPSHOT_FIELDS = ['regime', 'sentiment', 'graph_hint', 'volatility', 'created_at']
+
+
+# Slot offsets in the float64 array; slot 0 is the uint64 sequence counter
+STRATEGY_COUNT = 1
+RISK = 2
+SNAPSHOT = RISK + len(RISK_FIELDS)
+WIN_RATES = SNAPSHOT + len(SNAPSHOT_FIELDS)
+ACTIVE = WIN_RATES + MAX_STRATEGIES
+CONFIDENCE = ACTIVE + MAX_STRATEGIES
+# Kill switch: halted flag, reset counter and a JSON {"reason", "reset"} padded into HALT_TEXT_SLOTS
+HALT = CONFIDENCE + MAX_STRATEGIES
+HALT_RESETS = HALT + 1
+HALT_TEXT = HALT + 2
+HALT_TEXT_SLOTS = 64
+SIZE = HALT_TEXT + HALT_TEXT_SLOTS
+
+
+def shared_path():
+    # SMART_EA_SHARED_STATE moves the state file, e.g. to a temp dir for tests and benchmarks
+    return os.environ.get('SMART_EA_SHARED_STATE', DEFAULT_PATH)
+
+
+class SharedState:
+    def __init__(self, strategies, path=None):
+        if len(strategies) > MAX_STRATEGIES:
+            raise ValueError(f'At most {MAX_STRATEGIES} strategies fit in the shared layout')
+        self.strategies = list(strategies)
+        self.path = path = path or shared_path()
+        self._lock_file = open(path + '.lock', 'a+')
+        self._thread_lock = threading.Lock()
+        self._held = {}  # try_lead() locks, kept open for the life of the process
+        with self._locked():
+            mode = 'r+' if os.path.exists(path) and os.path.getsize(path) == SIZE * 8 else 'w+'
+            self.values = np.memmap(path, dtype=np.float64, mode=mode, shape=(SIZE,))
+        self.seq = self.values[:1].view(np.uint64)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def _writing(self):
+        # Caller must hold _locked()
+        self.seq[0] += 1
+        try:
+            yield self.values
+        finally:
+            self.seq[0] += 1
+
+    @property
+    def version(self):
+        return int(self.seq[0])
+
+    @property
+    def initialized(self):
+        return self.values[STRATEGY_COUNT] > 0
+
+    def read(self):
+        # Consistent copy of the whole state
+        while True:
+            before = int(self.seq[0])
+            if before % 2:
+                time.sleep(0)
+                continue
+            values = np.array(self.values)
+            if int(self.seq[0]) == before:
+                return values
+
+    def _store(self, values, selector, risk):
+        n = len(self.strategies)
+        values[STRATEGY_COUNT] = n
+        values[WIN_RATES:WIN_RATES + n] = [selector.win_rates[s] for s in self.strategies]
+        values[ACTIVE:ACTIVE + n] = [float(selector.active[s]) for s in self.strategies]
+        values[CONFIDENCE:CONFIDENCE + n] = [selector.confidence[s] for s in self.strategies]
+        values[RISK:RISK + len(RISK_FIELDS)] = [getattr(risk, f) for f in RISK_FIELDS]
+
+    def _apply(self, values, selector, risk):
+        if values[STRATEGY_COUNT] == 0:
+            return False
+        for i, s in enumerate(self.strategies):
+            selector.win_rates[s] = float(values[WIN_RATES + i])
+            selector.active[s] = bool(values[ACTIVE + i])
+            selector.confidence[s] = float(values[CONFIDENCE + i])
+        for i, field in enumerate(RISK_FIELDS):
+            value = float(values[RISK + i])
+            setattr(risk, field, int(value) if field == 'max_positions' else value)
+        return True
+
+    def publish(self, selector, risk):
+        with self._locked(), self._writing() as values:
+            self._store(values, selector, risk)
+
+    def publish_if_empty(self, selector, risk):
+        # The first worker to start seeds the shared state, later ones adopt it
+        with self._locked():
+            if self.initialized:
+                return False
+            with self._writing() as values:
+                self._store(values, selector, risk)
+            return True
+
+    def read_risk(self):
+        # Risk fields only, for monitors that don't keep a selector/engine of their own
+        values = self.read()
+        return {field: float(values[RISK + i]) for i, field in enumerate(RISK_FIELDS)}
+
+    def load(self, selector, risk):
+        return self._apply(self.read(), selector, risk)
+
+    @contextlib.contextmanager
+    def transaction(self, selector, risk):
+        # Read-modify-write of the shared state, e.g. for /update from any worker
+        with self._locked():
+            self._apply(self.values, selector, risk)
+            yield
+            with self._writing() as values:
+                self._store(values, selector, risk)
+
+    def fields(self, selector, risk):
+        # Published values keyed by (group, name), for diffing what a long-running job changed
+        values = {}
+        for s in self.strategies:
+            values['win_rates', s] = selector.win_rates[s]
+            values['active', s] = selector.active[s]
+            values['confidence', s] = selector.confidence[s]
+        for field in RISK_FIELDS:
+            values['risk', field] = getattr(risk, field)
+        return values
+
+    def publish_changes(self, selector, risk, before, skip=()):
+        # Only the fields changed since `before` (from fields()) are written, on top of the live
+        # state, so changes other workers made in the meantime survive. Returns the changed fields.
+        changed = {key: value for key, value in self.fields(selector, risk).items()
+                   if key[1] not in skip and before.get(key) != value}
+        if changed:
+            with self.transaction(selector, risk):
+                for (group, name), value in changed.items():
+                    if group == 'risk':
+                        setattr(risk, name, value)
+                    else:
+                        getattr(selector, group)[name] = value
+        return changed
+
+    def publish_snapshot(self, snapshot):
+        codes = [
+            REGIMES.index(snapshot.regime) if snapshot.regime in REGIMES else 0,
+            SENTIMENTS.index(snapshot.sentiment) if snapshot.sentiment in SENTIMENTS else 0,
+            self.strategies.index(snapshot.graph_hint) if snapshot.graph_hint in self.strategies else 0,
+            snapshot.volatility,
+            snapshot.created_at,
+        ]
+        with self._locked(), self._writing() as values:
+            values[SNAPSHOT:SNAPSHOT + len(SNAPSHOT_FIELDS)] = codes
+
+    def read_snapshot(self, selector):
+        values = self.read()
+        regime, sentiment, hint, volatility, created_at = values[SNAPSHOT:SNAPSHOT + len(SNAPSHOT_FIELDS)]
+        if created_at == 0:
+            return None
+        regime, sentiment, hint = REGIMES[int(regime)], SENTIMENTS[int(sentiment)], self.strategies[int(hint)]
+        return DecisionSnapshot(
+            regime=regime, sentiment=sentiment, graph_hint=hint, volatility=float(volatility),
+            confidence=selector.score_strategies(regime, sentiment, hint), input_times={},
+            created_at=float(created_at),
+        )
+
+    @property
+    def halted(self):
+        # Single slot read on the decision paths, no retry loop needed
+        return bool(self.values[HALT])
+
+    @property
+    def halt_resets(self):
+        return int(self.values[HALT_RESETS])
+
+    def read_halt(self):
+        values = self.read()
+        text = values[HALT_TEXT:HALT_TEXT + HALT_TEXT_SLOTS].tobytes().rstrip(b'\0')
+        info = json.loads(text) if text else {}
+        return {'halted': bool(values[HALT]), 'reason': info.get('reason'), 'resets': int(values[HALT_RESETS]),
+                'reset': info.get('reset')}
+
+    def publish_halt(self, halted, reason=None, reset=None):
+        # reset: the account (or '*') a manual resume was for; bumps the counter other workers follow
+        text = json.dumps({'reason': reason, 'reset': reset}, ensure_ascii=False).encode()
+        if len(text) > HALT_TEXT_SLOTS * 8:
+            text = json.dumps({'reason': reason and reason[:80], 'reset': reset and reset[:24]},
+                              ensure_ascii=False).encode()
+        with self._locked(), self._writing() as values:
+            values[HALT] = float(bool(halted))
+            if reset is not None:
+                values[HALT_RESETS] += 1
+            packed = values[HALT_TEXT:HALT_TEXT + HALT_TEXT_SLOTS].view(np.uint8)
+            packed[:] = 0
+            packed[:len(text)] = np.frombuffer(text, np.uint8)
+            return int(values[HALT_RESETS])
+
+    def try_lead(self, name='leader'):
+        # Non-blocking exclusive lock held for the life of the process: one worker refreshes inputs,
+        # or owns a per-worker slot such as its journal
+        lock_file = open(f'{self.path}.{name}', 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._held[name] = lock_file
+        return True
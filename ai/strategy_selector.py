@@ -13,7 +13,27 @@ import json
 import os
 import random
 import subprocess
-from .logger import log_to_db  # Import logger
+import numpy as np
+try:
+    from .logger import log_to_db  # Import logger
+    from .sentiment import get_service, NEWS_SOURCES, BYTEPLUS_MODELARK_API
+    from .knowledge_graph import get_graph
+    from .instrumentation import timed
+    from .scoring import ScoringTable
+except ImportError:  # Run as a script from the ai/ folder
+    from logger import log_to_db
+    from sentiment import get_service, NEWS_SOURCES, BYTEPLUS_MODELARK_API
+    from knowledge_graph import get_graph
+    from instrumentation import timed
+    from scoring import ScoringTable
+
+DEFAULT_BOOSTS = {
+    'graph': 0.4,  # Strategy suggested by the knowledge graph
+    'regime': 0.3,  # Strategy matching the market regime
+    'sentiment': 0.2,  # Breakout on positive / reversal on negative news
+    'news_positive': 0.2,
+    'news_negative': -0.1,
+}
 
 class StrategySelector:
     def __init__(self):
@@ -23,51 +43,33 @@ class StrategySelector:
         self.win_rates = {s: 0.5 for s in self.strategies}  # Initial win-rate
         self.last_sentiment_time = 0
         self.cached_sentiment = 'neutral'
+        self.market = None  # MarketState fed with bars from the EA, set by the API server
+        # Tunables, see optimizer.PARAM_SPACE
+        self.boosts = dict(DEFAULT_BOOSTS)
+        self.scoring = ScoringTable.from_boosts(self.strategies, self.boosts)  # Compiled from the boosts
+        self.ema_factor = 0.9
 
-    def get_market_regime(self):
+    def get_market_regime(self, symbol=None):
+        # Regime from the streaming estimators over bars pushed by the EA (see market_state.py)
+        if self.market is not None:
+            regime = self.market.regime(symbol)
+            if regime is not None:
+                return regime
         # Enhanced regime detection (simulated)
         volatility = random.uniform(0, 1)  # Placeholder for real volatility calc
         if volatility > 0.7: return 'high_volatility'
         elif volatility > 0.4: return 'trending'
         else: return 'ranging'
 
+    @timed('news_sentiment')
     def get_news_sentiment(self):
         current_time = time.time()
         if current_time - self.last_sentiment_time < 300:  # Cache for 5 minutes
             return self.cached_sentiment
         
         try:
-            # Use MCP Fetch to get news from multiple sources
-            news_sources = [
-                'https://forexnewsapi.com/api/v1/news?section=general&items=1&token=YOUR_FOREXNEWSAPI_TOKEN',
-                'https://another-news-api.com/latest'  # Add more sources
-            ]
-            latest_news = ''
-            for source in news_sources:
-                # Simulate MCP Fetch call; in real, use run_mcp
-                response = requests.get(source)
-                response.raise_for_status()
-                data = response.json()
-                news_item = data.get('data', [{}])[0]
-                latest_news += news_item.get('title', '') + ' ' + news_item.get('snippet', '') + ' '
-            
-            # Enhanced prompt for BytePlus
-            api_key = os.environ.get('BYTEPLUS_API_KEY')
-            if not api_key:
-                raise ValueError("BYTEPLUS_API_KEY not set")
-            headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
-            prompt = f"Analyze the sentiment of this forex news text in detail and classify as positive, negative, or neutral with reasoning: {latest_news[:1000]}"
-            payload = {'prompt': prompt, 'model': 'skylark'}
-            sentiment_response = requests.post('https://api.byteplus.com/modelark/analyze', json=payload, headers=headers)
-            sentiment_response.raise_for_status()
-            result = sentiment_response.json()
-            sentiment = result.get('sentiment', 'neutral')
-            reasoning = result.get('reasoning', '')
-            
-            # Log to database with more details
-            log_to_db({'event': 'sentiment_analysis', 'sentiment': sentiment, 'reasoning': reasoning, 'news': latest_news[:200]})
-            print(f"BytePlus ModelArk Sentiment: {sentiment} (Reason: {reasoning})")
-            
+            # Concurrent news fetch, LLM result cached by news content across processes
+            sentiment = get_service().get_sentiment()
             self.cached_sentiment = sentiment
             self.last_sentiment_time = current_time
             return sentiment
@@ -76,48 +78,61 @@ class StrategySelector:
             return 'neutral'
 
     def get_graph_data(self, regime):
-        # Use run_mcp to query Persistent Knowledge Graph
+        # Local replica of the Persistent Knowledge Graph, synced in the background
         try:
-            # Assuming run_mcp is available; in practice, integrate via Trae.ai agent
-            graph_response = run_mcp('mcp.config.usrlocalmcp.Persistent Knowledge Graph', 'read_graph', {})
-            # Parse graph to find suitable strategy for regime (simplified)
-            # For real impl, extract from graph_response
-            graph_data = {  # Fallback to simulated if error
-                'high_volatility': 'scalping',
-                'trending': 'breakout',
-                'ranging': 'reversal'
-            }
-            return graph_data.get(regime, 'scalping')
+            return get_graph().strategy_for(regime, 'scalping')
         except Exception as e:
             print(f'MCP query error: {e}')
             return 'scalping'  # Default
 
-    def calculate_confidence(self):
-        regime = self.get_market_regime()
-        sentiment = self.get_news_sentiment()
-        suitable_strategy = self.get_graph_data(regime)
-        for s in self.strategies:
-            score = 0.5  # Base
-            if s == suitable_strategy: score += 0.4  # Boost from graph
-            if regime == 'trending' and s == 'trend_following': score += 0.3
-            if regime == 'high_volatility' and s == 'scalping': score += 0.3
-            if regime == 'ranging' and s == 'reversal': score += 0.3
-            if sentiment == 'positive' and s == 'breakout': score += 0.2
-            elif sentiment == 'negative' and s == 'reversal': score += 0.2
-            if sentiment == 'positive' and s == 'news': score += 0.2
-            elif sentiment == 'negative' and s == 'news': score -= 0.1
-            self.confidence[s] = min(1.0, score * self.win_rates[s])
-
-    def select_strategy(self):
-        self.calculate_confidence()
-        active_strats = [s for s in self.strategies if self.active[s] and self.confidence[s] > 0.5]
-        if not active_strats:
+    def score_strategies(self, regime, sentiment, suitable_strategy):
+        # Pure arithmetic on already-fetched inputs, safe to call on the request path
+        scoring = self.scoring
+        win_rates = np.array([self.win_rates[s] for s in self.strategies])
+        confidence = scoring.confidences(win_rates, *scoring.index(regime, sentiment, suitable_strategy))
+        return dict(zip(self.strategies, confidence.tolist()))
+
+    def base_scores(self, regime, sentiment, suitable_strategy):
+        # Score of every strategy before weighting by its win rate
+        return dict(zip(self.strategies, self.scoring.base(regime, sentiment, suitable_strategy).tolist()))
+
+    def set_boosts(self, boosts):
+        # Recompiles the scoring rules into a new table; the swap is a single reference assignment
+        self.boosts.update(boosts)
+        self.scoring = ScoringTable.from_boosts(self.strategies, self.boosts)
+
+    def set_scoring(self, table):
+        # Hot swap of a loaded weight tensor (scoring.load_weights)
+        if table.strategies != self.strategies:
+            raise ValueError(f'Scoring weights are for {table.strategies}, not {self.strategies}')
+        self.scoring = table
+
+    def _inputs(self, regime, sentiment, suitable_strategy):
+        if regime is None:
+            regime = self.get_market_regime()
+        if sentiment is None:
+            sentiment = self.get_news_sentiment()
+        if suitable_strategy is None:
+            suitable_strategy = self.get_graph_data(regime)
+        return regime, sentiment, suitable_strategy
+
+    def calculate_confidence(self, regime=None, sentiment=None, suitable_strategy=None):
+        self.confidence.update(self.score_strategies(*self._inputs(regime, sentiment, suitable_strategy)))
+
+    @timed('select_strategy')
+    def select_strategy(self, regime=None, sentiment=None, suitable_strategy=None):
+        # Lookup in the decision table precomputed for the current win rates / active flags
+        win_rates = [self.win_rates[s] for s in self.strategies]
+        active = [self.active[s] for s in self.strategies]
+        best, confidence, scores = self.scoring.lookup(win_rates, active,
+                                                       *self._inputs(regime, sentiment, suitable_strategy))
+        self.confidence.update(zip(self.strategies, scores))
+        if best < 0:
             return 'none', 0.0
-        best = max(active_strats, key=lambda s: self.confidence[s])
-        return best, self.confidence[best]
+        return self.strategies[best], confidence
 
     def update_win_rate(self, strategy, win):
-        self.win_rates[strategy] = (self.win_rates[strategy] * 0.9) + (0.1 if win else 0)
+        self.win_rates[strategy] = (self.win_rates[strategy] * self.ema_factor) + ((1 - self.ema_factor) if win else 0)
         if self.win_rates[strategy] < 0.4:
             self.active[strategy] = False
             print(f"Deactivated {strategy} due to low win-rate")
@@ -0,0 +1,103 @@
+import numpy as np
+
+# Deterministic synthetic data for benchmarks and tests: trade histories, bar/tick series
+# and news payloads shaped like what PostgREST, the EA and the news APIs return.
+
+STRATEGIES = ['scalping', 'breakout', 'reversal', 'news', 'trend_following']
+START_NS = 1704067200 * 10**9  # 2024-01-01T00:00:00Z
+MINUTE_NS = 60 * 10**9
+# Per-strategy (win probability, mean win, mean loss) so the strategies differ measurably
+TRADE_PROFILES = {
+    'scalping': (0.58, 12.0, 14.0),
+    'breakout': (0.45, 40.0, 22.0),
+    'reversal': (0.52, 25.0, 24.0),
+    'news': (0.40, 60.0, 30.0),
+    'trend_following': (0.38, 80.0, 28.0),
+}
+HEADLINES = [
+    'Gold rallies as dollar slips after {} data',
+    'Fed officials signal patience on rates ahead of {}',
+    'Risk appetite fades as {} weighs on markets',
+    'Bullion steadies while traders await {}',
+    'Treasury yields climb after strong {} report',
+]
+TOPICS = ['CPI', 'payrolls', 'PMI', 'retail sales', 'GDP', 'FOMC minutes', 'jobless claims']
+
+
+def trade_history(n, strategies=STRATEGIES, seed=0, start_id=1, start_ns=START_NS):
+    # Column arrays in the TradeStore layout (strategy as index into `strategies`)
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, len(strategies), n).astype(np.uint8)
+    profiles = np.array([TRADE_PROFILES.get(s, (0.5, 20.0, 20.0)) for s in strategies])
+    win_prob, mean_win, mean_loss = profiles[codes].T
+    wins = rng.random(n) < win_prob
+    profit = np.where(wins, rng.exponential(mean_win), -rng.exponential(mean_loss))
+    return {
+        'id': np.arange(start_id, start_id + n, dtype=np.int64),
+        'timestamp': start_ns + np.cumsum(rng.integers(1, 30, n)) * MINUTE_NS,
+        'strategy': codes,
+        'profit': np.round(profit, 2),
+        'lot': np.round(rng.uniform(0.01, 0.1, n), 2),
+        'confidence': np.round(rng.uniform(0.5, 1.0, n), 3),
+    }
+
+
+def trade_rows(columns, strategies=STRATEGIES, start=0, stop=None):
+    # PostgREST JSON rows for a slice of trade_history output
+    stop = len(columns['id']) if stop is None else stop
+    timestamps = columns['timestamp'][start:stop].astype('datetime64[ns]').astype(str)
+    return [
+        {'id': int(i), 'timestamp': ts, 'strategy': strategies[c], 'profit': float(p), 'lot': float(l), 'confidence': float(k)}
+        for i, ts, c, p, l, k in zip(columns['id'][start:stop], timestamps, columns['strategy'][start:stop],
+                                     columns['profit'][start:stop], columns['lot'][start:stop],
+                                     columns['confidence'][start:stop])
+    ]
+
+
+def bar_series(n, seed=0, start_price=2000.0, volatility=0.0004, start_ns=START_NS, step_ns=MINUTE_NS):
+    # M1-style OHLC bars from a random walk whose volatility and drift switch regime every few hundred bars
+    rng = np.random.default_rng(seed)
+    regime_length = 500
+    n_regimes = n // regime_length + 1
+    vol = np.repeat(volatility * rng.choice([0.5, 1.0, 2.5], n_regimes), regime_length)[:n]
+    drift = np.repeat(rng.choice([-1.0, 0.0, 1.0], n_regimes) * volatility * 0.2, regime_length)[:n]
+    close = start_price * np.exp(np.cumsum(drift + vol * rng.standard_normal(n)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    wick = start_price * vol * np.abs(rng.standard_normal((2, n)))
+    return {
+        'time': start_ns + np.arange(n, dtype=np.int64) * step_ns,
+        'open': open_,
+        'high': np.maximum(open_, close) + wick[0],
+        'low': np.minimum(open_, close) - wick[1],
+        'close': close,
+    }
+
+
+def bar_rows(bars, start=0, stop=None):
+    # Bars as pushed by the EA to /market/bars (time in epoch seconds)
+    stop = len(bars['close']) if stop is None else stop
+    return [
+        {'time': int(t // 10**9), 'open': float(o), 'high': float(h), 'low': float(l), 'close': float(c)}
+        for t, o, h, l, c in zip(bars['time'][start:stop], bars['open'][start:stop], bars['high'][start:stop],
+                                 bars['low'][start:stop], bars['close'][start:stop])
+    ]
+
+
+def tick_series(n, seed=0, start_price=2000.0, spread=0.2, start_ns=START_NS):
+    rng = np.random.default_rng(seed)
+    time_ns = start_ns + np.cumsum(rng.exponential(250, n)).astype(np.int64) * 10**6
+    bid = start_price + np.cumsum(rng.choice([-1, 0, 1], n, p=[0.3, 0.4, 0.3]) * 0.01)
+    return {'time': time_ns, 'bid': bid, 'ask': bid + spread}
+
+
+def news_payloads(n, seed=0, distinct=None):
+    # Responses of the news APIs in NEWS_SOURCES; `distinct` limits the number of different
+    # headlines so repeated payloads exercise the sentiment cache
+    rng = np.random.default_rng(seed)
+    distinct = distinct or n
+    payloads = []
+    for i in range(n):
+        k = int(rng.integers(0, distinct))
+        title = HEADLINES[k % len(HEADLINES)].format(TOPICS[k % len(TOPICS)])
+        payloads.append({'data': [{'title': title, 'snippet': f'Story {k}: spot gold traded near {2000 + k % 97} an ounce.'}]})
+    return payloads
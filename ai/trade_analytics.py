@@ -0,0 +1,119 @@
+import json
+import os
+import requests
+
+try:
+    from .durable_state import STATE_DIR
+except ImportError:  # Run as a script from the ai/ folder
+    from durable_state import STATE_DIR
+
+POSTGREST_TRADES_URL = 'http://localhost:3000/trades'  # Ambil dari config jika diperlukan
+STATE_FILE = os.path.join(STATE_DIR, 'trade_analytics_state.json')  # Next to the journals, not in the cwd
+INITIAL_BALANCE = 10000  # Assume initial balance
+
+def fetch_trade_pages(session, url, after_id, page_size=1000):
+    # Keyset pagination on the primary key: every page is an index range scan
+    while True:
+        params = {'id': f'gt.{after_id}', 'order': 'id.asc', 'limit': page_size}
+        response = session.get(url, params=params)
+        response.raise_for_status()
+        page = response.json()
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]['id']
+
+class TradeAnalytics:
+    # Running per-strategy and equity statistics over the trades table. Only trades
+    # above the persisted high-water mark are fetched, so each sync is O(new trades).
+    def __init__(self, strategies, url=POSTGREST_TRADES_URL, state_path=STATE_FILE, page_size=1000,
+                 initial_balance=INITIAL_BALANCE, session=None):
+        self.strategies = list(strategies)
+        self.url = url
+        self.state_path = state_path
+        self.page_size = page_size
+        self.initial_balance = initial_balance
+        self.session = session or requests.Session()
+        self.state = self.load()
+
+    def empty_state(self):
+        return {
+            'last_id': 0,
+            'last_timestamp': None,
+            'trades': 0,
+            'balance': float(self.initial_balance),
+            'peak': float(self.initial_balance),
+            'current_drawdown': 0.0,
+            'max_drawdown': 0.0,
+            'strategies': {s: {'trades': 0, 'wins': 0, 'profit': 0.0} for s in self.strategies},
+        }
+
+    def load(self):
+        state = self.empty_state()
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state.update(json.load(f))
+            for s in self.strategies:
+                state['strategies'].setdefault(s, {'trades': 0, 'wins': 0, 'profit': 0.0})
+        return state
+
+    def save(self):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def fetch_pages(self, after_id):
+        return fetch_trade_pages(self.session, self.url, after_id, self.page_size)
+
+    def apply(self, trades):
+        state = self.state
+        for t in trades:
+            profit = t.get('profit', 0) or 0
+            stats = state['strategies'].get(t.get('strategy'))
+            if stats is not None:
+                stats['trades'] += 1
+                stats['wins'] += profit > 0
+                stats['profit'] += profit
+            state['trades'] += 1
+            state['balance'] += profit
+            state['peak'] = max(state['peak'], state['balance'])
+            state['current_drawdown'] = (state['peak'] - state['balance']) / state['peak'] if state['peak'] > 0 else 0
+            state['max_drawdown'] = max(state['max_drawdown'], state['current_drawdown'])
+            state['last_id'] = max(state['last_id'], t.get('id', 0))
+            state['last_timestamp'] = t.get('timestamp', state['last_timestamp'])
+
+    def sync(self):
+        new_trades = []
+        for page in self.fetch_pages(self.state['last_id']):
+            self.apply(page)
+            new_trades.extend(page)
+        if new_trades:
+            self.save()
+        return new_trades
+
+    def rebuild(self):
+        # Explicit full recomputation from the first trade
+        self.state = self.empty_state()
+        new_trades = self.sync()
+        self.save()
+        return new_trades
+
+    def win_rates(self, default=0.5):
+        return {
+            s: stats['wins'] / stats['trades'] if stats['trades'] else default  # Default jika tidak ada trade
+            for s, stats in self.state['strategies'].items()
+        }
+
+    @property
+    def max_drawdown(self):
+        return self.state['max_drawdown']
+
+    @property
+    def total_profit(self):
+        return self.state['balance'] - self.initial_balance
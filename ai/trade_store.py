@@ -0,0 +1,204 @@
+import csv
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import requests
+
+try:
+    from .metrics import to_ns
+    from .trade_analytics import fetch_trade_pages, POSTGREST_TRADES_URL
+    from .durable_state import STATE_DIR
+except ImportError:  # Run as a script from the ai/ folder
+    from metrics import to_ns
+    from trade_analytics import fetch_trade_pages, POSTGREST_TRADES_URL
+    from durable_state import STATE_DIR
+
+STORE_DIR = os.path.join(STATE_DIR, 'trade_store')  # Next to the journals, not in the cwd
+COLUMNS = [
+    ('id', np.int64),
+    ('timestamp', np.int64),  # Nanoseconds since epoch, UTC
+    ('strategy', np.uint8),   # Index into TradeStore.strategies
+    ('profit', np.float64),
+    ('lot', np.float64),
+    ('confidence', np.float64),
+]
+CSV_CHUNK = 100000
+
+class TradeStore:
+    # Append-only column files, one per field, read back through numpy.memmap.
+    # meta.json holds the committed row count and the active generation directory;
+    # a row is visible only after every column is fsynced and meta.json is replaced.
+    def __init__(self, path=STORE_DIR, strategies=()):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.meta = self._load_meta(list(strategies))
+        self._recover()
+
+    @property
+    def strategies(self):
+        return self.meta['strategies']
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def _meta_path(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def _gen_dir(self, generation=None):
+        return os.path.join(self.path, f"gen-{self.meta['generation'] if generation is None else generation}")
+
+    def _column_path(self, name, generation=None):
+        return os.path.join(self._gen_dir(generation), f'{name}.bin')
+
+    def _load_meta(self, strategies):
+        meta = {'generation': 0, 'rows': 0, 'last_id': 0, 'strategies': strategies}
+        if os.path.exists(self._meta_path()):
+            with open(self._meta_path()) as f:
+                meta.update(json.load(f))
+            for s in strategies:
+                if s not in meta['strategies']:
+                    meta['strategies'].append(s)
+        return meta
+
+    def _write_meta(self, meta):
+        tmp_path = self._meta_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._meta_path())
+        self.meta = meta
+
+    def _recover(self):
+        # Drop bytes written after the last committed row (crash between column writes and meta update)
+        os.makedirs(self._gen_dir(), exist_ok=True)
+        for name, dtype in COLUMNS:
+            path = self._column_path(name)
+            committed = self.meta['rows'] * np.dtype(dtype).itemsize
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+            if os.path.getsize(path) > committed:
+                with open(path, 'r+b') as f:
+                    f.truncate(committed)
+        for entry in os.listdir(self.path):
+            if entry.startswith('gen-') and entry != os.path.basename(self._gen_dir()):
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+        if not os.path.exists(self._meta_path()):
+            self._write_meta(dict(self.meta))
+
+    def strategy_code(self, name):
+        # Interns unknown strategy names; the caller must commit meta afterwards
+        try:
+            return self.meta['strategies'].index(name)
+        except ValueError:
+            if len(self.meta['strategies']) >= 255:
+                raise ValueError('Too many strategies for a uint8 code')
+            self.meta['strategies'].append(name)
+            return len(self.meta['strategies']) - 1
+
+    def append(self, columns):
+        n = len(columns['id'])
+        if n == 0:
+            return 0
+        with self._lock:
+            for name, dtype in COLUMNS:
+                with open(self._column_path(name), 'ab') as f:
+                    f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            meta = dict(self.meta)
+            meta['rows'] += n
+            meta['last_id'] = max(meta['last_id'], int(np.max(columns['id'])))
+            self._write_meta(meta)
+        return n
+
+    def column(self, name):
+        dtype = dict(COLUMNS)[name]
+        if self.meta['rows'] == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(self.meta['rows'],))
+
+    def columns(self):
+        return {name: self.column(name) for name, _ in COLUMNS}
+
+    def ingest_trades(self, trades):
+        # PostgREST-style dicts, appended in id order. Ids already stored are skipped: anything above
+        # the high-water id is new, ids below it (out-of-order CSV rows) are looked up in the id column.
+        # A repeated id within the batch keeps its last copy, as compact() does.
+        ids = np.fromiter((t.get('id', 0) for t in trades), dtype=np.int64, count=len(trades))
+        order = np.argsort(ids, kind='stable')
+        _, last = np.unique(ids[order][::-1], return_index=True)
+        order = order[len(order) - 1 - last]
+        order = order[ids[order] > 0]
+        old = ids[order] <= self.meta['last_id']
+        if old.any():
+            old[old] = np.isin(ids[order][old], self.column('id'))
+            order = order[~old]
+        if len(order) == 0:
+            return 0
+        trades = [trades[i] for i in order]
+        n = len(trades)
+        columns = {
+            'id': ids[order],
+            'timestamp': np.fromiter((to_ns(t.get('timestamp')) for t in trades), dtype=np.int64, count=n),
+            'strategy': np.fromiter((self.strategy_code(t.get('strategy') or 'unknown') for t in trades), dtype=np.uint8, count=n),
+            'profit': np.fromiter((t.get('profit') or 0 for t in trades), dtype=np.float64, count=n),
+            'lot': np.fromiter((t.get('lot') or 0 for t in trades), dtype=np.float64, count=n),
+            'confidence': np.fromiter((t.get('confidence') or 0 for t in trades), dtype=np.float64, count=n),
+        }
+        return self.append(columns)
+
+    def ingest_postgrest(self, url=POSTGREST_TRADES_URL, session=None, page_size=1000):
+        session = session or requests.Session()
+        total = 0
+        for page in fetch_trade_pages(session, url, self.meta['last_id'], page_size):
+            total += self.ingest_trades(page)
+        return total
+
+    def ingest_csv(self, path):
+        # CSV with a header row using the trades table column names
+        total = 0
+        with open(path, newline='') as f:
+            chunk = []
+            for row in csv.DictReader(f):
+                row['id'] = int(row['id'])
+                for key in ('profit', 'lot', 'confidence'):
+                    row[key] = float(row[key]) if row.get(key) else 0.0
+                chunk.append(row)
+                if len(chunk) >= CSV_CHUNK:
+                    total += self.ingest_trades(chunk)
+                    chunk = []
+            total += self.ingest_trades(chunk)
+        return total
+
+    def compact(self):
+        # Rewrite history sorted by (timestamp, id) without duplicate ids into a new generation
+        with self._lock:
+            columns = self.columns()
+            order = np.lexsort((columns['id'], columns['timestamp']))
+            ids = columns['id'][order]
+            # Keep the last copy of each id in time order
+            _, last = np.unique(ids[::-1], return_index=True)
+            keep = np.sort(len(ids) - 1 - last)
+            order = order[keep]
+            generation = self.meta['generation'] + 1
+            os.makedirs(self._gen_dir(generation), exist_ok=True)
+            for name, dtype in COLUMNS:
+                with open(self._column_path(name, generation), 'wb') as f:
+                    f.write(np.ascontiguousarray(columns[name][order], dtype=dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            old_dir = self._gen_dir()
+            meta = dict(self.meta)
+            meta['generation'] = generation
+            meta['rows'] = len(order)
+            self._write_meta(meta)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        return len(order)
@@ -0,0 +1,14 @@
+import os
+import shutil
+import tempfile
+
+# server_api opens the shared state when it is imported; the tests get their own file instead
+# of the production one in /dev/shm, and their own journals instead of ai/state
+_shared_dir = tempfile.mkdtemp(prefix='smart_ea_tests_')
+os.environ['SMART_EA_SHARED_STATE'] = os.path.join(_shared_dir, 'smart_ea_state')
+os.environ['SMART_EA_STATE_DIR'] = os.path.join(_shared_dir, 'state')
+# No knowledge graph sync/writer threads behind the module graph (there is no graph to reach)
+os.environ['SMART_EA_GRAPH_BACKGROUND'] = '0'
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_shared_dir, ignore_errors=True)
@@ -0,0 +1,69 @@
+import pytest
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import backtest
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(3)
+    n = 5 * 1440
+    start = np.datetime64('2024-01-01T00:00', 'ns').astype(np.int64)
+    close = 2000 + np.cumsum(rng.normal(0, 0.5, n))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    return {
+        'time': start + np.arange(n, dtype=np.int64) * backtest.MINUTE_NS,
+        'open': open_,
+        'high': np.maximum(open_, close) + np.abs(rng.normal(0, 0.2, n)),
+        'low': np.minimum(open_, close) - np.abs(rng.normal(0, 0.2, n)),
+        'close': close,
+    }
+
+def test_ema_matches_recursive_definition():
+    x = np.random.default_rng(0).normal(0, 1, 1000)
+    expected = np.empty_like(x)
+    expected[0] = x[0]
+    for i in range(1, len(x)):
+        expected[i] = 0.2 * x[i] + 0.8 * expected[i - 1]
+    assert np.allclose(backtest.ema(x, 0.2), expected)
+
+def test_resample_to_m5(bars):
+    m5, index = backtest.resample(bars, 5)
+    assert len(m5['close']) == len(bars['close']) // 5
+    assert m5['high'][3] == bars['high'][15:20].max()
+    assert index[17] == 3
+
+def test_replay_produces_fills_and_metrics(bars):
+    result = backtest.Backtester(bars, sentiment='positive', horizon=120).run()
+    fills = result['fills']
+    assert len(fills['profit']) > 0
+    assert set(result['win_rates']) == set(result['report']) - {'total'}
+    assert len(result['equity']) == len(fills['profit'])
+    assert np.all(fills['exit_time'] >= fills['entry_time'])
+    hours = (fills['entry_time'] // backtest.HOUR_NS) % 24
+    assert np.all((hours >= 13) & (hours < 17))
+    assert result['balance'] == pytest.approx(10000 + fills['profit'].sum())
+
+def test_position_caps_of_the_ea(bars):
+    caps = {s: 1 for s in backtest.POSITION_CAPS}
+    fills = backtest.Backtester(bars, sentiment='positive', horizon=120, position_caps=caps).run()['fills']
+    assert len(fills['profit']) > 1
+    order = np.argsort(fills['entry_time'], kind='stable')
+    # A single slot: every entry waits for the previous position to close
+    assert np.all(fills['entry_time'][order][1:] >= fills['exit_time'][order][:-1])
+
+def test_paper_trades_lift_the_lock_in(bars):
+    def locked_out(paper_trades):
+        selector = backtest.StrategySelector()
+        selector.win_rates = {s: 0.3 for s in selector.strategies}  # Can't reach MIN_CONFIDENCE
+        return backtest.Backtester(bars, selector=selector, horizon=120, paper_trades=paper_trades).run()
+    assert len(locked_out(False)['fills']['profit']) == 0
+    result = locked_out(True)
+    assert result['paper_trades'] > 0 and len(result['fills']['profit']) > 0
+
+def test_saved_bars_load_memory_mapped(bars, tmp_path):
+    backtest.save_bars(bars, str(tmp_path / 'bars'))
+    loaded = backtest.load_bars(str(tmp_path / 'bars'))
+    assert isinstance(loaded['close'], np.memmap)
+    assert np.array_equal(loaded['close'], bars['close'])
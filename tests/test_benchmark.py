@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import benchmark, model_loop, synthetic
+from ai.benchmark import compare, run_suite
+
+def test_trade_history_is_deterministic():
+    a = synthetic.trade_history(1000, seed=5)
+    b = synthetic.trade_history(1000, seed=5)
+    assert all(np.array_equal(a[k], b[k]) for k in a)
+    assert np.all(np.diff(a['timestamp']) > 0)
+    rows = synthetic.trade_rows(a, start=10, stop=12)
+    assert [r['id'] for r in rows] == [11, 12] and rows[0]['strategy'] in synthetic.STRATEGIES
+
+def test_bar_series_is_valid_ohlc():
+    bars = synthetic.bar_series(2000, seed=2)
+    assert np.all(bars['high'] >= np.maximum(bars['open'], bars['close']))
+    assert np.all(bars['low'] <= np.minimum(bars['open'], bars['close']))
+    assert len(synthetic.bar_rows(bars, 0, 5)) == 5
+
+def test_news_payloads_repeat_when_limited():
+    titles = {p['data'][0]['title'] + p['data'][0]['snippet'] for p in synthetic.news_payloads(100, distinct=4)}
+    assert len(titles) <= 4
+
+def production_state(*args, **kwargs):
+    raise AssertionError('benchmark opened the default store or analytics under ai/state')
+
+def test_suite_runs_against_local_stubs(monkeypatch):
+    monkeypatch.setattr(model_loop, 'TradeStore', production_state)
+    monkeypatch.setattr(model_loop, 'TradeAnalytics', production_state)
+    results = run_suite(['select_strategy', 'evaluate_performance', 'log_to_db', 'news_sentiment', 'decision_routes',
+                         'binary_transport', 'state_journal', 'score_batch'],
+                        sizes=[200])
+    assert set(results['results']) == {'select_strategy[200]', 'evaluate_performance[200]', 'log_to_db[200]',
+                                       'news_sentiment[200]', 'decision_routes[200]', 'binary_transport[200]',
+                                       'state_journal[200]', 'score_batch[200]'}
+    assert results['results']['evaluate_performance[200]']['trades'] == 1200
+    assert results['results']['news_sentiment[200]']['hit_rate'] > 0.5
+    assert results['results']['binary_transport[200]']['http_p50_ms'] > 0
+    assert all(r['ops_per_sec'] > 0 for r in results['results'].values())
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = {'results': {'a[1]': {'ops_per_sec': 100.0}, 'b[1]': {'ops_per_sec': 100.0}, 'c[1]': {'ops_per_sec': 1.0}}}
+    current = {'results': {'a[1]': {'ops_per_sec': 85.0}, 'b[1]': {'ops_per_sec': 70.0},
+                           'd[1]': {'ops_per_sec': 1.0, 'failed': 'over the 1.500 s budget'}}}
+    rows, regressions = compare(baseline, current, threshold=0.2)
+    assert regressions == ['b[1]', 'd[1]'] and len(rows) == 2
+    path = str(tmp_path / 'results.json')
+    benchmark.save(current, path)
+    assert benchmark.load(path) == current
+
+def test_report_budget_miss_is_a_failed_result(monkeypatch):
+    monkeypatch.setattr(benchmark, 'REPORT_BUDGET_SECONDS', 0.0)
+    monkeypatch.setattr(benchmark, 'REPORT_BUDGET_TRADES', 1000)
+    results = run_suite(['strategy_report', 'select_strategy'], sizes=[1000])['results']
+    assert 'failed' in results['strategy_report[1000]'] and results['select_strategy[1000]']['ops_per_sec'] > 0
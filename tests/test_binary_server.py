@@ -0,0 +1,135 @@
+import pytest
+import sys
+import os
+import socket
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import binary_server
+from ai.binary_server import BinaryClient, ProtocolError, pack, unpack, frames, serve
+from ai.binary_server import STRATEGY, LOT, UPDATE, LOG, EQUITY, REPLY, ERROR, HEADER
+
+class FakeBackend:
+    def __init__(self):
+        self.logs = []
+        self.updates = []
+        self.symbols = []
+
+    def strategy(self, symbol=None):
+        self.symbols.append(symbol)
+        return 'breakout', 0.75, 0.5
+
+    def lot(self, balance, symbol=None):
+        self.symbols.append(symbol)
+        if balance < 0:
+            raise ValueError('negative balance')
+        return balance / 100000, 0.5
+
+    def update(self, strategy, win, profit=None, account='default', balance=None):
+        self.updates.append((strategy, win, profit, account, balance))
+        return 0.6
+
+    def equity(self, account, equity, balance=None):
+        drawdown = 1 - equity / 10000
+        return {'halted': drawdown >= 0.05, 'reason': None, 'account': {'drawdown': drawdown, 'daily_loss': 0.0}}
+
+    def log(self, level, message, data=None):
+        self.logs.append((level, message, data))
+
+@pytest.fixture
+def server():
+    server = serve(port=0, backend=FakeBackend())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client(server):
+    with BinaryClient(port=server.server_address[1]) as client:
+        yield client
+
+def test_fixed_layouts_round_trip():
+    frame = pack(STRATEGY | REPLY, 7, strategy='trend_following', confidence=0.8, snapshot_age=1.5)
+    assert len(frame) == HEADER.size + 24
+    found, used = frames(bytearray(frame + frame[:5]))
+    assert used == len(frame) and found[0][:2] == (STRATEGY | REPLY, 7)
+    assert unpack(STRATEGY | REPLY, found[0][2]) == {'strategy': 'trend_following', 'confidence': 0.8, 'snapshot_age': 1.5}
+    log = pack(LOG, 1, level='TRADE_CLOSE', message='scalping', lot=12.5, confidence=1.0)
+    assert len(log) == HEADER.size + 88
+    assert unpack(LOG, log[HEADER.size:])['level'] == 'TRADE_CLOSE'
+    assert unpack(STRATEGY | REPLY, pack(STRATEGY | REPLY, 1, strategy='none', confidence=0.0,
+                                         snapshot_age=0.0)[HEADER.size:])['strategy'] == 'none'
+    with pytest.raises(ProtocolError):
+        unpack(LOT, b'\0' * 4)
+
+def test_pipelined_replies_are_correlated_by_id(server, client):
+    ids = [client.send(STRATEGY), client.send(LOT, balance=20000),
+           client.send(UPDATE, strategy='news', win=True, account=0, profit=None, balance=float('nan')),
+           client.send(LOG, level='TRADE_OPEN', message='news', lot=0.2, confidence=0.9)]
+    client.flush()
+    # Read out of order: earlier replies are kept until asked for
+    assert client.receive(ids[2]) == {'win_rate': 0.6}
+    assert client.receive(ids[0]) == {'strategy': 'breakout', 'confidence': 0.75, 'snapshot_age': 0.5}
+    assert client.receive(ids[1])['lot'] == pytest.approx(0.2)
+    assert client.receive(ids[3]) == {}
+    backend = server.dispatcher.backend
+    assert backend.updates == [('news', True, None, 'default', None)]
+    assert backend.logs == [('TRADE_OPEN', 'news', {'lot': 0.2, 'confidence': 0.9})]
+
+def test_symbol_reaches_the_backend(server, client):
+    client.strategy('XAUUSD')
+    client.lot(10000, 'EURUSD.pro')
+    client.strategy()
+    assert server.dispatcher.backend.symbols == ['XAUUSD', 'EURUSD.pro', None]
+
+def test_errors_are_replies_and_keep_the_connection(client):
+    replies = client.pipeline([(UPDATE, {'strategy': 'unknown', 'win': False, 'account': 0, 'profit': None,
+                                          'balance': 0.0}), (LOT, {'balance': -1}),
+                               (STRATEGY, {})])
+    assert isinstance(replies[0], ProtocolError) and replies[0].code == binary_server.BAD_PAYLOAD
+    assert isinstance(replies[1], ProtocolError) and replies[1].code == binary_server.HANDLER_FAILED
+    assert 'negative balance' in str(replies[1])
+    assert replies[2]['strategy'] == 'breakout'
+    client.sock.sendall(HEADER.pack(binary_server.MAGIC, binary_server.VERSION, 0x42, 99, 0))
+    with pytest.raises(ProtocolError):
+        client.receive(99)
+    assert client.lot(10000)['lot'] == pytest.approx(0.1)
+
+def test_bad_header_closes_the_connection(server):
+    with socket.create_connection(('127.0.0.1', server.server_address[1]), timeout=5) as sock:
+        sock.sendall(b'GET /strategy HTTP/1.1\r\n\r\n')
+        reply = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    found, used = frames(bytearray(reply))
+    assert found[0][0] == ERROR and used == len(reply)
+    assert unpack(ERROR, found[0][2])['code'] == binary_server.BAD_MESSAGE
+
+def test_matches_flask_routes():
+    from ai import server_api
+    from ai.decision_snapshot import DecisionSnapshot
+    server_api.refresher.snapshot = DecisionSnapshot(regime='trending', sentiment='positive', graph_hint='breakout',
+                                                     volatility=0.3, confidence={}, input_times={},
+                                                     created_at=time.time())
+    server = serve(port=0, backend=server_api.decisions)
+    try:
+        with BinaryClient(port=server.server_address[1]) as client:
+            strategy, lot = client.pipeline([(STRATEGY, {'symbol': 'XAUUSD'}),
+                                             (LOT, {'balance': 10000, 'symbol': 'XAUUSD'})])
+        flask = server_api.app.test_client()
+        expected = flask.get('/strategy?symbol=XAUUSD').get_json()
+        assert (strategy['strategy'], strategy['confidence']) == (expected['strategy'], expected['confidence'])
+        expected = flask.post('/risk/lot', json={'balance': 10000, 'symbol': 'XAUUSD'}).get_json()
+        assert lot['lot'] == pytest.approx(expected['lot'])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_trade_outcome_and_equity_push(server, client):
+    assert client.update('scalping', False, profit=-25.0, account=5551234, balance=9975.0) == {'win_rate': 0.6}
+    assert server.dispatcher.backend.updates == [('scalping', False, -25.0, '5551234', 9975.0)]
+    reply = client.equity(5551234, 9400.0, 10000.0)
+    assert reply['halted'] is True and reply['drawdown'] == pytest.approx(0.06)
+    assert client.equity(5551234, 9990.0)['halted'] is False
@@ -0,0 +1,71 @@
+import pytest
+import sys
+import os
+import json
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.dashboard_state import DashboardState, EventRing, log_entry
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+
+@pytest.fixture
+def view():
+    return DashboardState(StrategySelector(), RiskEngine(), EventRing(size=3), poll_interval=0.01, keepalive=0.05)
+
+def parse(message):
+    fields = dict(line.split(': ', 1) for line in message.strip().splitlines())
+    return fields['event'], json.loads(fields['data'])
+
+def test_ring_since_and_overflow():
+    ring = EventRing(size=3)
+    for i in range(5):
+        ring.append(log_entry('INFO', f'm{i}'))
+    assert [e['message'] for e in ring.since(3)] == ['m3', 'm4']
+    assert ring.since(5) == []
+    assert ring.since(1) is None  # m1 was overwritten
+
+def test_state_is_cached_until_something_changes(view):
+    version, state, body = view.current()
+    assert view.current()[2] is body
+    assert state['risk']['risk_level'] == 'normal'
+    view.selector.update_win_rate('breakout', True)
+    new_version, new_state, _ = view.current()
+    assert new_version == version + 1
+    assert new_state['strategies']['breakout']['win_rate'] > state['strategies']['breakout']['win_rate']
+
+def test_stream_sends_snapshot_then_deltas(view):
+    stream = view.stream()
+    event, snapshot = parse(next(stream))
+    assert event == 'snapshot' and set(snapshot['strategies']) == set(view.selector.strategies)
+    assert next(stream) == ': keepalive\n\n'
+    view.selector.update_win_rate('news', False)
+    view.risk.update_drawdown(0.045)
+    event, delta = parse(next(stream))
+    assert event == 'state'
+    assert list(delta['strategies']) == ['news'] and list(delta['strategies']['news']) == ['win_rate']
+    assert delta['risk'] == {'current_drawdown': 0.045, 'risk_level': 'paused'}
+    view.events.append(log_entry('TRADE_CLOSE', 'scalping', {'profit': 5}))
+    event, entry = parse(next(stream))
+    assert event == 'trade' and entry['data'] == {'profit': 5}
+
+def test_stream_resyncs_when_behind_the_ring(view):
+    stream = view.stream()
+    next(stream)
+    for i in range(5):
+        view.events.append(log_entry('INFO', f'm{i}'))
+    event, snapshot = parse(next(stream))
+    assert event == 'snapshot' and [e['message'] for e in snapshot['events']] == ['m2', 'm3', 'm4']
+
+def test_state_route_etag(monkeypatch, tmp_path):
+    from ai.server_api import app
+    from ai import logger
+    monkeypatch.setattr(logger, '_shipper', logger.LogShipper(journal_path=str(tmp_path / 'journal.txt')))  # Not started
+    client = app.test_client()
+    page = client.get('/')
+    assert page.status_code == 200 and b'<th>Breaker</th>' in page.data  # Upstream table from /sentiment/metrics
+    response = client.get('/dashboard/state')
+    assert response.status_code == 200 and 'strategies' in response.json
+    etag = response.headers['ETag']
+    assert client.get('/dashboard/state', headers={'If-None-Match': etag}).status_code == 304
+    client.post('/log', json={'level': 'INFO', 'message': 'hello'})
+    response = client.get('/dashboard/state', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.json['events'][-1]['message'] == 'hello'
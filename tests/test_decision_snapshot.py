@@ -0,0 +1,91 @@
+import pytest
+import sys
+import os
+import unittest.mock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+from ai.decision_snapshot import SnapshotRefresher, snapshot_age, DEFAULTS
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def refresher():
+    selector = StrategySelector()
+    risk = RiskEngine()
+    clock = FakeClock()
+    selector.get_market_regime = unittest.mock.Mock(return_value='trending')
+    selector.get_news_sentiment = unittest.mock.Mock(return_value='positive')
+    selector.get_graph_data = unittest.mock.Mock(return_value='breakout')
+    risk.update_volatility = unittest.mock.Mock(side_effect=lambda: setattr(risk, 'volatility', 0.2))
+    return SnapshotRefresher(selector, risk, clock=clock)
+
+def test_snapshot_contains_inputs(refresher):
+    snapshot = refresher.current()
+    assert snapshot.regime == 'trending'
+    assert snapshot.sentiment == 'positive'
+    assert snapshot.graph_hint == 'breakout'
+    assert snapshot.volatility == 0.2
+    assert set(snapshot.confidence) == set(refresher.selector.strategies)
+    assert snapshot_age(snapshot, now=refresher.clock() + 2) == 2
+
+def test_inputs_refresh_on_their_own_interval(refresher):
+    refresher.current()
+    refresher.clock.now += 10  # Regime is due, sentiment is not
+    refresher.refresh()
+    assert refresher.selector.get_market_regime.call_count == 2
+    assert refresher.selector.get_news_sentiment.call_count == 1
+
+def test_stale_input_falls_back_to_default(refresher):
+    refresher.current()
+    refresher.selector.get_graph_data.side_effect = Exception('MCP down')
+    refresher.clock.now += refresher.max_age['graph_hint'] + 1
+    snapshot = refresher.refresh()
+    assert snapshot.graph_hint == DEFAULTS['graph_hint']
+    assert snapshot.regime == 'trending'
+
+def test_select_strategy_from_snapshot_does_not_fetch(refresher):
+    snapshot = refresher.current()
+    selector = refresher.selector
+    selector.select_strategy(snapshot.regime, snapshot.sentiment, snapshot.graph_hint)
+    assert selector.get_market_regime.call_count == 1
+    assert refresher.risk.calculate_lot(10000, volatility=snapshot.volatility) > 0
+    assert refresher.risk.update_volatility.call_count == 1
+
+def test_local_updates_do_not_wait_for_a_fetch(refresher):
+    import threading
+    refresher.current()
+    started, release = threading.Event(), threading.Event()
+    def slow_sentiment():
+        started.set()
+        release.wait(5)
+        return 'negative'
+    refresher.selector.get_news_sentiment = slow_sentiment
+    refresher.clock.now += refresher.intervals['sentiment']
+    thread = threading.Thread(target=refresher.refresh)
+    thread.start()
+    assert started.wait(5)
+    snapshot = refresher.update_inputs(volatility=0.7)  # Would block here if refresh held the lock
+    assert not release.is_set() and thread.is_alive()
+    release.set()
+    thread.join()
+    assert snapshot.volatility == 0.7 and refresher.snapshot.sentiment == 'negative'
+
+def test_snapshot_per_symbol(refresher):
+    class FakeMarket:
+        def get(self, symbol):
+            return FakeState() if symbol == 'EURUSD' else None
+    class FakeState:
+        regime, volatility, bars = 'ranging', 0.6, 300
+    refresher.selector.market = FakeMarket()
+    refresher.selector.get_graph_data.return_value = 'reversal'
+    snapshot = refresher.current()
+    eurusd = refresher.for_symbol('EURUSD')
+    assert (eurusd.regime, eurusd.graph_hint, eurusd.volatility) == ('ranging', 'reversal', 0.6)
+    assert eurusd.sentiment == snapshot.sentiment and refresher.for_symbol('EURUSD') is eurusd  # Cached
+    assert refresher.for_symbol('XAUUSD') is snapshot and refresher.for_symbol(None) is snapshot
@@ -0,0 +1,136 @@
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.durable_state import DurableState, recover, read_log, WAL_FILE, SNAPSHOT_FILE
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+
+class FakeLoop:
+    last_retrain = 0.0
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def journal(tmp_path, clock, name='api', loop=None, **kwargs):
+    durable = DurableState(StrategySelector(), RiskEngine(), name, loop=loop, directory=str(tmp_path), clock=clock,
+                           **kwargs)
+    durable.open(restore=False)
+    return durable
+
+def test_records_only_changed_fields_and_replays(tmp_path, clock):
+    durable = journal(tmp_path, clock, sync_interval=0)
+    assert durable.record('open') == len(durable.fields())  # An empty journal starts with every field
+    assert durable.record('noop') == 0
+    durable.selector.update_win_rate('breakout', True)
+    durable.risk.lot = 0.03
+    assert durable.record('update_win_rate', strategy='breakout', win=True) == 2
+    records = list(read_log(os.path.join(durable.path, WAL_FILE)))
+    assert records[1]['event'] == 'update_win_rate' and records[1]['strategy'] == 'breakout'
+    assert set(records[1]['set']) == {'win_rates.breakout', 'lot'}
+    assert durable.stats()['syncs'] == 2  # sync_interval=0 fsyncs every record
+    durable.close()
+    restored = DurableState(StrategySelector(), RiskEngine(), 'api', directory=str(tmp_path))
+    assert restored.open() > 0
+    assert restored.selector.win_rates['breakout'] == durable.selector.win_rates['breakout']
+    assert restored.risk.lot == 0.03
+
+def test_torn_tail_is_ignored(tmp_path, clock):
+    durable = journal(tmp_path, clock)
+    durable.risk.lot = 0.02
+    durable.record('adjust')
+    durable.risk.lot = 0.04
+    durable.record('adjust')
+    durable.close()
+    path = os.path.join(str(tmp_path), 'api', WAL_FILE)
+    with open(path, 'rb+') as f:
+        f.truncate(os.path.getsize(path) - 5)
+    assert recover(str(tmp_path))['lot'] == 0.02
+
+def test_batched_sync_and_checkpoint(tmp_path, clock):
+    durable = journal(tmp_path, clock, sync_interval=0.5, checkpoint_every=10)
+    for i in range(25):
+        durable.risk.current_drawdown = i / 100
+        durable.record('drawdown')
+    assert durable.stats()['syncs'] == 0  # Nothing fsynced on the request path
+    durable.flush()
+    assert durable.stats() == {'records': 25, 'syncs': 1, 'checkpoints': 1}
+    assert os.path.getsize(os.path.join(durable.path, WAL_FILE)) == 0
+    durable.risk.current_drawdown = 0.5
+    durable.record('drawdown')
+    durable.close()
+    assert os.path.exists(os.path.join(durable.path, SNAPSHOT_FILE))
+    assert recover(str(tmp_path))['current_drawdown'] == 0.5
+
+def test_interrupted_checkpoint_keeps_rotated_log(tmp_path, clock):
+    durable = journal(tmp_path, clock)
+    durable.risk.lot = 0.05
+    durable.record('adjust')
+    durable.wal.rotate(os.path.join(durable.path, WAL_FILE + '.old'))  # Crash before the snapshot was written
+    durable.close()
+    assert recover(str(tmp_path))['lot'] == 0.05
+    reopened = journal(tmp_path, clock)
+    assert not os.path.exists(os.path.join(reopened.path, WAL_FILE + '.old'))
+    assert recover(str(tmp_path))['lot'] == 0.05
+
+def test_newest_value_wins_across_journals(tmp_path, clock):
+    loop = FakeLoop()
+    api = journal(tmp_path, clock, 'api')
+    scheduler = journal(tmp_path, clock, 'scheduler', loop=loop)
+    api.risk.lot = 0.02
+    api.record('adjust')
+    scheduler.risk.lot = 0.04
+    loop.last_retrain = 123.0
+    scheduler.record('retrain_model')
+    api.selector.active['news'] = False
+    api.record('update_win_rate')
+    api.close()
+    scheduler.close()
+    state = recover(str(tmp_path))
+    assert state['lot'] == 0.04 and state['active.news'] is False and state['last_retrain'] == 123.0
+    fresh_loop = FakeLoop()
+    fresh = DurableState(StrategySelector(), RiskEngine(), 'scheduler', loop=fresh_loop, directory=str(tmp_path))
+    fresh.open()
+    assert fresh.risk.lot == 0.04 and fresh.selector.active['news'] is False and fresh_loop.last_retrain == 123.0
+
+def test_unopened_journal_touches_nothing(tmp_path):
+    durable = DurableState(StrategySelector(), RiskEngine(), 'api', directory=str(tmp_path / 'state'))
+    assert durable.record('update_win_rate') == 0
+    durable.close()
+    assert not os.path.exists(str(tmp_path / 'state'))
+
+def test_asgi_workers_journal_updates(tmp_path):
+    import asyncio
+    import json
+    from ai.asgi_server import App
+    state_dir = str(tmp_path / 'state')
+    async def scenario():
+        apps = [App(str(tmp_path / 'shared'), state_dir) for _ in range(2)]
+        for app in apps:
+            async def fetch(name):
+                return {'regime': 'trending', 'sentiment': 'positive', 'graph_hint': 'breakout', 'volatility': 0.1}[name]
+            app.refresher.fetch_async = fetch
+            await app.startup()
+        assert [app.durable.name for app in apps] == ['asgi-0', 'asgi-1']
+        body = json.dumps({'strategy': 'news', 'win': False}).encode()
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+        async def send(message):
+            pass
+        await apps[1]({'type': 'http', 'method': 'POST', 'path': '/update', 'headers': []}, receive, send)
+        for app in apps:
+            await app.shutdown()
+        return apps[1].selector.win_rates['news']
+    win_rate = asyncio.run(scenario())
+    records = list(read_log(os.path.join(state_dir, 'asgi-1', WAL_FILE)))
+    assert records[-1]['event'] == 'update_win_rate' and records[-1]['strategy'] == 'news'
+    assert records[-1]['win'] is False and recover(state_dir)['win_rates.news'] == win_rate
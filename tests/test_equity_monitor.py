@@ -0,0 +1,145 @@
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.equity_monitor import EquityMonitor, KillSwitch, AlertQueue, DAY
+from ai.risk_engine import RiskEngine
+from ai.shared_state import SharedState
+
+class FakeClock:
+    def __init__(self):
+        self.now = 10 * DAY + 3600
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def alerts():
+    sent = []
+    queue = AlertQueue(sinks=[lambda level, message, data, created_at: sent.append((level, message))])
+    queue.sent_alerts = sent
+    yield queue
+    queue.close()
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def monitor(alerts, clock):
+    return EquityMonitor(RiskEngine(max_drawdown=0.05), daily_loss_limit=0.03, alerts=alerts, clock=clock)
+
+def delivered(alerts):
+    alerts.close()  # Drains the queue
+    return alerts.sent_alerts
+
+def test_peak_drawdown_and_kill_switch(monitor, alerts):
+    monitor.record_trade('A', 200.0, balance=10200.0)
+    state = monitor.update_equity('A', 9996.0)
+    assert state.peak == 10200.0 and state.drawdown == pytest.approx(0.02)
+    assert monitor.risk.current_drawdown == pytest.approx(0.02) and not monitor.halted
+    monitor.update_equity('A', 9750.0)  # 4.4%: above the 80% warning level
+    assert not monitor.halted and monitor.risk.calculate_lot(10000, volatility=0.1) == 0
+    monitor.update_equity('A', 9650.0)  # 5.4%
+    assert monitor.halted and monitor.reason.startswith('A: drawdown')
+    monitor.update_equity('A', 10300.0)  # A drawdown halt stays on until reset
+    assert monitor.halted
+    levels = [level for level, _ in delivered(alerts)]
+    assert levels == ['WARNING', 'CRITICAL']
+
+def test_daily_loss_resets_with_the_day(monitor, clock):
+    monitor.update_equity('A', 20000.0, balance=20000.0)
+    monitor.update_equity('A', 19600.0)
+    assert not monitor.halted
+    monitor.record_trade('A', -250.0)  # Realized loss on top of the floating one: 3.25% today
+    assert monitor.halted and 'daily loss' in monitor.reason
+    clock.now += DAY
+    state = monitor.update_equity('A', 19350.0)
+    assert not monitor.halted and state.day_start == 19350.0 and state.daily_loss == 0.0
+
+def test_shared_daily_loss_halt_lapses_with_the_day(tmp_path, alerts, clock):
+    strategies = ['scalping', 'breakout']
+    workers = [KillSwitch(EquityMonitor(RiskEngine(max_drawdown=0.05), alerts=alerts, clock=clock),
+                          SharedState(strategies, str(tmp_path / 'state'))) for _ in range(2)]
+    first, second = workers
+    first.update_equity('A', 20000.0, balance=20000.0)
+    first.update_equity('A', 19300.0)
+    assert first.monitor.halted and second.halted
+    clock.now += DAY
+    first.update_equity('A', 19300.0)
+    assert not first.monitor.halted and not first.halted and not second.halted
+    # A drawdown halt does not lapse
+    second.update_equity('B', 10000.0, balance=10000.0)
+    second.update_equity('B', 9000.0)
+    clock.now += DAY
+    second.update_equity('B', 9000.0)
+    assert first.halted
+
+def test_worst_account_drives_risk_drawdown(monitor):
+    monitor.update_equity('A', 10000.0, balance=10000.0)
+    monitor.update_equity('B', 5000.0, balance=5000.0)
+    monitor.update_equity('A', 9800.0)
+    monitor.update_equity('B', 4900.0)
+    monitor.update_equity('B', 4880.0)
+    assert monitor.worst == 'B' and monitor.drawdown == pytest.approx(0.024)
+    monitor.update_equity('B', 5000.0)
+    assert monitor.worst == 'A' and monitor.risk.current_drawdown == pytest.approx(0.02)
+
+def test_reset_rebases_the_halted_account(monitor, alerts):
+    monitor.update_equity('A', 10000.0, balance=10000.0)
+    monitor.update_equity('A', 9000.0)
+    assert monitor.halted
+    monitor.reset('A')
+    assert not monitor.halted and monitor.accounts['A'].peak == 9000.0 and monitor.drawdown == 0.0
+    monitor.update_equity('A', 8990.0)
+    assert not monitor.halted
+    assert delivered(alerts)[-1][0] == 'INFO'
+
+def test_decision_routes_respect_the_kill_switch(monkeypatch, tmp_path, alerts, clock):
+    from ai import server_api
+    monitor = EquityMonitor(server_api.risk, alerts=alerts, clock=clock)
+    monkeypatch.setattr(server_api, 'equity', monitor)
+    monkeypatch.setattr(server_api, 'shared', SharedState(server_api.selector.strategies, str(tmp_path / 'state')))
+    monkeypatch.setattr(server_api, 'kill_switch', KillSwitch(monitor, server_api.shared))
+    monkeypatch.setattr(server_api.fleet, 'kill_switch', server_api.kill_switch)
+    monkeypatch.setattr(server_api, 'shared_version', -1)
+    server_api.shared.publish(server_api.selector, server_api.risk)
+    client = server_api.app.test_client()
+    reply = client.post('/equity', json={'account': '42', 'equity': 10000.0, 'balance': 10000.0}).get_json()
+    assert reply['halted'] is False
+    reply = client.post('/equity', json={'account': '42', 'equity': 9000.0}).get_json()
+    assert reply['halted'] is True and reply['account']['drawdown'] == pytest.approx(0.1)
+    assert server_api.shared.read_risk()['current_drawdown'] == pytest.approx(0.1)  # Published for the scheduler
+    assert client.get('/strategy').get_json()['strategy'] == 'none'
+    assert client.post('/risk/lot', json={'balance': 10000}).get_json()['lot'] == 0
+    assert client.post('/batch/strategy', json=[{'symbol': 'EURUSD', 'account': '42'}]).get_json()['halted']
+    assert client.get('/equity').get_json()['accounts']['42']['halted'].startswith('drawdown')
+    assert client.post('/equity/reset', json={}).get_json()['halted'] is False
+    # Batch outcomes feed the monitor too
+    reply = client.post('/batch/update', json=[{'symbol': 'EURUSD', 'account': '7', 'strategy': 'breakout',
+                                                'win': False, 'profit': -800.0, 'balance': 9200.0}]).get_json()
+    assert reply['halted'] is True and monitor.accounts['7'].drawdown == pytest.approx(0.08)
+    decision = client.post('/batch/strategy', json=[{'symbol': 'EURUSD', 'account': '7'}]).get_json()['decisions'][0]
+    assert decision['strategy'] == 'none' and decision['lot'] == 0.0
+    assert client.post('/equity/reset', json={'account': '7'}).get_json()['halted'] is False
+    server_api.risk.current_drawdown = 0.0
+
+def test_kill_switch_is_shared_between_workers(tmp_path, alerts, clock):
+    strategies = ['scalping', 'breakout']
+    workers = []
+    for _ in range(2):
+        monitor = EquityMonitor(RiskEngine(max_drawdown=0.05), alerts=alerts, clock=clock)
+        workers.append(KillSwitch(monitor, SharedState(strategies, str(tmp_path / 'state'))))
+    first, second = workers
+    first.update_equity('A', 10000.0, balance=10000.0)
+    first.update_equity('A', 9000.0)
+    assert first.halted and second.halted and second.as_dict()['reason'].startswith('A: drawdown')
+    second.update_equity('B', 10000.0, balance=10000.0)
+    second.update_equity('B', 9000.0)
+    second.reset('B')  # A's halt, tripped in the other worker, stays on
+    assert second.halted and first.halted
+    second.reset('A')
+    assert not first.halted
+    first.sync()  # The other worker's resume is applied to this worker's accounts
+    assert first.monitor.accounts['A'].halted is None and first.monitor.accounts['A'].peak == 9000.0
+    assert [level for level, _ in delivered(alerts)].count('INFO') == 2  # No second alert from the follower
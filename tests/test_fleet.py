@@ -0,0 +1,81 @@
+import pytest
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.fleet import FleetState
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+from ai.decision_snapshot import DecisionSnapshot
+from ai.durable_state import DurableState
+
+SNAPSHOT = DecisionSnapshot(regime='trending', sentiment='positive', graph_hint='breakout', volatility=0.2,
+                            confidence={}, input_times={}, created_at=0.0)
+
+@pytest.fixture
+def fleet():
+    return FleetState(StrategySelector(), RiskEngine(), capacity=2)
+
+def test_batch_decisions_match_single_selector(fleet):
+    outcomes = [('XAUUSD', 'breakout', True), ('XAUUSD', 'breakout', True), ('EURUSD', 'breakout', False)]
+    fleet.update([{'symbol': s, 'account': 'A', 'strategy': st, 'win': w} for s, st, w in outcomes])
+    for symbol in ('XAUUSD', 'EURUSD', 'GBPUSD'):
+        selector, risk = StrategySelector(), RiskEngine()
+        for s, st, w in outcomes:
+            if s == symbol:
+                selector.update_win_rate(st, w)
+        expected = selector.select_strategy(SNAPSHOT.regime, SNAPSHOT.sentiment, SNAPSHOT.graph_hint)
+        decision = fleet.decide([{'symbol': symbol, 'account': 'B', 'balance': 5000}], SNAPSHOT)[0]
+        assert (decision['strategy'], decision['confidence']) == (expected[0], pytest.approx(expected[1]))
+        assert decision['lot'] == pytest.approx(risk.calculate_lot(5000, volatility=SNAPSHOT.volatility))
+
+def test_state_is_keyed_per_symbol_and_account(fleet):
+    fleet.update([{'symbol': 'EURUSD', 'account': 'A', 'strategy': 'breakout', 'win': False}] * 8)
+    decisions = fleet.decide([{'symbol': 'EURUSD', 'account': 'A', 'balance': 10000},
+                              {'symbol': 'XAUUSD', 'account': 'B', 'balance': 10000}], SNAPSHOT)
+    assert decisions[0]['strategy'] != 'breakout'
+    assert decisions[1]['strategy'] == 'breakout'
+    assert decisions[0]['lot'] < decisions[1]['lot']
+    assert fleet.symbol_win_rates('EURUSD')['breakout'] < 0.4
+    assert len(fleet.symbols) == 2 and len(fleet.accounts) == 2
+
+def test_rows_use_their_symbols_market_state(fleet):
+    from ai.market_state import MarketState
+    rng = np.random.default_rng(7)
+    market = MarketState()
+    bars = lambda close: [{'time': 60 * i, 'open': c, 'high': c + 0.5, 'low': c - 0.5, 'close': c}
+                          for i, c in enumerate(close)]
+    market.push('RANGE', bars(2000 + 3 * np.sin(np.arange(300) / 2.0) + rng.normal(0, 0.2, 300)))
+    fleet.selector.market = market
+    fleet.selector.get_graph_data = lambda regime: {'ranging': 'reversal'}.get(regime, 'breakout')
+    decisions = fleet.decide([{'symbol': 'RANGE', 'account': 'A'}, {'symbol': 'NOBARS', 'account': 'A'}], SNAPSHOT)
+    state = market.get('RANGE')
+    expected = StrategySelector().select_strategy('ranging', SNAPSHOT.sentiment, 'reversal')
+    assert state.regime == 'ranging' and decisions[0]['strategy'] == expected[0]
+    assert decisions[0]['lot'] == pytest.approx(RiskEngine().calculate_lot(10000, volatility=state.volatility))
+    assert decisions[1]['strategy'] == 'breakout'  # No bars for the symbol: the snapshot's inputs
+
+def test_batch_routes():
+    from ai import server_api
+    server_api.refresher.snapshot = SNAPSHOT._replace(created_at=__import__('time').time())
+    client = server_api.app.test_client()
+    response = client.post('/batch/strategy', json=[{'symbol': 'XAUUSD', 'account': '1', 'balance': 10000},
+                                                    {'symbol': 'EURUSD', 'account': '2', 'balance': 2000}])
+    assert [d['symbol'] for d in response.json['decisions']] == ['XAUUSD', 'EURUSD']
+    response = client.post('/batch/update', json={'updates': [{'symbol': 'XAUUSD', 'account': '1', 'strategy': 'news', 'win': True}]})
+    assert response.json == {'status': 'updated', 'count': 1, 'halted': False}
+
+def test_batch_outcomes_survive_a_restart(tmp_path):
+    directory = str(tmp_path / 'state')
+    fleet = FleetState(StrategySelector(), RiskEngine(), capacity=1)
+    durable = DurableState(fleet.selector, fleet.risk, 'api', directory=directory, sync_interval=0, fleet=fleet)
+    durable.open(restore=False)
+    fleet.update([{'symbol': 'XAU.m', 'account': 'A.1', 'strategy': 'breakout', 'win': False}] * 8)
+    durable.record('batch_update')
+    durable.close()
+    restarted = FleetState(StrategySelector(), RiskEngine(), capacity=1)
+    restored = DurableState(restarted.selector, restarted.risk, 'api', directory=directory, fleet=restarted)
+    assert restored.open(restore=True) > 0
+    assert restarted.symbol_win_rates('XAU.m') == fleet.symbol_win_rates('XAU.m')
+    assert restarted.fields() == fleet.fields()
+    restored.close()
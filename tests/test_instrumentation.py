@@ -0,0 +1,83 @@
+import pytest
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import instrumentation
+from ai.instrumentation import Registry, Counter, Histogram, Gauge, SamplingProfiler, track, DEPENDENCY_ERRORS
+from ai.instrumentation import PROFILE_FILE
+
+def test_render_prometheus_text():
+    registry = Registry()
+    hist = registry.register(Histogram('req_seconds', 'Latency', ('route',), buckets=[0.1, 1]))
+    counter = registry.register(Counter('errors_total', 'Errors', ('dependency',)))
+    registry.register(Gauge('queue_depth', 'Depth', lambda: 3))
+    hist.observe(0.05, '/strategy')
+    hist.observe(0.5, '/strategy')
+    hist.observe(5, '/strategy')
+    counter.inc('postgrest', amount=2)
+    text = registry.render()
+    assert '# TYPE req_seconds histogram' in text
+    assert 'req_seconds_bucket{route="/strategy",le="0.1"} 1' in text
+    assert 'req_seconds_bucket{route="/strategy",le="1"} 2' in text
+    assert 'req_seconds_bucket{route="/strategy",le="+Inf"} 3' in text
+    assert 'req_seconds_count{route="/strategy"} 3' in text
+    assert 'req_seconds_sum{route="/strategy"} 5.55' in text
+    assert 'errors_total{dependency="postgrest"} 2' in text
+    assert 'queue_depth 3' in text
+    assert registry.register(Counter('errors_total', 'Again')) is counter
+
+def test_track_counts_errors():
+    before = DEPENDENCY_ERRORS.values.get(('test_dep',), 0)
+    with pytest.raises(ValueError):
+        with track('test_dep'):
+            raise ValueError('down')
+    with track('test_dep'):
+        pass
+    assert DEPENDENCY_ERRORS.values[('test_dep',)] == before + 1
+
+def test_profiler_dumps_only_slow_requests(tmp_path):
+    profiler = SamplingProfiler(interval=0.001, threshold=0.05, path=str(tmp_path / 'profile.folded'))
+    profiler.enable()
+    try:
+        profiler.begin()
+        assert not profiler.end('GET /fast', 0.001)
+        profiler.begin()
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+        assert profiler.end('GET /strategy', 0.1)
+    finally:
+        profiler.disable()
+    with open(profiler.path) as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.startswith('GET_/strategy;') for line in lines)
+    assert any('test_profiler_dumps_only_slow_requests' in line for line in lines)
+    assert int(lines[0].rsplit(' ', 1)[1]) >= 1
+
+def test_profiler_restart_keeps_one_sampler():
+    profiler = SamplingProfiler(interval=0.05)
+    profiler.enable()
+    first = profiler._thread
+    profiler.disable()
+    profiler.enable()
+    try:
+        assert not first.is_alive() and profiler._thread.is_alive()
+    finally:
+        profiler.disable()
+
+def test_profile_file_is_next_to_the_module():
+    assert os.path.dirname(os.path.dirname(PROFILE_FILE)) == os.path.dirname(os.path.abspath(instrumentation.__file__))
+
+def test_metrics_route():
+    from ai.server_api import app
+    client = app.test_client()
+    client.get('/metrics')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert 'smart_ea_request_seconds_count{method="GET",route="/metrics",status="200"}' in response.get_data(as_text=True)
+
+def test_profile_route_without_a_body():
+    from ai.server_api import app
+    response = app.test_client().post('/debug/profile')
+    assert response.status_code == 200 and response.get_json()['enabled'] is False
@@ -0,0 +1,79 @@
+import pytest
+import sys
+import os
+import functools
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.graph_server import serve
+from ai import knowledge_graph
+from ai.knowledge_graph import GraphReplica, GraphWriteBuffer, KnowledgeGraph, mcp_call, REGIME_RELATION
+
+@pytest.fixture
+def server():
+    server = serve(port=0)
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def call(server):
+    return functools.partial(mcp_call, url=f'http://127.0.0.1:{server.server_address[1]}')
+
+def test_replica_indexes_and_regime_lookup(server, call):
+    graph = server.graph
+    graph.create_entities([{'name': 'trending', 'entityType': 'MarketRegime', 'observations': []},
+                           {'name': 'trend_following', 'entityType': 'Strategy', 'observations': ['EMA cross']}])
+    graph.create_relations([{'from': 'trending', 'to': 'trend_following', 'relationType': REGIME_RELATION}])
+    replica = GraphReplica(call)
+    assert replica.strategy_for('trending') == 'breakout'  # Built-in map before the first sync
+    assert replica.sync() == 3
+    assert replica.strategy_for('trending') == 'trend_following'
+    assert replica.strategy_for('ranging') == 'reversal'
+    assert [e['name'] for e in replica.find('Strategy')] == ['trend_following']
+    assert replica.sync() == 0  # Nothing changed remotely
+    graph.add_observations([{'entityName': 'trend_following', 'contents': ['ADX > 25']}])
+    graph.delete_entities(['trending'])
+    assert replica.sync() == 3
+    assert replica.get('trend_following')['observations'] == ['EMA cross', 'ADX > 25']
+    assert replica.strategy_for('trending') == 'breakout'
+    assert server.graph.calls['read_graph'] == 3
+
+def test_write_buffer_coalesces_into_bulk_calls(server, call):
+    buffer = GraphWriteBuffer(call, max_batch=3)
+    for i in range(5):
+        buffer.submit([{'name': f'Alert_{i % 4}', 'entityType': 'Alert', 'observations': [f'dd {i}']}])
+    assert buffer.flush()
+    assert server.graph.calls['create_entities'] == 2
+    assert server.graph.entities['Alert_0']['observations'] == ['dd 0', 'dd 4']
+    assert buffer.stats['sent'] == 4
+
+def test_failed_writes_are_retried(server, call):
+    server.shutdown()
+    server.server_close()
+    buffer = GraphWriteBuffer(call)
+    buffer.submit([{'name': 'ModelUpdate_1', 'entityType': 'ModelUpdate', 'observations': []}])
+    assert not buffer.flush()
+    assert len(buffer.pending) == 1 and buffer.stats['failed'] == 1
+
+def test_local_writes_survive_sync_until_flushed(server, call):
+    kg = KnowledgeGraph(call)
+    kg.create_entities([{'name': 'Log_1', 'entityType': 'ErrorLog', 'observations': ['boom']}])
+    kg.replica.sync()
+    assert kg.replica.get('Log_1') is not None
+    kg.writes.flush()
+    kg.replica.sync()
+    assert not kg.replica.local
+    assert server.graph.entities['Log_1']['entityType'] == 'ErrorLog'
+
+def test_local_entities_are_capped(server, call):
+    server.graph.create_entities([{'name': 'Strategy_1', 'entityType': 'Strategy', 'observations': []}])
+    replica = GraphReplica(call, max_local=3)
+    replica.sync()
+    replica.apply([{'name': 'Strategy_1', 'entityType': 'Strategy', 'observations': ['local note']}])
+    for i in range(4):  # Graph unreachable: unique names pile up
+        replica.apply([{'name': f'Log_{i}', 'entityType': 'ErrorLog', 'observations': []}])
+    assert list(replica.local) == ['Log_1', 'Log_2', 'Log_3'] and replica.evicted == 2
+    assert replica.get('Log_0') is None and replica.get('Strategy_1') is not None  # Still in the remote graph
+    assert sorted(e['name'] for e in replica.find('ErrorLog')) == ['Log_1', 'Log_2', 'Log_3']
+
+def test_module_graph_has_no_threads_in_tests():
+    graph = knowledge_graph.get_graph()
+    assert graph.writes._thread is None and graph.replica._thread is None
@@ -0,0 +1,87 @@
+import pytest
+import sys
+import os
+import json
+import requests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.logger import LogShipper
+
+class FakeResponse:
+    def raise_for_status(self):
+        pass
+
+class FakeSession:
+    def __init__(self):
+        self.batches = []
+        self.down = False
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        if self.down:
+            raise requests.exceptions.ConnectionError('PostgREST down')
+        self.batches.append(list(json))
+        return FakeResponse()
+
+@pytest.fixture
+def shipper(tmp_path):
+    return LogShipper(batch_size=3, flush_interval=0.05, max_queue=5,
+                      journal_path=str(tmp_path / 'journal.txt'), session=FakeSession())
+
+def test_background_writer_sends_bulk_batches(shipper):
+    shipper.policy = 'block'
+    shipper.start()
+    for i in range(7):
+        shipper.submit({'message': i})
+    shipper.close()
+    sizes = [len(b) for b in shipper.session.batches]
+    assert sum(sizes) == 7 and max(sizes) <= 3
+    assert shipper.metrics()['sent'] == 7
+
+def test_drop_policy_bounds_queue(shipper):
+    for i in range(7):
+        shipper.submit({'message': i})
+    assert shipper.queue_depth() == 5
+    assert shipper.stats['dropped'] == 2 and shipper.stats['enqueued'] == 5
+    assert not os.path.exists(shipper.journal_path)  # No disk I/O on the caller's thread
+
+def test_failed_flush_spills_and_replays(shipper):
+    shipper.session.down = True
+    shipper.flush([{'message': 'a'}, {'message': 'b'}])
+    with open(shipper.journal_path) as f:
+        assert [json.loads(line)['message'] for line in f] == ['a', 'b']
+    shipper.session.down = False
+    shipper.flush([{'message': 'c'}])
+    assert not os.path.exists(shipper.journal_path)
+    assert shipper.session.batches == [[{'message': 'c'}], [{'message': 'a'}, {'message': 'b'}]]
+    assert shipper.stats['replayed'] == 2
+
+def test_open_circuit_spills_without_posting(shipper):
+    shipper.session.down = True
+    for i in range(3):
+        shipper.flush([{'message': i}])
+    assert shipper.breaker.state == 'open' and shipper.stats['failed_flushes'] == 3
+    shipper.flush([{'message': 3}])
+    assert shipper.stats['failed_flushes'] == 3 and shipper.stats['skipped_flushes'] == 1
+    assert shipper.metrics()['spilled'] == 4 and shipper.metrics()['breaker'] == 'open'
+
+def test_replay_is_streamed_in_batches(shipper):
+    shipper.session.down = True
+    shipper.flush([{'message': i} for i in range(7)])
+    shipper.session.down = False
+    shipper.replay_journal()
+    assert [len(b) for b in shipper.session.batches] == [3, 3, 1]
+    assert not os.path.exists(shipper.journal_path) and shipper.stats['replayed'] == 7
+
+def test_failed_replay_keeps_the_rest_in_order(shipper):
+    shipper.session.down = True
+    shipper.flush([{'message': i} for i in range(7)])
+    posts = []
+    def post(url, headers=None, json=None, timeout=None):
+        posts.append(list(json))
+        if len(posts) > 1:
+            raise requests.exceptions.ConnectionError('PostgREST down again')
+        return FakeResponse()
+    shipper.session.post = post
+    shipper.replay_journal()
+    with open(shipper.journal_path) as f:
+        assert [json.loads(line)['message'] for line in f] == [3, 4, 5, 6]
+    assert shipper.stats['replayed'] == 3
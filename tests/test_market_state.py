@@ -0,0 +1,79 @@
+import pytest
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.market_state import MarketState, SymbolState, RingBuffer
+from ai.backtest import atr
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+
+def make_bars(close, spread=0.5):
+    return [{'time': 60 * i, 'open': c, 'high': c + spread, 'low': c - spread, 'close': c} for i, c in enumerate(close)]
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+def test_ring_buffer_running_mean():
+    buffer = RingBuffer(3)
+    for value in [1.0, 2.0, 3.0]:
+        assert buffer.push(value) is None
+    assert buffer.push(10.0) == 1.0
+    assert buffer.mean() == pytest.approx(5.0) and buffer.oldest() == 2.0
+
+def test_streaming_atr_matches_batch(rng):
+    close = 2000 + np.cumsum(rng.normal(0, 1, 600))
+    bars = make_bars(close, spread=0.8)
+    state = SymbolState('XAUUSD')
+    for bar in bars:
+        state.push(bar)
+    high, low = close + 0.8, close - 0.8
+    assert state.atr.value == pytest.approx(atr(high, low, close)[-1], rel=1e-9)
+
+def test_regimes(rng):
+    market = MarketState()
+    market.push('TREND', make_bars(2000 + np.arange(300) * 1.0 + rng.normal(0, 0.2, 300)))
+    market.push('RANGE', make_bars(2000 + 3 * np.sin(np.arange(300) / 2.0) + rng.normal(0, 0.2, 300)))
+    quiet = 2000 + np.cumsum(rng.normal(0, 0.2, 300))
+    spike = quiet[-1] + np.cumsum(rng.normal(0, 4.0, 20))
+    market.push('SPIKE', make_bars(np.concatenate((quiet, spike)), spread=0.1))
+    assert market.regime('TREND') == 'trending'
+    assert market.regime('RANGE') == 'ranging'
+    assert market.regime('SPIKE') == 'high_volatility'
+    assert market.get('SPIKE').ewma.value > market.get('RANGE').ewma.value
+
+def test_duplicate_and_early_bars(rng):
+    market = MarketState()
+    bars = make_bars(2000 + np.cumsum(rng.normal(0, 1, 40)))
+    assert market.push('XAUUSD', bars[:10]) == 10
+    assert market.regime('XAUUSD') is None  # Not enough bars for ADX yet
+    assert market.push('XAUUSD', bars[5:]) == 30  # Overlapping resend after a reconnect
+    assert market.symbols['XAUUSD'].bars == 40
+    assert market.regime() is not None  # First pushed symbol by default
+
+def test_ewma_feeds_volatility(rng):
+    state = SymbolState('XAUUSD')
+    for bar in make_bars(2000 + np.cumsum(rng.normal(0, 1, 300))):
+        state.push(bar)
+    atr_ratio = state.atr.value / state.atr_baseline.mean()
+    ewma_ratio = state.ewma.value / state.ewma_baseline.mean()
+    assert state.volatility == pytest.approx(min(1.0, (atr_ratio + ewma_ratio) / 4.0))
+
+def test_symbolless_callers_read_a_fixed_symbol(rng):
+    market = MarketState()
+    market.push('XAUUSD', make_bars(2000 + np.arange(300) * 1.0 + rng.normal(0, 0.2, 300)))
+    market.push('EURUSD', make_bars(1.1 + 0.003 * np.sin(np.arange(300) / 2.0) + rng.normal(0, 0.0002, 300)))
+    assert market.regime('EURUSD') == 'ranging'
+    assert market.regime() == 'trending'  # Not whichever chart pushed last
+    market.default_symbol = 'EURUSD'
+    assert market.regime() == 'ranging'
+
+def test_selector_and_risk_use_market_state(rng):
+    market = MarketState()
+    market.push('XAUUSD', make_bars(2000 + np.arange(300) * 1.0 + rng.normal(0, 0.2, 300)))
+    selector, risk = StrategySelector(), RiskEngine()
+    selector.market = risk.market = market
+    assert selector.get_market_regime() == 'trending'
+    risk.update_volatility()
+    assert risk.volatility == market.volatility()
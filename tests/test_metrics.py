@@ -0,0 +1,53 @@
+import pytest
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import metrics
+
+STRATEGIES = ['scalping', 'breakout', 'reversal', 'news', 'trend_following']
+
+@pytest.fixture
+def trades():
+    rng = np.random.default_rng(7)
+    codes = rng.integers(0, len(STRATEGIES), 500).astype(np.uint8)
+    profit = rng.normal(0.5, 25, 500)
+    return codes, profit
+
+def naive_max_drawdown(profit, balance=10000):
+    peak, worst = balance, 0.0
+    for p in profit:
+        balance += p
+        peak = max(peak, balance)
+        worst = max(worst, (peak - balance) / peak)
+    return worst
+
+def test_max_drawdown_matches_running_loop(trades):
+    _, profit = trades
+    assert metrics.max_drawdown(profit) == pytest.approx(naive_max_drawdown(profit))
+
+def test_per_strategy_report_matches_filtered_arrays(trades):
+    codes, profit = trades
+    report = metrics.strategy_report(codes, profit, STRATEGIES)
+    returns = metrics.trade_returns(profit)
+    for i, s in enumerate(STRATEGIES):
+        mask = codes == i
+        assert report[s]['trades'] == mask.sum()
+        assert report[s]['win_rate'] == pytest.approx((profit[mask] > 0).mean())
+        assert report[s]['max_drawdown'] == pytest.approx(naive_max_drawdown(profit[mask]))
+        assert report[s]['sharpe'] == pytest.approx(metrics.sharpe(returns[mask]))
+        assert report[s]['profit_factor'] == pytest.approx(metrics.profit_factor(profit[mask]))
+    assert report['total']['sortino'] == pytest.approx(metrics.sortino(returns))
+
+def test_drawdown_duration_in_trades_and_time():
+    profit = np.array([10, -5, -5, 20, -1, 2])
+    assert metrics.drawdown_duration(profit) == 2
+    timestamps = np.array([0, 10, 20, 30, 40, 50])
+    assert metrics.drawdown_duration(profit, timestamps) == 20
+
+def test_rolling_windows_match_full_window(trades):
+    _, profit = trades
+    returns = metrics.trade_returns(profit)
+    assert metrics.rolling_sharpe(returns, 100)[-1] == pytest.approx(metrics.sharpe(returns[-100:]))
+    assert metrics.rolling_sortino(returns, 100)[0] == pytest.approx(metrics.sortino(returns[:100]))
+    assert metrics.rolling_profit_factor(profit, 50)[3] == pytest.approx(metrics.profit_factor(profit[3:53]))
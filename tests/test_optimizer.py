@@ -0,0 +1,69 @@
+import pytest
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import backtest
+from ai.optimizer import ParameterOptimizer, apply_params, save_best_params, load_best_params
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+
+SPACE = {'graph_boost': (0.2, 0.6), 'ema_factor': (0.8, 0.98)}
+
+@pytest.fixture
+def bars_path(tmp_path):
+    rng = np.random.default_rng(5)
+    n = 4 * 1440
+    close = 2000 + np.cumsum(rng.normal(0, 0.5, n))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    bars = {
+        'time': np.datetime64('2024-01-01T00:00', 'ns').astype(np.int64) + np.arange(n, dtype=np.int64) * backtest.MINUTE_NS,
+        'open': open_,
+        'high': np.maximum(open_, close) + 0.2,
+        'low': np.minimum(open_, close) - 0.2,
+        'close': close,
+    }
+    path = str(tmp_path / 'bars')
+    backtest.save_bars(bars, path)
+    return path
+
+def test_apply_params_sets_tunables():
+    selector, risk = StrategySelector(), RiskEngine()
+    apply_params({'graph_boost': 0.5, 'lot_decrease': 0.7, 'ema_factor': 0.95}, selector, risk)
+    assert selector.boosts['graph'] == 0.5
+    assert selector.ema_factor == 0.95
+    assert risk.lot_decrease == 0.7
+    risk.update_win_rate(0.3)
+    assert risk.lot == pytest.approx(0.007)
+
+def test_sweep_is_cached_per_parameter_hash(bars_path, tmp_path):
+    cache_path = str(tmp_path / 'cache.json')
+    optimizer = ParameterOptimizer(bars_path, space=SPACE, folds=2, workers=2, cache_path=cache_path)
+    result = optimizer.optimize(method='grid', steps=2)
+    assert result['points'] == 4
+    assert optimizer.evaluated == 4
+    assert len(result['walk_forward']) == 2
+    again = ParameterOptimizer(bars_path, space=SPACE, folds=2, workers=2, cache_path=cache_path)
+    assert again.optimize(method='grid', steps=2)['params'] == result['params']
+    assert again.evaluated == 0
+
+def test_selection_never_sees_the_last_segment(bars_path, monkeypatch):
+    optimizer = ParameterOptimizer(bars_path, space=SPACE, folds=2, workers=1, cache_path=None)
+    scores = {0.2: [1.0, 1.0, -1.0], 0.6: [0.0, 0.0, 5.0]}  # Per segment; 0.6 only wins out of sample
+    monkeypatch.setattr(optimizer, 'evaluate', lambda points: [scores[p['graph_boost']] for p in points])
+    result = optimizer.optimize(method='grid', steps=2)
+    assert result['params']['graph_boost'] == 0.2 and result['train_score'] == 1.0 and result['score'] == -1.0
+    assert [fold['test_score'] for fold in result['walk_forward']] == [1.0, -1.0]
+    assert result['walk_forward_score'] == 0.0
+
+def test_bayesian_search_stays_in_bounds(bars_path, tmp_path):
+    optimizer = ParameterOptimizer(bars_path, space=SPACE, folds=1, workers=1, cache_path=str(tmp_path / 'c.json'))
+    result = optimizer.optimize(method='bayesian', budget=6, batch=3)
+    assert result['points'] == 6
+    for name, (low, high) in SPACE.items():
+        assert low <= result['params'][name] <= high
+
+def test_best_params_round_trip(tmp_path):
+    path = str(tmp_path / 'best.json')
+    save_best_params({'graph_boost': 0.3}, 1.2, path)
+    assert load_best_params(path) == {'graph_boost': 0.3}
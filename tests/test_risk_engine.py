@@ -3,12 +3,17 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from ai.risk_engine import RiskEngine
+from ai.market_state import MarketState
+from ai.synthetic import bar_series, bar_rows
 
 @pytest.fixture
 def engine():
     return RiskEngine()
 
 def test_calculate_lot(engine):
+    # Volatility from local bars instead of the remote fetch
+    engine.market = MarketState()
+    engine.market.push('XAUUSD', bar_rows(bar_series(500)))
     lot = engine.calculate_lot(10000)
     assert 0.01 <= lot <= 1.0  # Assuming reasonable range
 
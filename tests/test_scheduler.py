@@ -0,0 +1,174 @@
+import pytest
+import sys
+import os
+import json
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import scheduler as scheduler_module
+from ai import model_loop
+from ai.scheduler import Scheduler, build_scheduler
+from ai.shared_state import SharedState
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / 'scheduler_state.json')
+
+def wait_idle(scheduler):
+    deadline = time.time() + 5
+    while any(job.running for job in scheduler.jobs.values()) and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_jobs_run_when_due_and_reschedule(clock, state_path):
+    runs = []
+    scheduler = Scheduler(state_path, clock=clock)
+    scheduler.every(60, lambda: runs.append('fast'), name='fast')
+    scheduler.every(3600, lambda: runs.append('slow'), name='slow')
+    assert scheduler.run_pending() == []
+    clock.now += 60
+    assert scheduler.run_pending() == ['fast']
+    wait_idle(scheduler)
+    clock.now += 7200  # Missed periods collapse into one run
+    assert sorted(scheduler.run_pending()) == ['fast', 'slow']
+    wait_idle(scheduler)
+    assert scheduler.jobs['fast'].next_run == clock.now + 60
+    assert sorted(runs) == ['fast', 'fast', 'slow']
+    scheduler.stop()
+
+def test_overlap_prevention_and_timeout(clock, state_path):
+    release = threading.Event()
+    scheduler = Scheduler(state_path, clock=clock)
+    job = scheduler.every(10, lambda: release.wait(5), name='retrain', timeout=15)
+    clock.now += 10
+    scheduler.run_pending()
+    clock.now += 20
+    scheduler.run_pending()  # Still running: skipped
+    assert job.stats['skipped'] == 1 and job.stats['timeouts'] == 1
+    release.set()
+    wait_idle(scheduler)
+    assert job.stats['runs'] == 1
+    scheduler.stop()
+
+def test_slow_job_does_not_block_others(state_path):
+    release = threading.Event()
+    ran = threading.Event()
+    scheduler = Scheduler(state_path, workers=2)
+    scheduler.every(0.05, lambda: release.wait(5), name='retrain_model')
+    scheduler.every(0.05, ran.set, name='check_drawdown')
+    scheduler.start()
+    assert ran.wait(2)
+    release.set()
+    scheduler.stop()
+
+def test_catch_up_after_restart(clock, state_path):
+    scheduler = Scheduler(state_path, clock=clock)
+    scheduler.every(100, lambda: None, name='evaluate')
+    clock.now += 100
+    scheduler.run_pending()
+    wait_idle(scheduler)
+    scheduler.stop()
+    with open(state_path) as f:
+        state = json.load(f)
+    assert state['last_run']['evaluate'] == clock.now
+    assert sum(state['jobs']['evaluate']['duration_buckets'].values()) == 1
+    clock.now += 500  # Down for longer than the interval
+    restarted = Scheduler(state_path, clock=clock)
+    restarted.every(100, lambda: None, name='evaluate')
+    assert restarted.run_pending() == ['evaluate']
+    restarted.stop()
+
+class FakeLoop:
+    def __init__(self):
+        self.selector = StrategySelector()
+        self.risk = RiskEngine()
+
+    def evaluate_performance(self):
+        self.risk.update_drawdown(0.05)
+
+    def retrain_model(self):
+        pass
+
+    def re_optimize(self):
+        pass
+
+def test_drawdown_check_reads_live_shared_state(tmp_path, state_path, clock, monkeypatch):
+    alerts = []
+    monkeypatch.setattr(scheduler_module, 'create_entities', alerts.extend)
+    loop = FakeLoop()
+    shared = SharedState(loop.selector.strategies, str(tmp_path / 'state'))
+    scheduler = build_scheduler(loop, shared, Scheduler(state_path, clock=clock))
+    # The API server records a drawdown in its own process
+    api_selector, api_risk = StrategySelector(), RiskEngine()
+    with shared.transaction(api_selector, api_risk):
+        api_risk.update_drawdown(0.06)
+    clock.now += 3600
+    scheduler.run_pending()
+    wait_idle(scheduler)
+    assert alerts and alerts[0]['entityType'] == 'Alert'
+    clock.now += scheduler_module.DAY - 3600
+    scheduler.run_pending()
+    wait_idle(scheduler)
+    # The model job's historical drawdown does not replace the live one
+    assert shared.read_risk()['current_drawdown'] == 0.06
+    scheduler.stop()
+
+class SlowLoop(FakeLoop):
+    def __init__(self, shared):
+        super().__init__()
+        self.shared = shared
+
+    def evaluate_performance(self):
+        self.selector.win_rates['scalping'] = 0.3
+        self.risk.lot = 0.02
+        # Meanwhile the API records a trade outcome on another strategy
+        api_selector, api_risk = StrategySelector(), RiskEngine()
+        with self.shared.transaction(api_selector, api_risk):
+            api_selector.win_rates['breakout'] = 0.9
+            api_risk.max_positions = 7
+
+def test_model_jobs_publish_only_their_changes(tmp_path, state_path, clock):
+    shared = SharedState(StrategySelector().strategies, str(tmp_path / 'state'))
+    loop = SlowLoop(shared)
+    scheduler = build_scheduler(loop, shared, Scheduler(state_path, clock=clock))
+    clock.now += scheduler_module.DAY
+    scheduler.run_pending()
+    wait_idle(scheduler)
+    selector, risk = StrategySelector(), RiskEngine()
+    shared.load(selector, risk)
+    assert selector.win_rates['scalping'] == 0.3 and risk.lot == 0.02
+    assert selector.win_rates['breakout'] == 0.9 and risk.max_positions == 7
+    scheduler.stop()
+
+def test_retrain_publishes_the_recorded_history_not_a_simulation(tmp_path, state_path, clock, monkeypatch):
+    monkeypatch.setattr(model_loop, 'create_entities', lambda entities: None)
+    monkeypatch.setattr(model_loop, 'load_best_params', lambda: {'lot_increase': 1.3})
+    loop = model_loop.ModelLoop()
+    loop.analytics.apply([{'id': 1, 'strategy': 'scalping', 'profit': 5.0},
+                          {'id': 2, 'strategy': 'scalping', 'profit': -2.0},
+                          {'id': 3, 'strategy': 'scalping', 'profit': 1.0},
+                          {'id': 4, 'strategy': 'scalping', 'profit': 3.0}])
+    shared = SharedState(loop.selector.strategies, str(tmp_path / 'state'))
+    scheduler = build_scheduler(loop, shared, Scheduler(state_path, clock=clock))
+    api_selector, api_risk = StrategySelector(), RiskEngine()
+    with shared.transaction(api_selector, api_risk):
+        api_selector.win_rates['breakout'] = 0.45
+        api_risk.lot = 0.03
+    scheduler.jobs['retrain_model'].func()
+    selector, risk = StrategySelector(), RiskEngine()
+    shared.load(selector, risk)
+    assert selector.win_rates['scalping'] == 0.75 and selector.win_rates['breakout'] == 0.45
+    assert risk.lot == 0.03 and risk.lot_increase == 1.3
+    scheduler.stop()
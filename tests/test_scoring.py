@@ -0,0 +1,107 @@
+import pytest
+import sys
+import os
+import itertools
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.scoring import ScoringTable, rule_score, load_weights, save_weights, decide
+from ai.strategy_selector import StrategySelector, DEFAULT_BOOSTS
+from ai.optimizer import apply_params, save_best_params, ScoringReloader, DEFAULT_PARAMS
+
+INPUTS = list(itertools.product(['ranging', 'trending', 'high_volatility', 'unknown'],
+                                ['neutral', 'positive', 'negative', 'mixed'],
+                                ['scalping', 'breakout', 'reversal', 'news', 'trend_following', 'none']))
+
+@pytest.fixture
+def selector():
+    selector = StrategySelector()
+    selector.win_rates.update({'scalping': 0.7, 'breakout': 0.55, 'reversal': 0.35, 'news': 0.9,
+                               'trend_following': 0.62})
+    selector.active['reversal'] = False
+    return selector
+
+def rule_decision(selector, regime, sentiment, hint):
+    # select_strategy as it was written before the tensor
+    confidence = {s: min(1.0, rule_score(regime, sentiment, hint, s, selector.boosts) * selector.win_rates[s])
+                  for s in selector.strategies}
+    eligible = [s for s in selector.strategies if selector.active[s] and confidence[s] > 0.5]
+    if not eligible:
+        return ('none', 0.0), confidence
+    best = max(eligible, key=lambda s: confidence[s])
+    return (best, confidence[best]), confidence
+
+def test_table_matches_the_rules_for_every_input(selector):
+    for regime, sentiment, hint in INPUTS:
+        expected, confidence = rule_decision(selector, regime, sentiment, hint)
+        assert selector.select_strategy(regime, sentiment, hint) == expected
+        assert selector.confidence == confidence
+
+def test_batch_scores_match_single_lookups(selector):
+    scoring = selector.scoring
+    win_rates = np.random.default_rng(1).uniform(0.3, 0.9, (len(INPUTS), len(selector.strategies)))
+    active = win_rates > 0.4
+    best, best_confidence = decide(scoring.confidences(win_rates, *scoring.indices(*zip(*INPUTS))), active)
+    for i, inputs in enumerate(INPUTS):
+        index, confidence, _ = scoring.lookup(win_rates[i].tolist(), active[i].tolist(), *inputs)
+        assert best[i] == index and best_confidence[i] == pytest.approx(confidence)
+
+def test_decision_table_follows_win_rate_changes(selector):
+    assert selector.select_strategy('high_volatility', 'neutral', 'news') == ('news', pytest.approx(0.81))
+    selector.win_rates['news'] = 0.2  # As written by shared/durable state, without update_win_rate
+    assert selector.select_strategy('high_volatility', 'neutral', 'news')[0] == 'scalping'
+    selector.win_rates = {s: 0.3 for s in selector.strategies}  # ModelLoop.retrain_model replaces the dict
+    assert selector.select_strategy('high_volatility', 'neutral', 'news') == ('none', 0.0)
+
+def test_boosts_are_hot_swapped(selector):
+    table = selector.scoring
+    apply_params({'graph_boost': 0.6, 'news_positive_boost': 0.0}, selector)
+    assert selector.scoring is not table and selector.boosts['graph'] == 0.6
+    assert selector.base_scores('ranging', 'positive', 'breakout')['breakout'] == pytest.approx(0.5 + 0.6 + 0.2)
+    apply_params({}, selector)
+    assert selector.boosts == DEFAULT_BOOSTS
+
+def test_loaded_weights_replace_the_rules(selector, tmp_path):
+    weights = np.full((4, 4, 6, 5), 0.5)
+    weights[1, :, :, 1] = 1.5  # Trending: always breakout
+    table = ScoringTable(selector.strategies, weights)
+    path = str(tmp_path / 'config' / 'scoring_weights.json')
+    save_weights(table, path)
+    selector.set_scoring(load_weights(path))
+    assert selector.select_strategy('trending', 'negative', 'scalping') == ('breakout', pytest.approx(0.825))
+    assert load_weights(str(tmp_path / 'missing.json')) is None
+    with pytest.raises(ValueError):
+        ScoringTable(selector.strategies, weights[:3])
+    with pytest.raises(ValueError):
+        selector.set_scoring(ScoringTable(selector.strategies[:4], weights[..., :4]))
+
+def test_weights_route_swaps_and_persists(monkeypatch, tmp_path):
+    from ai import server_api
+    path = str(tmp_path / 'scoring_weights.json')
+    monkeypatch.setattr(server_api.scoring_reloader, 'weights_path', path)
+    monkeypatch.setattr(server_api.scoring_reloader, 'params_path', str(tmp_path / 'best_params.json'))
+    selector = server_api.selector
+    client = server_api.app.test_client()
+    weights = client.get('/scoring/weights').get_json()
+    weights['weights'] = np.full(np.shape(weights['weights']), 0.4).tolist()
+    assert client.post('/scoring/weights', json=weights).status_code == 200
+    assert os.path.exists(path) and selector.select_strategy('trending', 'positive', 'breakout') == ('none', 0.0)
+    assert client.post('/scoring/weights', json={'strategies': ['scalping'], 'weights': []}).status_code == 400
+    os.remove(path)
+    client.post('/scoring/weights', json={})  # Reload: back to the rules compiled from the boosts
+    assert selector.scoring.weights.max() > 0.4
+
+def test_reloader_follows_the_files(selector, tmp_path):
+    clock = [0.0]
+    reloader = ScoringReloader(selector, str(tmp_path / 'best_params.json'), str(tmp_path / 'weights.json'),
+                               interval=5, clock=lambda: clock[0])
+    assert reloader.reload()
+    save_best_params({'graph_boost': 0.55}, 1.0, reloader.params_path)
+    assert not reloader.reload()  # Within the check interval
+    clock[0] += 5
+    assert reloader.reload() and selector.boosts['graph'] == 0.55
+    clock[0] += 5
+    assert not reloader.reload()  # Unchanged files
+    os.remove(reloader.params_path)
+    clock[0] += 5
+    assert reloader.reload() and selector.boosts == DEFAULT_BOOSTS  # Defaults, not the last boosts
+    assert all(DEFAULT_PARAMS[f'{key}_boost'] == value for key, value in DEFAULT_BOOSTS.items())
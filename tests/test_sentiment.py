@@ -0,0 +1,101 @@
+import pytest
+import sys
+import os
+import requests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import sentiment
+from ai.sentiment import CircuitBreaker, SentimentCache, SentimentService, news_key
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeSession:
+    def __init__(self):
+        self.gets = 0
+        self.posts = 0
+        self.down = set()
+
+    def get(self, url, timeout=None):
+        self.gets += 1
+        if url in self.down:
+            raise requests.exceptions.ConnectionError('source down')
+        return FakeResponse({'data': [{'title': 'Gold  rallies', 'snippet': url[-1]}]})
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.posts += 1
+        return FakeResponse({'sentiment': 'positive', 'reasoning': 'rally'})
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv('BYTEPLUS_API_KEY', 'test')
+    monkeypatch.setattr(sentiment, 'log_to_db', lambda *args: None)
+    cache = SentimentCache(str(tmp_path / 'cache.sqlite'))
+    return SentimentService(['http://news/a', 'http://news/b'], cache=cache, session=FakeSession())
+
+def test_news_key_normalizes_whitespace_and_case():
+    assert news_key('Gold  Rallies\n') == news_key('gold rallies')
+
+def test_identical_news_is_analyzed_once(service):
+    assert service.get_sentiment() == 'positive'
+    assert service.get_sentiment() == 'positive'
+    assert service.session.posts == 1 and service.session.gets == 4
+    metrics = service.metrics()
+    assert metrics['hits'] == 1 and metrics['misses'] == 1 and metrics['hit_rate'] == 0.5
+
+def test_cache_is_shared_through_the_file(service, tmp_path):
+    service.get_sentiment()
+    other = SentimentService(service.sources, cache=SentimentCache(str(tmp_path / 'cache.sqlite')), session=FakeSession())
+    assert other.get_sentiment() == 'positive'
+    assert other.session.posts == 0
+
+def test_cache_ttl_and_lru_eviction(tmp_path):
+    clock = Clock()
+    cache = SentimentCache(str(tmp_path / 'cache.sqlite'), max_entries=2, ttl=60, clock=clock)
+    cache.put('a', 'positive')
+    clock.now += 1
+    cache.put('b', 'negative')
+    clock.now += 1
+    assert cache.get('a')['sentiment'] == 'positive'  # a is now more recent than b
+    clock.now += 1
+    cache.put('c', 'neutral')
+    assert cache.get('b') is None and len(cache) == 2
+    clock.now += 61
+    assert cache.get('a') is None
+
+def test_circuit_breaker_skips_failing_source(service):
+    service.session.down.add('http://news/b')
+    for _ in range(3):
+        service.fetch_news()
+    assert service.breakers['http://news/b'].state == 'open'
+    gets = service.session.gets
+    assert service.fetch_news() == 'Gold  rallies a'
+    assert service.session.gets == gets + 1
+    assert service.metrics()['sources']['http://news/b']['failures'] == 3
+
+def test_circuit_breaker_half_open_after_timeout():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.state == 'half_open' and breaker.allow()
+    breaker.record_failure()  # Trial call failed: open again
+    assert not breaker.allow()
+    clock.now += 30
+    breaker.record_success()
+    assert breaker.state == 'closed'
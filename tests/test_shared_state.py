@@ -0,0 +1,110 @@
+import pytest
+import sys
+import os
+import json
+import asyncio
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.shared_state import SharedState
+from ai.strategy_selector import StrategySelector
+from ai.risk_engine import RiskEngine
+from ai.asgi_server import App
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'state')
+
+def test_update_in_one_process_is_seen_by_another(path):
+    writer_selector, writer_risk = StrategySelector(), RiskEngine()
+    writer = SharedState(writer_selector.strategies, path)
+    writer.publish_if_empty(writer_selector, writer_risk)
+    reader_selector, reader_risk = StrategySelector(), RiskEngine()
+    reader = SharedState(reader_selector.strategies, path)
+    with writer.transaction(writer_selector, writer_risk):
+        writer_selector.update_win_rate('breakout', True)
+        writer_risk.update_win_rate(0.3)
+    assert reader.version % 2 == 0
+    assert reader.load(reader_selector, reader_risk)
+    assert reader_selector.win_rates['breakout'] == writer_selector.win_rates['breakout']
+    assert reader_risk.lot == pytest.approx(writer_risk.lot)
+    assert reader_risk.max_positions == 4
+
+def test_only_one_leader(path):
+    strategies = StrategySelector().strategies
+    leader = SharedState(strategies, path)
+    assert leader.try_lead()
+    assert not SharedState(strategies, path).try_lead()
+
+async def call(app, method, path, body=None):
+    sent = []
+    async def receive():
+        return {'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}
+    async def send(message):
+        sent.append(message)
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': [(b'content-type', b'application/json')]}, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+def test_asgi_workers_share_updates(path):
+    async def scenario():
+        apps = [App(path, path + '.journals'), App(path, path + '.journals')]
+        for app in apps:
+            async def fetch(name, app=app):
+                return {'regime': 'trending', 'sentiment': 'positive', 'graph_hint': 'breakout', 'volatility': 0.1}[name]
+            app.refresher.fetch_async = fetch
+            await app.startup()
+        status, body = await call(apps[0], 'GET', '/strategy')
+        assert status == 200 and body['strategy'] == 'breakout'
+        assert 'snapshot_age' in body
+        for _ in range(3):
+            await call(apps[0], 'POST', '/update', {'strategy': 'breakout', 'win': False})
+        await call(apps[1], 'GET', '/strategy')
+        assert apps[1].selector.win_rates['breakout'] == apps[0].selector.win_rates['breakout'] < 0.5
+        status, body = await call(apps[1], 'POST', '/risk/lot', {'balance': 10000})
+        assert status == 200 and body['lot'] > 0
+        assert (await call(apps[1], 'GET', '/missing'))[0] == 404
+        for app in apps:
+            await app.shutdown()
+    asyncio.run(scenario())
+
+def test_threads_in_one_process_keep_the_seqlock_even(path):
+    import threading
+    selector, risk = StrategySelector(), RiskEngine()
+    shared = SharedState(selector.strategies, path)
+    shared.publish_if_empty(selector, risk)
+    def worker():
+        for _ in range(3000):
+            with shared.transaction(selector, risk):
+                risk.lot += 0.0001
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)  # Frequent thread switches, as under real request load
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert shared.version % 2 == 0 and shared.version == 2 + 8 * 3000 * 2
+    assert shared.read_risk()['lot'] == pytest.approx(risk.lot)
+
+def test_asgi_workers_share_the_kill_switch(path):
+    from ai.equity_monitor import AlertQueue
+    async def scenario():
+        apps = [App(path, path + '.journals'), App(path, path + '.journals')]
+        for app in apps:
+            async def fetch(name):
+                return {'regime': 'trending', 'sentiment': 'positive', 'graph_hint': 'breakout', 'volatility': 0.1}[name]
+            app.refresher.fetch_async = fetch
+            app.equity.alerts = AlertQueue(sinks=[])
+            await app.startup()
+        await call(apps[0], 'POST', '/update', {'strategy': 'breakout', 'win': True, 'account': '9',
+                                                 'profit': -600.0, 'balance': 9400.0})
+        assert (await call(apps[1], 'GET', '/strategy'))[1]['strategy'] == 'none'
+        assert (await call(apps[1], 'POST', '/risk/lot', {'balance': 10000}))[1]['lot'] == 0
+        assert (await call(apps[1], 'GET', '/equity'))[1]['reason'].startswith('9: drawdown')
+        assert (await call(apps[1], 'POST', '/equity/reset', {}))[1]['halted'] is False
+        assert (await call(apps[0], 'GET', '/strategy'))[1]['strategy'] == 'breakout'
+        assert apps[0].equity.accounts['9'].halted is None  # Resume applied in the worker that tripped
+        for app in apps:
+            await app.shutdown()
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+import pytest
+import sys
+import os
+import random
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.trade_analytics import TradeAnalytics
+
+STRATEGIES = ['scalping', 'breakout', 'reversal', 'news', 'trend_following']
+
+class FakeResponse:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.rows
+
+class FakeTradesTable:
+    # Minimal PostgREST stand-in supporting id=gt.N, order=id.asc and limit
+    def __init__(self):
+        self.rows = []
+        self.requests = 0
+
+    def add(self, n):
+        rng = random.Random(len(self.rows))
+        for _ in range(n):
+            self.rows.append({'id': len(self.rows) + 1, 'strategy': rng.choice(STRATEGIES),
+                              'profit': rng.uniform(-50, 40), 'timestamp': f'2024-01-01T00:{len(self.rows):05d}'})
+
+    def get(self, url, params=None):
+        self.requests += 1
+        after = int(params['id'][3:])
+        page = [r for r in self.rows if r['id'] > after][:params['limit']]
+        return FakeResponse(page)
+
+@pytest.fixture
+def table():
+    table = FakeTradesTable()
+    table.add(250)
+    return table
+
+def test_sync_fetches_only_new_trades(table, tmp_path):
+    analytics = TradeAnalytics(STRATEGIES, state_path=str(tmp_path / 'state.json'), page_size=100, session=table)
+    assert len(analytics.sync()) == 250
+    assert table.requests == 3
+    table.add(10)
+    assert len(analytics.sync()) == 10
+    assert analytics.state['last_id'] == 260
+    assert analytics.state['trades'] == 260
+
+def test_rebuild_matches_incremental_state(table, tmp_path):
+    incremental = TradeAnalytics(STRATEGIES, state_path=str(tmp_path / 'inc.json'), page_size=64, session=table)
+    incremental.sync()
+    for _ in range(3):
+        table.add(37)
+        incremental.sync()
+    rebuilt = TradeAnalytics(STRATEGIES, state_path=str(tmp_path / 'full.json'), page_size=64, session=table)
+    rebuilt.rebuild()
+    assert rebuilt.state == incremental.state
+
+def test_high_water_mark_is_persisted(table, tmp_path):
+    path = str(tmp_path / 'state.json')
+    TradeAnalytics(STRATEGIES, state_path=path, session=table).sync()
+    reloaded = TradeAnalytics(STRATEGIES, state_path=path, session=table)
+    assert reloaded.state['last_id'] == 250
+    assert reloaded.sync() == []
+    assert 0 <= reloaded.max_drawdown <= 1
@@ -0,0 +1,62 @@
+import pytest
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.trade_store import TradeStore
+
+STRATEGIES = ['scalping', 'breakout', 'reversal', 'news', 'trend_following']
+
+def make_trades(start, n):
+    return [{'id': i, 'timestamp': f'2024-03-01T10:{i % 60:02d}:00Z', 'strategy': STRATEGIES[i % 5],
+             'profit': float(i % 7 - 3), 'lot': 0.01, 'confidence': 0.6} for i in range(start, start + n)]
+
+@pytest.fixture
+def store(tmp_path):
+    return TradeStore(str(tmp_path / 'store'), STRATEGIES)
+
+def test_append_and_memmap_read(store):
+    assert store.ingest_trades(make_trades(1, 10)) == 10
+    columns = store.columns()
+    assert isinstance(columns['profit'], np.memmap)
+    assert columns['strategy'].dtype == np.uint8
+    assert list(columns['id']) == list(range(1, 11))
+    assert store.strategies[columns['strategy'][0]] == 'breakout'
+    assert store.ingest_trades(make_trades(5, 3)) == 0  # Below the high-water id
+
+def test_unknown_strategy_is_interned(store):
+    store.ingest_trades([{'id': 1, 'strategy': 'grid', 'profit': 1.0}])
+    assert store.strategies[store.column('strategy')[0]] == 'grid'
+
+def test_uncommitted_tail_is_dropped_on_reopen(store):
+    store.ingest_trades(make_trades(1, 4))
+    with open(store._column_path('profit'), 'ab') as f:
+        f.write(np.zeros(3).tobytes())  # Simulated crash before meta.json was updated
+    reopened = TradeStore(store.path, STRATEGIES)
+    assert len(reopened) == 4
+    assert os.path.getsize(reopened._column_path('profit')) == 4 * 8
+
+def test_csv_ingest_and_compaction(store, tmp_path):
+    csv_path = tmp_path / 'trades.csv'
+    rows = ['id,timestamp,strategy,profit,lot,confidence']
+    rows += [f'{i},2024-03-01T09:{59 - i:02d}:00,scalping,{i},0.01,0.5' for i in range(1, 6)]
+    csv_path.write_text('\n'.join(rows) + '\n')
+    assert store.ingest_csv(str(csv_path)) == 5
+    assert store.compact() == 5
+    timestamps = store.column('timestamp')
+    assert np.all(np.diff(timestamps) >= 0)
+    assert list(store.column('id')) == [5, 4, 3, 2, 1]
+    assert len(TradeStore(store.path, STRATEGIES)) == 5
+
+def test_out_of_order_csv_ids_are_kept(store, tmp_path, monkeypatch):
+    from ai import trade_store
+    monkeypatch.setattr(trade_store, 'CSV_CHUNK', 2)  # Later chunks hold ids below the first chunk's
+    csv_path = tmp_path / 'trades.csv'
+    rows = ['id,timestamp,strategy,profit,lot,confidence']
+    rows += [f'{i},2024-03-01T09:{i:02d}:00,news,{i},0.01,0.5' for i in (5, 3, 1, 4, 2, 2, 6)]
+    csv_path.write_text('\n'.join(rows) + '\n')
+    assert store.ingest_csv(str(csv_path)) == 6
+    assert sorted(store.column('id')) == [1, 2, 3, 4, 5, 6]
+    assert store.ingest_csv(str(csv_path)) == 0  # Everything already stored
+    assert store.ingest_trades([{'id': 7, 'profit': 1.0}, {'id': 7, 'profit': 2.0}]) == 1
+    assert store.column('profit')[-1] == 2.0  # Last copy of a repeated id